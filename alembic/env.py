@@ -18,9 +18,12 @@ if config.config_file_name is not None:
 
 # add your model's MetaData object here
 # for 'autogenerate' support
-# from myapp import mymodel
-# target_metadata = mymodel.Base.metadata
-target_metadata = None
+from app.database import clean_url, connect_args
+from app.models import Base
+target_metadata = Base.metadata
+
+# La URL sale de DATABASE_URL (normalizada en app.database), no de alembic.ini
+config.set_main_option("sqlalchemy.url", clean_url)
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -69,6 +72,7 @@ async def run_async_migrations() -> None:
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
+        connect_args=connect_args,
     )
 
     async with connectable.connect() as connection:
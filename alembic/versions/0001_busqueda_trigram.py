@@ -0,0 +1,37 @@
+"""busqueda de productos con pg_trgm
+
+Revision ID: 0001_busqueda_trigram
+Revises: 
+Create Date: 2026-10-18 11:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_busqueda_trigram"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "ALTER TABLE productos ADD COLUMN IF NOT EXISTS busqueda text GENERATED ALWAYS AS "
+        "(lower(coalesce(nombre, '') || ' ' || coalesce(categoria, '') || ' ' || coalesce(marca, ''))) STORED"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_productos_busqueda_trgm "
+        "ON productos USING gin (busqueda gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_productos_busqueda_trgm")
+    op.execute("ALTER TABLE productos DROP COLUMN IF EXISTS busqueda")
@@ -0,0 +1,30 @@
+"""miniaturas de imágenes de productos y usuarios
+
+Revision ID: 0002_miniaturas_imagenes
+Revises: 0001_busqueda_trigram
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_miniaturas_imagenes"
+down_revision: Union[str, Sequence[str], None] = "0001_busqueda_trigram"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("productos", sa.Column("imagen_thumb_url", sa.String(), nullable=True))
+    op.add_column("usuarios", sa.Column("foto_thumb_url", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("usuarios", "foto_thumb_url")
+    op.drop_column("productos", "imagen_thumb_url")
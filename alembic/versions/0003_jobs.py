@@ -0,0 +1,51 @@
+"""cola de trabajos diferidos
+
+Revision ID: 0003_jobs
+Revises: 0002_miniaturas_imagenes
+Create Date: 2026-10-18 13:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_jobs"
+down_revision: Union[str, Sequence[str], None] = "0002_miniaturas_imagenes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("tipo", sa.String(60), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("clave", sa.String(200), nullable=True),
+        sa.Column("estado", sa.String(20), nullable=False, server_default="pendiente"),
+        sa.Column("intentos", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_intentos", sa.Integer(), nullable=False, server_default="3"),
+        sa.Column("ejecutar_despues", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column("iniciado_en", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("lease_hasta", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("terminado_en", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("resultado", sa.JSON(), nullable=True),
+        sa.Column("creado_en", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index(
+        "ux_jobs_clave_viva", "jobs", ["clave"], unique=True,
+        postgresql_where=sa.text("estado IN ('pendiente', 'en_curso')"),
+    )
+    op.create_index("ix_jobs_estado_ejecutar", "jobs", ["estado", "ejecutar_despues", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_jobs_estado_ejecutar", table_name="jobs")
+    op.drop_index("ux_jobs_clave_viva", table_name="jobs")
+    op.drop_table("jobs")
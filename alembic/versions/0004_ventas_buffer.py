@@ -0,0 +1,35 @@
+"""claves de ventas aplicadas desde el buffer local
+
+Revision ID: 0004_ventas_buffer
+Revises: 0003_jobs
+Create Date: 2026-10-18 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_ventas_buffer"
+down_revision: Union[str, Sequence[str], None] = "0003_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ventas_buffer_claves",
+        sa.Column("clave", sa.String(100), primary_key=True),
+        sa.Column("id_venta", sa.Integer(), sa.ForeignKey("ventas.id_venta", ondelete="SET NULL"), nullable=True),
+        sa.Column("aplicada_en", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_ventas_buffer_claves_aplicada_en", "ventas_buffer_claves", ["aplicada_en"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_ventas_buffer_claves_aplicada_en", table_name="ventas_buffer_claves")
+    op.drop_table("ventas_buffer_claves")
@@ -0,0 +1,40 @@
+"""claves de idempotencia para POST /ventas/ y /movimientos/
+
+Revision ID: 0005_idempotencia
+Revises: 0004_ventas_buffer
+Create Date: 2026-10-18 15:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_idempotencia"
+down_revision: Union[str, Sequence[str], None] = "0004_ventas_buffer"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "idempotencia",
+        sa.Column("ambito", sa.String(60), primary_key=True),
+        sa.Column("clave", sa.String(200), primary_key=True),
+        sa.Column("huella", sa.String(64), nullable=False),
+        sa.Column("estado", sa.String(20), nullable=False, server_default="en_curso"),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("respuesta", sa.JSON(), nullable=True),
+        sa.Column("creada_en", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column("expira_en", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_idempotencia_expira_en", "idempotencia", ["expira_en"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_idempotencia_expira_en", table_name="idempotencia")
+    op.drop_table("idempotencia")
@@ -0,0 +1,40 @@
+"""puntos de reorden, nivel par y velocidad de venta por producto
+
+Revision ID: 0006_reorden
+Revises: 0005_idempotencia
+Create Date: 2026-10-18 17:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_reorden"
+down_revision: Union[str, Sequence[str], None] = "0005_idempotencia"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("productos", sa.Column("punto_reorden", sa.Integer(), nullable=True))
+    op.add_column("productos", sa.Column("nivel_par", sa.Integer(), nullable=True))
+    op.add_column("productos", sa.Column("velocidad_ema", sa.Float(), nullable=False, server_default="0"))
+    op.add_column("productos", sa.Column("velocidad_en", sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        "ix_productos_bajo_reorden", "productos", ["id_producto"],
+        postgresql_where=sa.text("punto_reorden IS NOT NULL"),
+    )
+    # La velocidad arranca en 0; POST /reportes/rebuild la reconstruye desde las ventas
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_productos_bajo_reorden", table_name="productos")
+    op.drop_column("productos", "velocidad_en")
+    op.drop_column("productos", "velocidad_ema")
+    op.drop_column("productos", "nivel_par")
+    op.drop_column("productos", "punto_reorden")
@@ -0,0 +1,46 @@
+"""checkpoints de la reconciliación de stock
+
+Revision ID: 0007_reconciliacion_checkpoints
+Revises: 0006_reorden
+Create Date: 2026-10-18 18:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_reconciliacion_checkpoints"
+down_revision: Union[str, Sequence[str], None] = "0006_reorden"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # IF NOT EXISTS: en bases creadas con init_db (create_all) la tabla ya existe
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS reconciliacion_checkpoints ("
+        " id_producto integer PRIMARY KEY REFERENCES productos (id_producto) ON DELETE CASCADE,"
+        " ultimo_id_movimiento integer NOT NULL DEFAULT 0,"
+        " saldo integer NOT NULL DEFAULT 0,"
+        " actualizado_en timestamptz DEFAULT now())"
+    )
+    # Productos anteriores a los movimientos de alta/ajuste: su stock inicial nunca se
+    # registró como movimiento. Se toma como saldo de apertura (ultimo_id_movimiento = 0)
+    # la diferencia entre la cantidad actual y lo que explican sus movimientos.
+    op.execute(
+        "INSERT INTO reconciliacion_checkpoints (id_producto, ultimo_id_movimiento, saldo) "
+        "SELECT p.id_producto, 0, p.cantidad - coalesce(("
+        "  SELECT sum(CASE WHEN m.tipo_movimiento = 'entrada' THEN m.cantidad ELSE -m.cantidad END)"
+        "  FROM inventario_movimientos m WHERE m.id_producto = p.id_producto), 0) "
+        "FROM productos p "
+        "ON CONFLICT (id_producto) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS reconciliacion_checkpoints")
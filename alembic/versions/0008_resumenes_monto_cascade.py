@@ -0,0 +1,52 @@
+"""monto_total en los resúmenes de ventas y FK con ON DELETE CASCADE
+
+Revision ID: 0008_resumenes_monto_cascade
+Revises: 0007_reconciliacion_checkpoints
+Create Date: 2026-10-18 19:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_resumenes_monto_cascade"
+down_revision: Union[str, Sequence[str], None] = "0007_reconciliacion_checkpoints"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLAS = ("productos_mas_vendidos", "productos_menos_vendidos")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for tabla in TABLAS:
+        op.execute(f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS monto_total numeric(12, 2) NOT NULL DEFAULT 0")
+        # Borrar un producto ya no falla por su fila de resumen
+        op.execute(f"ALTER TABLE {tabla} DROP CONSTRAINT IF EXISTS {tabla}_id_producto_fkey")
+        op.execute(
+            f"ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_id_producto_fkey FOREIGN KEY (id_producto) "
+            "REFERENCES productos (id_producto) ON DELETE CASCADE"
+        )
+        # Los resúmenes se mantienen sumando deltas por venta: se parte de totales
+        # exactos (mismo cálculo que rebuild_resumenes_ventas)
+        op.execute(f"DELETE FROM {tabla}")
+        op.execute(
+            f"INSERT INTO {tabla} (id_producto, nombre, total_vendido, monto_total) "
+            "SELECT v.id_producto, p.nombre, sum(v.cantidad_vendida), sum(v.total_venta) "
+            "FROM ventas v JOIN productos p ON p.id_producto = v.id_producto "
+            "GROUP BY v.id_producto, p.nombre"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabla in TABLAS:
+        op.execute(f"ALTER TABLE {tabla} DROP CONSTRAINT IF EXISTS {tabla}_id_producto_fkey")
+        op.execute(
+            f"ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_id_producto_fkey FOREIGN KEY (id_producto) "
+            "REFERENCES productos (id_producto)"
+        )
+        op.execute(f"ALTER TABLE {tabla} DROP COLUMN IF EXISTS monto_total")
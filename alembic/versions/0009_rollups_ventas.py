@@ -0,0 +1,48 @@
+"""rollups de ventas por hora y por día
+
+Revision ID: 0009_rollups_ventas
+Revises: 0008_resumenes_monto_cascade
+Create Date: 2026-10-18 20:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.crud import rebuild_rollups_stmts
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009_rollups_ventas"
+down_revision: Union[str, Sequence[str], None] = "0008_resumenes_monto_cascade"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLAS = ("ventas_por_hora", "ventas_por_dia")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for tabla in TABLAS:
+        # IF NOT EXISTS: en bases creadas con init_db (create_all) la tabla ya existe
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {tabla} ("
+            " bucket timestamptz NOT NULL,"
+            " id_producto integer NOT NULL REFERENCES productos (id_producto) ON DELETE CASCADE,"
+            " unidades bigint NOT NULL DEFAULT 0,"
+            " monto numeric(14, 2) NOT NULL DEFAULT 0,"
+            " tickets integer NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (bucket, id_producto))"
+        )
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_{tabla}_id_producto ON {tabla} (id_producto)")
+    # Back-fill completo desde ventas (lo mismo que rebuild_rollups_ventas)
+    bind = op.get_bind()
+    for stmt in rebuild_rollups_stmts():
+        bind.execute(stmt)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabla in TABLAS:
+        op.execute(f"DROP TABLE IF EXISTS {tabla}")
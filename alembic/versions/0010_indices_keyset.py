@@ -0,0 +1,50 @@
+"""índices compuestos para la paginación keyset de ventas y movimientos
+
+Revision ID: 0010_indices_keyset
+Revises: 0009_rollups_ventas
+Create Date: 2026-10-18 21:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010_indices_keyset"
+down_revision: Union[str, Sequence[str], None] = "0009_rollups_ventas"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDICES = {
+    "ix_ventas_producto_id_venta": "ventas (id_producto, id_venta)",
+    "ix_ventas_usuario_id_venta": "ventas (id_usuario, id_venta)",
+    "ix_ventas_fecha_venta_id_venta": "ventas (fecha_venta, id_venta)",
+    "ix_inventario_movimientos_producto_id": "inventario_movimientos (id_producto, id_movimiento)",
+}
+# Índices de una columna que los compuestos reemplazan (cubren el mismo prefijo)
+ANTERIORES = {
+    "ix_ventas_id_producto": "ventas (id_producto)",
+    "ix_ventas_id_usuario": "ventas (id_usuario)",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY no bloquea las escrituras en ventas mientras se construye el índice;
+    # no puede correr dentro de una transacción
+    with op.get_context().autocommit_block():
+        for nombre, definicion in INDICES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {definicion}")
+        for nombre in ANTERIORES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for nombre, definicion in ANTERIORES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {definicion}")
+        for nombre in INDICES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
@@ -0,0 +1,37 @@
+"""versión por catálogo para las cachés en proceso
+
+Revision ID: 0011_catalogo_version
+Revises: 0010_indices_keyset
+Create Date: 2026-10-18 22:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011_catalogo_version"
+down_revision: Union[str, Sequence[str], None] = "0010_indices_keyset"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # IF NOT EXISTS: en bases creadas con init_db (create_all) la tabla ya existe
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS catalogo_version ("
+        " nombre varchar(40) PRIMARY KEY,"
+        " version bigint NOT NULL)"
+    )
+    op.execute(
+        "INSERT INTO catalogo_version (nombre, version) VALUES ('productos', 1), ('usuarios', 1) "
+        "ON CONFLICT (nombre) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS catalogo_version")
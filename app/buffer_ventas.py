@@ -0,0 +1,355 @@
+# app/buffer_ventas.py
+"""
+Buffer de ventas con diario local (opt-in, VENTAS_BUFFER=1).
+
+Si la BD remota está lenta o cae unos segundos, POST /ventas/ y /web/ventas no
+deben frenar la barra:
+- la venta se valida contra una vista local de stock y usuarios y se escribe en
+  un diario SQLite en modo WAL (synchronous=FULL: durable antes de responder);
+  la respuesta es 202 con la clave de la venta (Idempotency-Key o una uuid),
+- una tarea de fondo la envía a Postgres en micro-lotes (crud.aplicar_ventas_buffer);
+  la clave se guarda en ventas_buffer_claves en la misma transacción, así que
+  reenviar tras una caída no duplica ventas ni descuenta stock dos veces,
+- al arrancar se reanudan las pendientes del diario; si Postgres no responde se usa
+  la última vista de stock guardada en el propio diario,
+- una venta que al sincronizar ya no cabe queda en estado "conflicto" con el motivo
+  (GET /ventas/buffer/conflictos) y se registra en el log.
+
+El diario es por máquina: varios workers de uvicorn comparten el archivo, y solo
+uno envía lotes a la vez (lease en la tabla `meta`).
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from . import crud, schemas
+from .database import AsyncSessionLocal
+from .entorno import env_bool
+
+logger = logging.getLogger("buffer_ventas")
+
+HABILITADO = env_bool("VENTAS_BUFFER", False)
+RUTA = os.getenv("VENTAS_BUFFER_PATH", "ventas_buffer.sqlite3")
+LOTE = int(os.getenv("VENTAS_BUFFER_LOTE", "200"))
+ESPERA_LOTE = float(os.getenv("VENTAS_BUFFER_ESPERA", "0.2"))       # s para juntar un micro-lote
+REFRESCO = float(os.getenv("VENTAS_BUFFER_REFRESCO", "30"))         # s entre refrescos de la vista local
+RETENCION = timedelta(hours=float(os.getenv("VENTAS_BUFFER_RETENCION_HORAS", "24")))
+RETENCION_CLAVES = timedelta(days=float(os.getenv("VENTAS_BUFFER_RETENCION_CLAVES_DIAS", "7")))
+BACKOFF_MAX = 30.0
+LEASE = 30.0
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ventas (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT NOT NULL UNIQUE,
+    id_usuario INTEGER NOT NULL,
+    id_producto INTEGER NOT NULL,
+    cantidad_vendida INTEGER NOT NULL,
+    fecha TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendiente',   -- pendiente | aplicada | conflicto
+    id_venta INTEGER,
+    error TEXT,
+    actualizada TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_ventas_estado ON ventas (estado, seq);
+CREATE INDEX IF NOT EXISTS ix_ventas_pendientes_producto ON ventas (id_producto) WHERE estado = 'pendiente';
+CREATE TABLE IF NOT EXISTS stock (id_producto INTEGER PRIMARY KEY, disponible INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS usuarios (id_usuario INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT, hasta REAL);
+"""
+
+_COLUMNAS = "clave, id_usuario, id_producto, cantidad_vendida, fecha, estado, id_venta, error"
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+class BufferNoListo(Exception):
+    """El buffer no tiene vista de stock (nunca pudo leer Postgres): usar el camino directo."""
+
+class DiarioVentas:
+    """Acceso síncrono al diario SQLite (se llama vía asyncio.to_thread)."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False, timeout=10)
+        self._con.row_factory = sqlite3.Row
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=FULL")
+        self._con.executescript(_ESQUEMA)
+
+    def cerrar(self):
+        with self._lock:
+            self._con.close()
+
+    def _tx(self, fn, *args):
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                r = fn(self._con, *args)
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+            self._con.execute("COMMIT")
+            return r
+
+    def tiene_vista(self) -> bool:
+        with self._lock:
+            return self._con.execute("SELECT 1 FROM stock LIMIT 1").fetchone() is not None
+
+    def registrar(self, v: schemas.VentaCreate, clave: str, fecha: datetime) -> dict:
+        def tx(con: sqlite3.Connection):
+            fila = con.execute(f"SELECT {_COLUMNAS} FROM ventas WHERE clave = ?", (clave,)).fetchone()
+            if fila:
+                return dict(fila)  # reintento del cliente: misma respuesta, sin tocar stock
+            if con.execute("SELECT 1 FROM usuarios WHERE id_usuario = ?", (v.id_usuario,)).fetchone() is None:
+                raise ValueError("Usuario no existe")
+            cur = con.execute(
+                "UPDATE stock SET disponible = disponible - ? WHERE id_producto = ? AND disponible >= ?",
+                (v.cantidad_vendida, v.id_producto, v.cantidad_vendida),
+            )
+            if cur.rowcount == 0:
+                existe = con.execute("SELECT 1 FROM stock WHERE id_producto = ?", (v.id_producto,)).fetchone()
+                raise ValueError("Stock insuficiente" if existe else "Producto no existe")
+            con.execute(
+                "INSERT INTO ventas (clave, id_usuario, id_producto, cantidad_vendida, fecha) VALUES (?, ?, ?, ?, ?)",
+                (clave, v.id_usuario, v.id_producto, v.cantidad_vendida, fecha.isoformat()),
+            )
+            return {
+                "clave": clave, "id_usuario": v.id_usuario, "id_producto": v.id_producto,
+                "cantidad_vendida": v.cantidad_vendida, "fecha": fecha.isoformat(), "estado": "pendiente",
+                "id_venta": None, "error": None,
+            }
+        return self._tx(tx)
+
+    def obtener(self, clave: str) -> Optional[dict]:
+        with self._lock:
+            fila = self._con.execute(f"SELECT {_COLUMNAS} FROM ventas WHERE clave = ?", (clave,)).fetchone()
+        return dict(fila) if fila else None
+
+    def pendientes(self, n: int) -> list[dict]:
+        with self._lock:
+            filas = self._con.execute(
+                f"SELECT {_COLUMNAS} FROM ventas WHERE estado = 'pendiente' ORDER BY seq LIMIT ?", (n,)
+            ).fetchall()
+        return [dict(f) for f in filas]
+
+    def conflictos(self, n: int) -> list[dict]:
+        with self._lock:
+            filas = self._con.execute(
+                f"SELECT {_COLUMNAS} FROM ventas WHERE estado = 'conflicto' ORDER BY seq DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [dict(f) for f in filas]
+
+    def marcar(self, resultado: dict[str, dict]):
+        ahora = _ahora().isoformat()
+        self._tx(lambda con: con.executemany(
+            "UPDATE ventas SET estado = ?, id_venta = ?, error = ?, actualizada = ? WHERE clave = ? AND estado = 'pendiente'",
+            [(r["estado"], r.get("id_venta"), r.get("error"), ahora, clave) for clave, r in resultado.items()],
+        ))
+
+    def refrescar_vista(self, stock: dict[int, int], usuarios: list[int]):
+        """Stock de Postgres menos lo que sigue pendiente en el diario."""
+        def tx(con: sqlite3.Connection):
+            con.execute("DELETE FROM stock")
+            con.executemany("INSERT INTO stock (id_producto, disponible) VALUES (?, ?)", stock.items())
+            con.execute(
+                "UPDATE stock SET disponible = disponible - coalesce(("
+                " SELECT sum(cantidad_vendida) FROM ventas"
+                " WHERE estado = 'pendiente' AND ventas.id_producto = stock.id_producto), 0)"
+            )
+            con.execute("DELETE FROM usuarios")
+            con.executemany("INSERT INTO usuarios (id_usuario) VALUES (?)", [(u,) for u in usuarios])
+        self._tx(tx)
+
+    def compactar(self, antes_de: datetime) -> int:
+        # Las aplicadas solo sirven para responder reintentos; los conflictos se conservan
+        return self._tx(lambda con: con.execute(
+            "DELETE FROM ventas WHERE estado = 'aplicada' AND actualizada < ?", (antes_de.isoformat(),)
+        ).rowcount)
+
+    def tomar_lease(self, dueño: str, segundos: float) -> bool:
+        def tx(con: sqlite3.Connection):
+            ahora = time.time()
+            cur = con.execute(
+                "UPDATE meta SET valor = ?, hasta = ? WHERE clave = 'envio' AND (valor = ? OR hasta < ?)",
+                (dueño, ahora + segundos, dueño, ahora),
+            )
+            if cur.rowcount:
+                return True
+            cur = con.execute(
+                "INSERT OR IGNORE INTO meta (clave, valor, hasta) VALUES ('envio', ?, ?)", (dueño, ahora + segundos)
+            )
+            return cur.rowcount == 1
+        return self._tx(tx)
+
+    def soltar_lease(self, dueño: str):
+        self._tx(lambda con: con.execute("UPDATE meta SET hasta = 0 WHERE clave = 'envio' AND valor = ?", (dueño,)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            por_estado = dict(self._con.execute("SELECT estado, count(*) FROM ventas GROUP BY estado").fetchall())
+            mas_vieja = self._con.execute(
+                "SELECT min(fecha) FROM ventas WHERE estado = 'pendiente'"
+            ).fetchone()[0]
+        return {
+            "pendientes": por_estado.get("pendiente", 0),
+            "aplicadas": por_estado.get("aplicada", 0),
+            "conflictos": por_estado.get("conflicto", 0),
+            "pendiente_mas_vieja_s": (
+                round((_ahora() - datetime.fromisoformat(mas_vieja)).total_seconds(), 1) if mas_vieja else None
+            ),
+        }
+
+
+class BufferVentas:
+    """Acepta ventas contra el diario local y las envía a Postgres en segundo plano."""
+
+    def __init__(self, ruta: str = RUTA):
+        self.ruta = ruta
+        self.diario: Optional[DiarioVentas] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._despertar = asyncio.Event()
+        self._parar = asyncio.Event()
+        self._id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._ultimo_refresco = 0.0
+        self._ultimo_envio: Optional[datetime] = None
+        self._ultimo_error: Optional[str] = None
+        self._enviadas = 0
+        self._vista = False
+
+    @property
+    def activo(self) -> bool:
+        return self.diario is not None
+
+    async def iniciar(self):
+        self.diario = await asyncio.to_thread(DiarioVentas, self.ruta)
+        self._vista = await asyncio.to_thread(self.diario.tiene_vista)
+        try:
+            await self._refrescar()
+        except Exception as e:
+            # Arranque con la BD caída: seguimos con la última vista guardada en el diario
+            self._ultimo_error = str(e)
+            logger.warning("Buffer de ventas: no se pudo leer stock de Postgres (%s); uso la vista guardada", e)
+        self._parar.clear()
+        self._tarea = asyncio.create_task(self._bucle())
+        logger.info("Buffer de ventas iniciado (%s)", self.ruta)
+
+    async def detener(self, timeout: float = 5):
+        self._parar.set()
+        self._despertar.set()
+        if self._tarea:
+            try:
+                await asyncio.wait_for(self._tarea, timeout=timeout)
+            except asyncio.TimeoutError:
+                self._tarea.cancel()
+                await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+        if self.diario:
+            await asyncio.to_thread(self.diario.cerrar)
+            self.diario = None
+
+    async def registrar(self, data: schemas.VentaCreate, clave: Optional[str] = None) -> dict:
+        """Valida contra la vista local y escribe en el diario. ValueError si no hay stock, producto o usuario."""
+        if not self.activo or not self._vista:
+            raise BufferNoListo()
+        venta = await asyncio.to_thread(self.diario.registrar, data, clave or uuid.uuid4().hex, _ahora())
+        self._despertar.set()
+        return venta
+
+    async def obtener(self, clave: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.diario.obtener, clave) if self.activo else None
+
+    async def conflictos(self, n: int = 100) -> list[dict]:
+        return await asyncio.to_thread(self.diario.conflictos, n) if self.activo else []
+
+    async def stats(self) -> dict:
+        if not self.activo:
+            return {"habilitado": HABILITADO, "activo": False}
+        return {
+            "habilitado": HABILITADO,
+            "activo": True,
+            "ruta": self.ruta,
+            **await asyncio.to_thread(self.diario.stats),
+            "enviadas": self._enviadas,
+            "ultimo_envio": self._ultimo_envio.isoformat() if self._ultimo_envio else None,
+            "ultimo_error": self._ultimo_error,
+        }
+
+    async def _refrescar(self):
+        async with AsyncSessionLocal() as db:
+            stock, usuarios = await crud.stock_y_usuarios(db)
+            await crud.purgar_claves_buffer(db, _ahora() - RETENCION_CLAVES)
+        await asyncio.to_thread(self.diario.refrescar_vista, stock, usuarios)
+        self._vista = True
+        await asyncio.to_thread(self.diario.compactar, _ahora() - RETENCION)
+        self._ultimo_refresco = time.monotonic()
+
+    async def enviar(self) -> int:
+        """Envía pendientes en micro-lotes hasta vaciar el diario. Devuelve cuántas se resolvieron."""
+        if not await asyncio.to_thread(self.diario.tomar_lease, self._id, LEASE):
+            return 0  # otro worker está enviando
+        total = 0
+        try:
+            while True:
+                lote = await asyncio.to_thread(self.diario.pendientes, LOTE)
+                if not lote:
+                    break
+                for e in lote:
+                    e["fecha"] = datetime.fromisoformat(e["fecha"])
+                async with AsyncSessionLocal() as db:
+                    resultado = await crud.aplicar_ventas_buffer(db, lote)
+                await asyncio.to_thread(self.diario.marcar, resultado)
+                for clave, r in resultado.items():
+                    if r["estado"] == "conflicto":
+                        logger.warning("Venta %s en conflicto al sincronizar: %s", clave, r["error"])
+                total += len(resultado)
+                self._enviadas += sum(r["estado"] == "aplicada" for r in resultado.values())
+                if len(resultado) < len(lote):
+                    break  # el resto sigue en carrera con otras escrituras: próximo ciclo
+                await asyncio.to_thread(self.diario.tomar_lease, self._id, LEASE)
+        finally:
+            await asyncio.to_thread(self.diario.soltar_lease, self._id)
+        return total
+
+    async def _bucle(self):
+        espera = 1.0
+        while not self._parar.is_set():
+            try:
+                enviadas = await self.enviar()
+                if enviadas or time.monotonic() - self._ultimo_refresco > REFRESCO:
+                    await self._refrescar()
+                if enviadas:
+                    self._ultimo_envio = _ahora()
+                self._ultimo_error = None
+                espera = 1.0
+            except Exception as e:
+                # BD lenta o caída: las ventas siguen entrando al diario; reintento con backoff
+                self._ultimo_error = str(e)
+                logger.warning("Buffer de ventas: envío fallido (%s); reintento en %.0fs", e, espera)
+                try:
+                    await asyncio.wait_for(self._parar.wait(), timeout=espera)
+                except asyncio.TimeoutError:
+                    pass
+                espera = min(espera * 2, BACKOFF_MAX)
+                continue
+            self._despertar.clear()
+            try:
+                await asyncio.wait_for(self._despertar.wait(), timeout=REFRESCO)
+            except asyncio.TimeoutError:
+                pass
+            if not self._parar.is_set():
+                await asyncio.sleep(ESPERA_LOTE)  # junta las ventas que llegan casi juntas
+        # Último envío al apagar; lo que no salga queda en el diario para el próximo arranque
+        try:
+            await self.enviar()
+        except Exception as e:
+            logger.warning("Buffer de ventas: envío final fallido (%s); quedan pendientes en el diario", e)
+
+buffer = BufferVentas()
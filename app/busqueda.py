@@ -0,0 +1,61 @@
+# app/busqueda.py
+"""
+Índice de trigramas en memoria para búsqueda de productos cuando la BD no es
+PostgreSQL (SQLite en pruebas/local). Imita pg_trgm: minúsculas, palabras con
+relleno "  palabra " y puntaje = fracción de trigramas de la consulta presentes.
+"""
+import re
+from collections import defaultdict
+
+UMBRAL = 0.6  # como pg_trgm.word_similarity_threshold
+
+_PALABRA = re.compile(r"\w+")
+
+def trigramas(texto: str) -> set[str]:
+    out = set()
+    for palabra in _PALABRA.findall(texto.lower()):
+        w = f"  {palabra} "
+        out.update(w[i:i + 3] for i in range(len(w) - 2))
+    return out
+
+class IndiceTrigramas:
+    def __init__(self):
+        self.vigente = False
+        self._textos: dict[int, str] = {}
+        self._postings: dict[str, set[int]] = defaultdict(set)
+
+    def construir(self, filas):
+        """filas: iterable de (id_producto, texto_busqueda)."""
+        self._textos.clear()
+        self._postings.clear()
+        for pid, texto in filas:
+            texto = texto or ""
+            self._textos[pid] = texto
+            for t in trigramas(texto):
+                self._postings[t].add(pid)
+        self.vigente = True
+
+    def invalidar(self):
+        self.vigente = False
+
+    def buscar(self, q: str) -> list[tuple[float, int]]:
+        """(puntaje, id) de los productos que contienen q o se le parecen, mejor puntaje primero."""
+        q = q.strip().lower()
+        tq = trigramas(q)
+        conteo: dict[int, int] = defaultdict(int)
+        for t in tq:
+            for pid in self._postings.get(t, ()):
+                conteo[pid] += 1
+        res = []
+        for pid, n in conteo.items():
+            puntaje = n / len(tq)
+            if puntaje >= UMBRAL or q in self._textos[pid]:
+                res.append((puntaje, pid))
+        # Subcadenas sin trigramas completos (consultas de 1-2 letras)
+        if not tq or len(q) < 3:
+            vistos = {pid for _, pid in res}
+            res.extend((0.0, pid) for pid, texto in self._textos.items() if pid not in vistos and q in texto)
+        res.sort(key=lambda x: (-x[0], x[1]))
+        return res
+
+indice = IndiceTrigramas()
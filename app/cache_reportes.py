@@ -0,0 +1,203 @@
+# app/cache_reportes.py
+"""
+Caché de respuestas de /reportes/* y del dashboard renderizado.
+
+- Clave = ruta + parámetros de consulta ordenados (limit, desde, hasta, ...),
+  prefijada con la versión actual del namespace "ventas".
+- create_venta, create_ventas_lote, create_movimiento, el rebuild y las escrituras
+  de productos llaman a invalidar(): suben la versión y las claves viejas dejan de
+  usarse (se caen solas del LRU o por TTL).
+- Cada respuesta lleva ETag (hash del cuerpo) y Cache-Control: no-cache, así los
+  navegadores revalidan siempre y reciben 304 si nada cambió.
+- Backend por defecto: LRU en memoria del worker; la versión es local, así que en
+  otros workers una respuesta puede quedar vieja hasta REPORTES_CACHE_TTL segundos.
+  Con REPORTES_CACHE_URL=redis://... (y el paquete `redis` instalado) caché y versión
+  se comparten entre workers. configurar() admite cualquier otro backend.
+- Un cliente que acaba de escribir (cookie de read-your-writes) no lee de la caché.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Protocol
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from .database import acaba_de_escribir
+
+try:
+    import redis.asyncio as redis_async
+except ImportError:  # pragma: no cover - dependencia opcional
+    redis_async = None
+
+logger = logging.getLogger("cache")
+
+TTL = float(os.getenv("REPORTES_CACHE_TTL", "10"))
+MAX_ENTRADAS = int(os.getenv("REPORTES_CACHE_MAX", "256"))
+URL_COMPARTIDA = os.getenv("REPORTES_CACHE_URL")
+NAMESPACE = "ventas"
+
+class Backend(Protocol):
+    async def get(self, clave: str) -> Optional[bytes]: ...
+    async def set(self, clave: str, valor: bytes, ttl: float): ...
+    async def version(self, namespace: str) -> int: ...
+    async def incr(self, namespace: str) -> int: ...
+
+class BackendMemoria:
+    """LRU acotado a max_entradas, con expiración por entrada."""
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._datos: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._versiones: dict[str, int] = {}
+
+    async def get(self, clave: str) -> Optional[bytes]:
+        e = self._datos.get(clave)
+        if e is None:
+            return None
+        if e[0] < time.monotonic():
+            del self._datos[clave]
+            return None
+        self._datos.move_to_end(clave)
+        return e[1]
+
+    async def set(self, clave: str, valor: bytes, ttl: float):
+        self._datos[clave] = (time.monotonic() + ttl, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+
+    async def version(self, namespace: str) -> int:
+        return self._versiones.get(namespace, 0)
+
+    async def incr(self, namespace: str) -> int:
+        self._versiones[namespace] = self._versiones.get(namespace, 0) + 1
+        return self._versiones[namespace]
+
+    def __len__(self):
+        return len(self._datos)
+
+class BackendRedis:
+    """Backend compartido entre workers (requiere `redis`)."""
+
+    def __init__(self, url: str, prefijo: str = "inventariobar:cache:"):
+        self._r = redis_async.from_url(url)
+        self._p = prefijo
+
+    async def get(self, clave: str) -> Optional[bytes]:
+        return await self._r.get(self._p + clave)
+
+    async def set(self, clave: str, valor: bytes, ttl: float):
+        await self._r.set(self._p + clave, valor, px=int(ttl * 1000))
+
+    async def version(self, namespace: str) -> int:
+        return int(await self._r.get(f"{self._p}v:{namespace}") or 0)
+
+    async def incr(self, namespace: str) -> int:
+        return await self._r.incr(f"{self._p}v:{namespace}")
+
+class CacheRespuestas:
+    def __init__(self, backend: Backend, ttl: float = TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.no_modificados = 0
+        self.omitidos = 0
+        self.errores = 0
+
+    def configurar(self, backend: Backend):
+        self.backend = backend
+
+    async def invalidar(self, namespace: str = NAMESPACE):
+        """Sube la versión del namespace; llamar después del commit de la escritura."""
+        try:
+            await self.backend.incr(namespace)
+        except Exception as e:
+            self.errores += 1
+            logger.warning("No se pudo invalidar la caché (%s): %s", namespace, e)
+
+    @staticmethod
+    def _clave(request: Request, version: int) -> str:
+        params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"v{version}:{request.url.path}?{params}"
+
+    def _responder(self, request: Request, etag: str, media_type: str, body: bytes) -> Response:
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            self.no_modificados += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    async def responder(
+        self,
+        request: Request,
+        generar: Callable[[], Awaitable],
+        media_type: str = "application/json",
+        namespace: str = NAMESPACE,
+    ) -> Response:
+        """
+        Devuelve la respuesta cacheada para la petición o la genera con `generar()`.
+        `generar` devuelve bytes (p.ej. HTML ya renderizado) o algo serializable a JSON.
+        """
+        if acaba_de_escribir(request):
+            self.omitidos += 1
+            return self._responder(request, *self._empaquetar(await generar(), media_type))
+
+        clave = None
+        try:
+            clave = f"{namespace}:" + self._clave(request, await self.backend.version(namespace))
+            guardado = await self.backend.get(clave)
+        except Exception as e:
+            self.errores += 1
+            logger.warning("Caché no disponible: %s", e)
+            guardado = None
+        if guardado is not None:
+            self.hits += 1
+            etag, media, body = guardado.split(b"\n", 2)
+            return self._responder(request, etag.decode(), media.decode(), body)
+
+        self.misses += 1
+        etag, media, body = self._empaquetar(await generar(), media_type)
+        if clave is not None:
+            try:
+                await self.backend.set(clave, etag.encode() + b"\n" + media.encode() + b"\n" + body, self.ttl)
+            except Exception as e:
+                self.errores += 1
+                logger.warning("No se pudo guardar en caché: %s", e)
+        return self._responder(request, etag, media, body)
+
+    @staticmethod
+    def _empaquetar(valor, media_type: str) -> tuple[str, str, bytes]:
+        if isinstance(valor, bytes):
+            body = valor
+        else:
+            body = json.dumps(jsonable_encoder(valor), ensure_ascii=False, separators=(",", ":")).encode()
+        return f'"{hashlib.sha1(body).hexdigest()[:20]}"', media_type, body
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "no_modificados_304": self.no_modificados,
+            "omitidos_read_your_writes": self.omitidos,
+            "errores": self.errores,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "ttl": self.ttl,
+            "entradas": len(self.backend) if isinstance(self.backend, BackendMemoria) else None,
+        }
+
+def _backend_por_defecto() -> Backend:
+    if URL_COMPARTIDA:
+        if redis_async is None:
+            logger.warning("REPORTES_CACHE_URL definida pero `redis` no está instalado; se usa caché en memoria")
+        else:
+            return BackendRedis(URL_COMPARTIDA)
+    return BackendMemoria()
+
+cache = CacheRespuestas(_backend_por_defecto())
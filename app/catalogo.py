@@ -0,0 +1,141 @@
+# app/catalogo.py
+"""
+Caché en proceso de los catálogos de productos y usuarios (snapshots livianos
+para desplegables y mapas id -> nombre).
+
+Consistencia entre workers: cada escritura incrementa catalogo_version dentro de
+su transacción (bump). Una entrada en caché se sirve sin consultar la BD durante
+CATALOGO_TTL segundos; pasado ese tiempo se compara su versión con la de la BD
+(una lectura por PK) y solo se recarga si cambió. El worker que escribe invalida
+su copia local en el momento.
+"""
+import os
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, busqueda, cache_reportes
+
+TTL = float(os.getenv("CATALOGO_TTL", "5"))
+
+@dataclass(frozen=True, slots=True)
+class ProductoSnap:
+    id_producto: int
+    nombre: str
+    precio_venta: float
+    activo: bool
+
+@dataclass(frozen=True, slots=True)
+class UsuarioSnap:
+    id_usuario: int
+    nombre_usuario: str
+    activo: bool
+
+@dataclass(slots=True)
+class _Entrada:
+    version: int
+    verificado: float
+    items: list
+    por_id: dict
+
+async def bump(db: AsyncSession, nombre: str):
+    """Incrementa la versión del catálogo; llamar antes del commit de la escritura."""
+    # Upsert en una sentencia: dos primeras escrituras concurrentes no chocan en la PK
+    v = models.CatalogoVersion
+    ins = pg_insert(v).values(nombre=nombre, version=1)
+    await db.execute(ins.on_conflict_do_update(index_elements=[v.nombre], set_={"version": v.version + 1}))
+
+class CacheCatalogo:
+    def __init__(self, ttl: float = TTL):
+        self.ttl = ttl
+        self._entradas: dict[str, _Entrada] = {}
+        self.hits = 0
+        self.misses = 0
+        self.validaciones = 0
+
+    def invalidar(self, nombre: str | None = None):
+        if nombre is None:
+            self._entradas.clear()
+        else:
+            self._entradas.pop(nombre, None)
+
+    async def _obtener(self, db: AsyncSession, nombre: str, cargar) -> _Entrada:
+        ahora = time.monotonic()
+        e = self._entradas.get(nombre)
+        if e is not None and ahora - e.verificado < self.ttl:
+            self.hits += 1
+            return e
+
+        self.validaciones += 1
+        v = models.CatalogoVersion
+        version = (await db.execute(select(v.version).where(v.nombre == nombre))).scalar_one_or_none() or 0
+        if e is not None and e.version == version:
+            e.verificado = ahora
+            self.hits += 1
+            return e
+
+        self.misses += 1
+        items = await cargar(db)
+        e = _Entrada(version=version, verificado=ahora, items=items, por_id={_id(i): i for i in items})
+        self._entradas[nombre] = e
+        return e
+
+    async def productos(self, db: AsyncSession) -> list[ProductoSnap]:
+        return (await self._obtener(db, "productos", _cargar_productos)).items
+
+    async def usuarios(self, db: AsyncSession) -> list[UsuarioSnap]:
+        return (await self._obtener(db, "usuarios", _cargar_usuarios)).items
+
+    async def mapa_productos(self, db: AsyncSession) -> dict[int, ProductoSnap]:
+        return (await self._obtener(db, "productos", _cargar_productos)).por_id
+
+    async def mapa_usuarios(self, db: AsyncSession) -> dict[int, UsuarioSnap]:
+        return (await self._obtener(db, "usuarios", _cargar_usuarios)).por_id
+
+    async def version(self, db: AsyncSession, nombre: str) -> int:
+        """Versión vigente del catálogo (misma validación por TTL que los snapshots)."""
+        cargar = _cargar_productos if nombre == "productos" else _cargar_usuarios
+        return (await self._obtener(db, nombre, cargar)).version
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "validaciones": self.validaciones,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "ttl": self.ttl,
+            "versiones": {k: e.version for k, e in self._entradas.items()},
+        }
+
+def _id(item) -> int:
+    return item.id_producto if isinstance(item, ProductoSnap) else item.id_usuario
+
+async def _cargar_productos(db: AsyncSession) -> list[ProductoSnap]:
+    p = models.Producto
+    res = await db.execute(select(p.id_producto, p.nombre, p.precio_venta, p.activo).order_by(p.id_producto))
+    return [ProductoSnap(*r) for r in res.all()]
+
+async def _cargar_usuarios(db: AsyncSession) -> list[UsuarioSnap]:
+    u = models.Usuario
+    res = await db.execute(select(u.id_usuario, u.nombre_usuario, u.activo).order_by(u.id_usuario))
+    return [UsuarioSnap(*r) for r in res.all()]
+
+cache = CacheCatalogo()
+
+async def commit_escritura(db: AsyncSession, nombre: str):
+    """
+    Commit de una escritura sobre el catálogo `nombre`: sube la versión en la misma
+    transacción e invalida las copias locales (caché y, para productos, el índice
+    de búsqueda en memoria).
+    """
+    await bump(db, nombre)
+    await db.commit()
+    cache.invalidar(nombre)
+    if nombre == "productos":
+        busqueda.indice.invalidar()
+        # Los rankings muestran nombres de producto
+        await cache_reportes.cache.invalidar()
@@ -1,10 +1,15 @@
 # app/crud.py
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-from sqlalchemy import select, func, case, or_, delete, text, desc
+from sqlalchemy import (
+    select, func, case, or_, and_, delete, text, desc, asc, update, insert, literal, literal_column, cast, values, column,
+    union_all, true, DateTime, Float, Integer, Numeric, String,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from . import models, schemas
+from sqlalchemy.orm import aliased
+from . import models, schemas, busqueda, catalogo, cache_reportes, eventos, reorden
 from .models import ProductoMasVendido as PMV, ProductoMenosVendido as PMeV
 from types import SimpleNamespace
 
@@ -15,10 +20,11 @@ async def create_usuario(db: AsyncSession, data: schemas.UsuarioCreate):
         correo=data.correo,
         rol=data.rol,
         foto_url=data.foto_url,
+        foto_thumb_url=data.foto_thumb_url,
     )
     db.add(obj)
     try:
-        await db.commit()
+        await catalogo.commit_escritura(db, "usuarios")
         await db.refresh(obj)
         return obj
     except IntegrityError:
@@ -39,7 +45,7 @@ async def update_usuario(db: AsyncSession, usuario_id: int, data: schemas.Usuari
     payload = data.model_dump(exclude_unset=True)
     for k, v in payload.items():
         setattr(obj, k, v)
-    await db.commit()
+    await catalogo.commit_escritura(db, "usuarios")
     await db.refresh(obj)
     return obj
 
@@ -48,7 +54,7 @@ async def delete_usuario(db: AsyncSession, usuario_id: int):
     if not obj:
         return None
     await db.delete(obj)
-    await db.commit()
+    await catalogo.commit_escritura(db, "usuarios")
     return True
 
 
@@ -57,39 +63,101 @@ async def list_productos(db: AsyncSession):
     res = await db.execute(select(models.Producto).order_by(models.Producto.id_producto))
     return res.scalars().all()
 
-async def search_productos(db: AsyncSession, q: Optional[str], limit: int = 50, offset: int = 0):
-    stmt = select(models.Producto).order_by(models.Producto.id_producto)
-    if q:
-        iq = f"%{q.strip().lower()}%"
-        stmt = stmt.where(
-            or_(
-                func.lower(models.Producto.nombre).ilike(iq),
-                func.lower(models.Producto.categoria).ilike(iq),
-                func.lower(models.Producto.marca).ilike(iq),
-            )
+async def search_productos(
+    db: AsyncSession,
+    q: Optional[str],
+    limit: int = 50,
+    despues_de: tuple[float, int] | None = None,
+):
+    """
+    Búsqueda por nombre/categoría/marca con paginación keyset.
+    Devuelve (productos, siguiente): `siguiente` es la clave (puntaje, id) del último
+    producto si hay más páginas, o None.
+      - PostgreSQL: índice GIN pg_trgm sobre productos.busqueda, ordenado por word_similarity.
+      - Otros motores (SQLite en pruebas): índice de trigramas en memoria (app.busqueda).
+    """
+    p = models.Producto
+    q = (q or "").strip().lower()
+    if not q:
+        stmt = select(p).order_by(p.id_producto).limit(limit + 1)
+        if despues_de:
+            stmt = stmt.where(p.id_producto > despues_de[1])
+        filas = [(0.0, x) for x in (await db.execute(stmt)).scalars().all()]
+    elif db.get_bind().dialect.name == "postgresql":
+        puntaje = func.word_similarity(q, p.busqueda)
+        stmt = (
+            select(puntaje.label("puntaje"), p)
+            .where(or_(p.busqueda.contains(q, autoescape=True), literal(q).op("<%")(p.busqueda)))
+            .order_by(puntaje.desc(), p.id_producto)
+            .limit(limit + 1)
         )
-    stmt = stmt.limit(limit).offset(offset)
-    res = await db.execute(stmt)
-    return res.scalars().all()
+        if despues_de:
+            s_ant, id_ant = despues_de
+            stmt = stmt.where(or_(puntaje < s_ant, and_(puntaje == s_ant, p.id_producto > id_ant)))
+        filas = [(float(r.puntaje), r.Producto) for r in (await db.execute(stmt)).all()]
+    else:
+        filas = await _buscar_en_memoria(db, q, limit, despues_de)
+
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = (filas[-1][0], filas[-1][1].id_producto)
+    return [x for _, x in filas], siguiente
+
+async def _buscar_en_memoria(db: AsyncSession, q: str, limit: int, despues_de: tuple[float, int] | None):
+    if not busqueda.indice.vigente:
+        res = await db.execute(select(models.Producto.id_producto, models.Producto.busqueda))
+        busqueda.indice.construir(res.all())
+    claves = busqueda.indice.buscar(q)
+    if despues_de:
+        claves = [k for k in claves if (-k[0], k[1]) > (-despues_de[0], despues_de[1])]
+    claves = claves[: limit + 1]
+    if not claves:
+        return []
+    res = await db.execute(select(models.Producto).where(models.Producto.id_producto.in_([pid for _, pid in claves])))
+    por_id = {x.id_producto: x for x in res.scalars().all()}
+    return [(s, por_id[pid]) for s, pid in claves if pid in por_id]
 
 async def get_producto(db: AsyncSession, producto_id: int):
     return await db.get(models.Producto, producto_id)
 
+def _movimiento_ajuste(db: AsyncSession, id_producto: int, antes: int, despues: int, descripcion: str):
+    """
+    Registra como movimiento un cambio directo de stock (alta o edición de cantidad),
+    para que la reconciliación (saldo de movimientos) siga cuadrando con productos.cantidad.
+    """
+    if despues == antes:
+        return
+    db.add(models.InventarioMovimiento(
+        id_producto=id_producto,
+        tipo_movimiento="entrada" if despues > antes else "salida",
+        cantidad=abs(despues - antes),
+        descripcion=descripcion,
+    ))
+
 async def create_producto(db: AsyncSession, data: schemas.ProductoCreate):
     obj = models.Producto(**data.model_dump())
     db.add(obj)
-    await db.commit()
+    await db.flush()
+    _movimiento_ajuste(db, obj.id_producto, 0, obj.cantidad, "alta de producto")
+    await eventos.notificar(db, [{"tipo": "stock", "id_producto": obj.id_producto, "cantidad": obj.cantidad}])
+    await catalogo.commit_escritura(db, "productos")
     await db.refresh(obj)
     return obj
 
 async def update_producto(db: AsyncSession, producto_id: int, data: schemas.ProductoUpdate):
-    obj = await db.get(models.Producto, producto_id)
+    # FOR UPDATE: la diferencia de stock se calcula contra la cantidad vigente, sin ventas intercaladas
+    obj = await db.get(models.Producto, producto_id, with_for_update=True)
     if not obj:
         return None
+    antes = obj.cantidad
     payload = data.model_dump(exclude_unset=True)
     for k, v in payload.items():
         setattr(obj, k, v)
-    await db.commit()
+    _movimiento_ajuste(db, producto_id, antes, obj.cantidad, "ajuste manual de stock")
+    if obj.cantidad != antes:
+        await eventos.notificar(db, [{"tipo": "stock", "id_producto": producto_id, "cantidad": obj.cantidad}])
+    await catalogo.commit_escritura(db, "productos")
     await db.refresh(obj)
     return obj
 
@@ -98,50 +166,468 @@ async def delete_producto(db: AsyncSession, producto_id: int):
     if not obj:
         return None
     await db.delete(obj)
-    await db.commit()
+    await catalogo.commit_escritura(db, "productos")
     return True
 
+_TMP_IMPORT = "_import_productos"
+_COLS_IMPORT = [
+    "fila", "id_producto", "nombre", "categoria", "marca", "cantidad", "precio_venta", "imagen_url",
+    "punto_reorden", "nivel_par",
+]
 
-# =============== VENTAS ===============
-async def create_venta(db: AsyncSession, data: schemas.VentaCreate):
-    producto = await db.get(models.Producto, data.id_producto)
-    if not producto:
-        raise ValueError("Producto no existe")
+# Bloquea antes del upsert los productos a actualizar (en orden de id) y guarda su
+# stock en cantidad_previa. No puede ser una CTE del mismo statement: un SELECT ...
+# FOR UPDATE no ve las filas que modifica un UPDATE hermano y las omitiría.
+_SQL_BLOQUEAR_IMPORT = text(f"""
+UPDATE {_TMP_IMPORT} t SET cantidad_previa = p.cantidad
+FROM (
+    SELECT id_producto, cantidad FROM productos
+    WHERE id_producto IN (SELECT id_producto FROM {_TMP_IMPORT})
+    ORDER BY id_producto
+    FOR UPDATE
+) p
+WHERE t.id_producto = p.id_producto
+""")
+
+_SQL_UPSERT_IMPORT = text(f"""
+WITH actualizados AS (
+    UPDATE productos p SET
+        nombre = coalesce(t.nombre, p.nombre),
+        categoria = coalesce(t.categoria, p.categoria),
+        marca = coalesce(t.marca, p.marca),
+        cantidad = coalesce(t.cantidad, p.cantidad),
+        precio_venta = coalesce(t.precio_venta, p.precio_venta),
+        imagen_url = coalesce(t.imagen_url, p.imagen_url),
+        punto_reorden = coalesce(t.punto_reorden, p.punto_reorden),
+        nivel_par = coalesce(t.nivel_par, p.nivel_par)
+    FROM {_TMP_IMPORT} t
+    WHERE t.id_producto = p.id_producto
+    RETURNING p.id_producto, p.cantidad, t.cantidad_previa
+), insertados AS (
+    INSERT INTO productos (nombre, categoria, marca, cantidad, precio_venta, imagen_url, punto_reorden, nivel_par)
+    SELECT nombre, categoria, marca, cantidad, precio_venta, imagen_url, punto_reorden, nivel_par
+    FROM {_TMP_IMPORT} WHERE id_producto IS NULL ORDER BY fila
+    RETURNING id_producto, cantidad
+), movimientos AS (
+    INSERT INTO inventario_movimientos (id_producto, tipo_movimiento, cantidad, descripcion)
+    SELECT a.id_producto,
+           CASE WHEN a.cantidad > a.cantidad_previa THEN 'entrada' ELSE 'salida' END,
+           abs(a.cantidad - a.cantidad_previa),
+           'importación (ajuste de stock)'
+    FROM actualizados a
+    WHERE a.cantidad <> a.cantidad_previa
+    UNION ALL
+    SELECT id_producto, 'entrada', cantidad, 'importación (alta)'
+    FROM insertados WHERE cantidad > 0
+    RETURNING 1
+), stock AS (
+    SELECT id_producto, cantidad FROM actualizados WHERE cantidad <> cantidad_previa
+    UNION ALL
+    SELECT id_producto, cantidad FROM insertados
+)
+SELECT (SELECT count(*) FROM actualizados) AS actualizados,
+       (SELECT count(*) FROM insertados) AS insertados,
+       (SELECT count(*) FROM movimientos) AS movimientos,
+       (SELECT array_agg(id_producto ORDER BY id_producto) FROM stock) AS stock_ids,
+       (SELECT array_agg(cantidad ORDER BY id_producto) FROM stock) AS stock_cantidades
+""")
+
+async def importar_productos(db: AsyncSession, bloques, errores: list[dict]) -> dict:
+    """
+    Importación masiva: cada bloque de filas validadas (async iterable, ver
+    importacion.bloques_validados) se
+    carga con COPY en una tabla temporal; se bloquean los productos a actualizar y
+    luego un único statement los actualiza, crea los que no traen id_producto y
+    registra en bloque un movimiento por cada diferencia de stock. Los cambios de
+    stock salen como eventos "stock" (app/eventos.py). Todo en una transacción.
+    Filas con id inexistente o repetido se reportan en `errores` (gana la última).
+    """
+    conn = await db.connection()
+    await conn.execute(text(
+        f"CREATE TEMP TABLE {_TMP_IMPORT} (fila int, id_producto int, nombre text, categoria text, "
+        "marca text, cantidad int, precio_venta float8, imagen_url text, punto_reorden int, nivel_par int, "
+        "cantidad_previa int) ON COMMIT DROP"
+    ))
+    apg = (await conn.get_raw_connection()).driver_connection
 
-    if producto.cantidad < data.cantidad_vendida:
-        raise ValueError("Stock insuficiente")
+    filas = 0
+    async for bloque in bloques:
+        await apg.copy_records_to_table(
+            _TMP_IMPORT,
+            records=[(n, *(d.get(c) for c in _COLS_IMPORT[1:])) for n, d in bloque],
+            columns=_COLS_IMPORT,
+        )
+        filas += len(bloque)
+    invalidas = len(errores)
 
-    usuario = await db.get(models.Usuario, data.id_usuario)
-    if not usuario:
-        raise ValueError("Usuario no existe")
+    inexistentes = await conn.execute(text(
+        f"DELETE FROM {_TMP_IMPORT} t WHERE t.id_producto IS NOT NULL "
+        "AND NOT EXISTS (SELECT 1 FROM productos p WHERE p.id_producto = t.id_producto) "
+        "RETURNING t.fila, t.id_producto"
+    ))
+    for fila, id_producto in inexistentes:
+        errores.append({"fila": fila, "error": f"Producto {id_producto} no existe"})
+    repetidos = await conn.execute(text(
+        f"DELETE FROM {_TMP_IMPORT} a USING {_TMP_IMPORT} b "
+        "WHERE a.id_producto = b.id_producto AND a.fila < b.fila RETURNING a.fila, a.id_producto"
+    ))
+    for fila, id_producto in repetidos:
+        errores.append({"fila": fila, "error": f"Producto {id_producto} repetido; se aplica la última fila"})
 
-    # Actualiza stock
-    producto.cantidad -= data.cantidad_vendida
+    await conn.execute(_SQL_BLOQUEAR_IMPORT)
+    r = (await conn.execute(_SQL_UPSERT_IMPORT)).one()
+    await eventos.notificar(db, [
+        {"tipo": "stock", "id_producto": pid, "cantidad": n}
+        for pid, n in zip(r.stock_ids or [], r.stock_cantidades or [])
+    ])
+    await catalogo.commit_escritura(db, "productos")
+    return {
+        "filas": filas + invalidas,
+        "insertados": r.insertados,
+        "actualizados": r.actualizados,
+        "movimientos": r.movimientos,
+    }
 
-    total = round(producto.precio_venta * data.cantidad_vendida, 2)
-    venta = models.Venta(
-        id_usuario=data.id_usuario,
-        id_producto=data.id_producto,
-        cantidad_vendida=data.cantidad_vendida,
-        total_venta=total,
-    )
-    db.add(venta)
 
+# =============== VENTAS ===============
+async def create_venta(db: AsyncSession, data: schemas.VentaCreate, al_confirmar=None):
+    """
+    Registra la venta en una sola sentencia (CTEs encadenadas):
+      1) UPDATE condicional de stock (cantidad >= n) que bloquea la fila del producto
+         y actualiza su velocidad de venta (app/reorden.py),
+      2) INSERT de la venta con el total calculado desde el precio devuelto,
+      3) INSERT del movimiento de salida,
+      4) upsert del delta en productos_mas_vendidos / productos_menos_vendidos,
+      5) upsert del delta en los rollups por hora y por día.
+    Dos ventas simultáneas del último producto se serializan en el UPDATE: la segunda
+    re-evalúa la condición y no descuenta, así el stock nunca queda negativo.
+    `al_confirmar(venta)` corre en la misma transacción, antes del commit (ver app/idempotencia.py).
+    """
+    p, v, m = models.Producto, models.Venta, models.InventarioMovimiento
+    n = data.cantidad_vendida
+
+    usuario_existe = (
+        select(models.Usuario.id_usuario)
+        .where(models.Usuario.id_usuario == data.id_usuario)
+        .exists()
+    )
+    upd = (
+        update(p)
+        .where(p.id_producto == data.id_producto, p.cantidad >= n, usuario_existe)
+        .values(cantidad=p.cantidad - n, **reorden.valores_venta(n))
+        .returning(p.id_producto, p.nombre, p.precio_venta, p.cantidad)
+        .cte("stock_actualizado")
+    )
+    ins_venta = (
+        insert(v)
+        .from_select(
+            ["id_usuario", "id_producto", "cantidad_vendida", "total_venta"],
+            select(
+                literal(data.id_usuario),
+                upd.c.id_producto,
+                literal(n),
+                func.round(cast(upd.c.precio_venta, Numeric) * n, 2),
+            ),
+        )
+        .returning(*v.__table__.c)
+        .cte("venta_insertada")
+    )
     # Registrar movimiento de salida
-    mov = models.InventarioMovimiento(
-        id_producto=data.id_producto,
-        tipo_movimiento="salida",
-        cantidad=data.cantidad_vendida,
-        descripcion="venta",
+    ins_mov = (
+        insert(m)
+        .from_select(
+            ["id_producto", "tipo_movimiento", "cantidad", "descripcion"],
+            select(ins_venta.c.id_producto, literal("salida"), ins_venta.c.cantidad_vendida, literal("venta")),
+        )
+        .cte("movimiento_insertado")
     )
-    db.add(mov)
+    resumenes = [
+        u.cte(f"resumen_{i}")
+        for i, u in enumerate(
+            _upserts_resumen(
+                select(ins_venta.c.id_producto, upd.c.nombre, ins_venta.c.cantidad_vendida, ins_venta.c.total_venta)
+                .join(upd, upd.c.id_producto == ins_venta.c.id_producto)
+            )
+        )
+    ]
 
-    # Asegura asignación de ID antes del commit (útil para logs/depuración)
-    await db.flush()
+    rollups = [
+        u.cte(f"rollup_{i}")
+        for i, u in enumerate(
+            _upserts_rollup(
+                select(
+                    ins_venta.c.fecha_venta.label("fecha"),
+                    ins_venta.c.id_producto,
+                    ins_venta.c.cantidad_vendida.label("unidades"),
+                    ins_venta.c.total_venta.label("monto"),
+                    literal(1).label("tickets"),
+                )
+            )
+        )
+    ]
+
+    columnas = [aliased(v, ins_venta)]
+    if eventos.HABILITADO:
+        # NOTIFY en la misma sentencia: sale solo si la venta hace commit
+        columnas.append(
+            select(
+                eventos.pg_notify_json(
+                    func.json_build_object("tipo", "stock", "id_producto", upd.c.id_producto, "cantidad", upd.c.cantidad),
+                    func.json_build_object(
+                        "tipo", "venta", "id_venta", ins_venta.c.id_venta, "id_usuario", ins_venta.c.id_usuario,
+                        "id_producto", ins_venta.c.id_producto, "cantidad_vendida", ins_venta.c.cantidad_vendida,
+                        "total_venta", ins_venta.c.total_venta, "fecha_venta", ins_venta.c.fecha_venta,
+                    ),
+                )
+            )
+            .where(upd.c.id_producto == ins_venta.c.id_producto)
+            .scalar_subquery()
+            .label("aviso")
+        )
+    stmt = select(*columnas).add_cte(ins_mov, *resumenes, *rollups)
+    venta = (await db.execute(stmt)).scalar_one_or_none()
+    if venta is None:
+        raise ValueError(await _motivo_venta_rechazada(db, data))
 
+    if al_confirmar is not None:
+        await al_confirmar(venta)
     await db.commit()
-    await db.refresh(venta)
+    await cache_reportes.cache.invalidar()
     return venta
+
+async def _motivo_venta_rechazada(db: AsyncSession, data: schemas.VentaCreate) -> str:
+    # Solo en el camino de error: una consulta para saber qué condición falló
+    diag = select(
+        select(models.Producto.cantidad)
+        .where(models.Producto.id_producto == data.id_producto)
+        .scalar_subquery()
+        .label("stock"),
+        select(models.Usuario.id_usuario)
+        .where(models.Usuario.id_usuario == data.id_usuario)
+        .exists()
+        .label("usuario_existe"),
+    )
+    row = (await db.execute(diag)).one()
+    await db.rollback()
+    if row.stock is None:
+        return "Producto no existe"
+    if row.stock < data.cantidad_vendida:
+        return "Stock insuficiente"
+    if not row.usuario_existe:
+        return "Usuario no existe"
+    # El stock cambió entre la venta y el diagnóstico (otra venta concurrente)
+    return "Stock insuficiente"
+
+class VentaLoteError(ValueError):
+    """Errores por línea de un lote de ventas: lista de {linea, id_producto, error}."""
+    def __init__(self, errores: list[dict]):
+        super().__init__("Lote rechazado")
+        self.errores = errores
+
+async def create_ventas_lote(db: AsyncSession, data: schemas.VentaLoteCreate):
+    """
+    Registra un ticket completo (todo o nada) en una sola transacción:
+      - bloquea los productos afectados con SELECT ... FOR UPDATE ordenado por id
+        (orden fijo => dos tickets concurrentes no se bloquean mutuamente),
+      - valida todas las líneas y reporta los errores de cada una,
+      - descuenta stock con un único UPDATE ... FROM (VALUES ...),
+      - inserta ventas y movimientos con inserts multi-fila,
+      - suma los deltas por producto en las tablas de resumen y en los rollups.
+    """
+    ventas = await _registrar_lote_ventas(db, data.lineas)
+    await db.commit()
+    await cache_reportes.cache.invalidar()
+    return ventas
+
+async def _registrar_lote_ventas(db: AsyncSession, lineas: list, fechas: list[datetime] | None = None):
+    """
+    Cuerpo de create_ventas_lote sin commit (lo usa también el buffer de ventas).
+    Con `fechas` cada venta conserva su propia fecha_venta en lugar de now().
+    Si alguna línea no es válida hace rollback y lanza VentaLoteError.
+    """
+    p, v, m = models.Producto, models.Venta, models.InventarioMovimiento
+
+    pedido: dict[int, int] = {}
+    for l in lineas:
+        pedido[l.id_producto] = pedido.get(l.id_producto, 0) + l.cantidad_vendida
+
+    res = await db.execute(
+        select(p.id_producto, p.nombre, p.cantidad, p.precio_venta)
+        .where(p.id_producto.in_(sorted(pedido)))
+        .order_by(p.id_producto)
+        .with_for_update()
+    )
+    productos = {r.id_producto: r for r in res.all()}
+
+    ids_usuario = {l.id_usuario for l in lineas}
+    res = await db.execute(select(models.Usuario.id_usuario).where(models.Usuario.id_usuario.in_(ids_usuario)))
+    usuarios = set(res.scalars().all())
+
+    errores = []
+    for i, l in enumerate(lineas):
+        prod = productos.get(l.id_producto)
+        if prod is None:
+            error = "Producto no existe"
+        elif prod.cantidad < pedido[l.id_producto]:
+            error = "Stock insuficiente"
+        elif l.id_usuario not in usuarios:
+            error = "Usuario no existe"
+        else:
+            continue
+        errores.append({"linea": i, "id_producto": l.id_producto, "error": error})
+    if errores:
+        await db.rollback()
+        raise VentaLoteError(errores)
+
+    # Velocidad de venta: las unidades de cada producto llevadas a su venta más reciente
+    ponderadas = reorden.unidades_ponderadas(lineas, [_utc(f) for f in fechas] if fechas else None)
+    columnas = [column("id_producto", Integer), column("n", Integer), column("w", Float)]
+    if fechas:
+        columnas.append(column("fecha", DateTime(timezone=True)))
+    descuento = values(*columnas, name="descuento").data([
+        (pid, n, ponderadas[pid][0], *((ponderadas[pid][1],) if fechas else ()))
+        for pid, n in pedido.items()
+    ])
+    await db.execute(
+        update(p)
+        .where(p.id_producto == descuento.c.id_producto)
+        .values(
+            cantidad=p.cantidad - descuento.c.n,
+            **reorden.valores_venta(descuento.c.w, descuento.c.fecha if fechas else None),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    res = await db.scalars(
+        insert(v).returning(v, sort_by_parameter_order=True),
+        [
+            dict(
+                id_usuario=l.id_usuario,
+                id_producto=l.id_producto,
+                cantidad_vendida=l.cantidad_vendida,
+                total_venta=round(productos[l.id_producto].precio_venta * l.cantidad_vendida, 2),
+                **({"fecha_venta": fechas[i]} if fechas else {}),
+            )
+            for i, l in enumerate(lineas)
+        ],
+    )
+    ventas = res.all()
+
+    acumulado: dict[int, list] = {}
+    por_hora: dict[tuple, list] = {}
+    for x in ventas:
+        for acc in (
+            acumulado.setdefault(x.id_producto, [0, 0, 0]),
+            por_hora.setdefault((_piso(_utc(x.fecha_venta), "hour"), x.id_producto), [0, 0, 0]),
+        ):
+            acc[0] += x.cantidad_vendida
+            acc[1] += x.total_venta
+            acc[2] += 1
+    delta = values(
+        column("id_producto", Integer), column("nombre", String), column("total_vendido", Integer),
+        column("monto_total", Numeric), column("tickets", Integer), name="delta",
+    ).data([(pid, productos[pid].nombre, *acc) for pid, acc in sorted(acumulado.items())])
+    for u in _upserts_resumen(select(delta.c.id_producto, delta.c.nombre, delta.c.total_vendido, delta.c.monto_total)):
+        await db.execute(u)
+    delta_hora = values(
+        column("fecha", DateTime(timezone=True)), column("id_producto", Integer), column("unidades", Integer),
+        column("monto", Numeric), column("tickets", Integer), name="delta_hora",
+    ).data([(hora, pid, *acc) for (hora, pid), acc in sorted(por_hora.items())])
+    for u in _upserts_rollup(select(delta_hora)):
+        await db.execute(u)
+
+    await db.execute(
+        insert(m),
+        [
+            dict(
+                id_producto=x.id_producto, tipo_movimiento="salida", cantidad=x.cantidad_vendida,
+                descripcion="venta", fecha=x.fecha_venta,
+            )
+            for x in ventas
+        ],
+    )
+    await eventos.notificar(db, [
+        {"tipo": "stock", "id_producto": pid, "cantidad": productos[pid].cantidad - n} for pid, n in pedido.items()
+    ] + [
+        {"tipo": "venta", **{c: getattr(x, c) for c in (
+            "id_venta", "id_usuario", "id_producto", "cantidad_vendida", "total_venta", "fecha_venta"
+        )}}
+        for x in ventas
+    ])
+    return ventas
+
+async def aplicar_ventas_buffer(db: AsyncSession, entradas: list[dict]) -> dict[str, dict]:
+    """
+    Aplica un micro-lote de ventas aceptadas por el buffer local (app/buffer_ventas.py).
+    `entradas`: dicts con clave, id_usuario, id_producto, cantidad_vendida y fecha.
+      - cada clave queda en ventas_buffer_claves en la misma transacción que su venta:
+        si el lote ya se había aplicado (caída antes de marcar el diario) no se repite,
+      - las líneas que ya no caben (stock, producto o usuario inexistente) se apartan
+        como conflicto, repartiendo el stock en orden de llegada, y se reintenta el resto.
+    Devuelve {clave: {"estado": "aplicada", "id_venta"} | {"estado": "conflicto", "error"}}.
+    Lo que siga pendiente tras varios reintentos (stock cambiando en paralelo) se omite
+    y queda para el siguiente lote.
+    """
+    k, p = models.VentaBufferClave, models.Producto
+    resultado: dict[str, dict] = {}
+    res = await db.execute(select(k.clave, k.id_venta).where(k.clave.in_([e["clave"] for e in entradas])))
+    for clave, id_venta in res.all():
+        resultado[clave] = {"estado": "aplicada", "id_venta": id_venta}
+    pendientes = [e for e in entradas if e["clave"] not in resultado]
+
+    for _ in range(5):
+        if not pendientes:
+            break
+        lineas = [
+            schemas.VentaCreate(id_usuario=e["id_usuario"], id_producto=e["id_producto"], cantidad_vendida=e["cantidad_vendida"])
+            for e in pendientes
+        ]
+        try:
+            ventas = await _registrar_lote_ventas(db, lineas, [e["fecha"] for e in pendientes])
+        except VentaLoteError as err:
+            sin_stock = set()
+            for x in err.errores:
+                if x["error"] == "Stock insuficiente":
+                    sin_stock.add(x["id_producto"])
+                else:
+                    resultado[pendientes[x["linea"]]["clave"]] = {"estado": "conflicto", "error": x["error"]}
+            if sin_stock:
+                res = await db.execute(select(p.id_producto, p.cantidad).where(p.id_producto.in_(sin_stock)))
+                quedan = dict(res.all())
+                await db.rollback()
+                for e in pendientes:
+                    if e["id_producto"] not in sin_stock or e["clave"] in resultado:
+                        continue
+                    if quedan[e["id_producto"]] >= e["cantidad_vendida"]:
+                        quedan[e["id_producto"]] -= e["cantidad_vendida"]
+                    else:
+                        resultado[e["clave"]] = {
+                            "estado": "conflicto",
+                            "error": f"Stock insuficiente al sincronizar (quedaban {quedan[e['id_producto']]})",
+                        }
+            pendientes = [e for e in pendientes if e["clave"] not in resultado]
+            continue
+
+        await db.execute(insert(k), [{"clave": e["clave"], "id_venta": x.id_venta} for e, x in zip(pendientes, ventas)])
+        await db.commit()
+        await cache_reportes.cache.invalidar()
+        for e, x in zip(pendientes, ventas):
+            resultado[e["clave"]] = {"estado": "aplicada", "id_venta": x.id_venta}
+        pendientes = []
+    return resultado
+
+async def purgar_claves_buffer(db: AsyncSession, antes_de: datetime) -> int:
+    res = await db.execute(delete(models.VentaBufferClave).where(models.VentaBufferClave.aplicada_en < antes_de))
+    await db.commit()
+    return res.rowcount or 0
+
+async def stock_y_usuarios(db: AsyncSession) -> tuple[dict[int, int], list[int]]:
+    """Stock actual de todos los productos e ids de usuario (vista local del buffer de ventas)."""
+    res = await db.execute(select(models.Producto.id_producto, models.Producto.cantidad))
+    stock = dict(res.all())
+    res = await db.execute(select(models.Usuario.id_usuario))
+    return stock, list(res.scalars().all())
+
 async def list_ventas(
     db: AsyncSession,
     desde: datetime | None = None,
@@ -149,6 +635,8 @@ async def list_ventas(
     producto_id: int | None = None,
     usuario_id: int | None = None,
     solo_activos: bool = False,   # <--- parámetro opcional
+    after_id: int | None = None,
+    limit: int | None = None,
 ):
     stmt = select(models.Venta)
     if solo_activos:
@@ -158,6 +646,18 @@ async def list_ventas(
                 .where(models.Producto.activo.is_(True), models.Usuario.activo.is_(True))
         )
 
+    stmt = filtrar_ventas(stmt, desde, hasta, producto_id, usuario_id)
+    # Paginación keyset: siguiente página = ids menores que el último visto
+    if after_id:
+        stmt = stmt.where(models.Venta.id_venta < after_id)
+
+    stmt = stmt.order_by(models.Venta.id_venta.desc())
+    if limit:
+        stmt = stmt.limit(limit)
+    res = await db.execute(stmt)
+    return res.scalars().all()
+
+def filtrar_ventas(stmt, desde, hasta, producto_id, usuario_id):
     if desde:
         stmt = stmt.where(models.Venta.fecha_venta >= desde)
     if hasta:
@@ -166,16 +666,28 @@ async def list_ventas(
         stmt = stmt.where(models.Venta.id_producto == producto_id)
     if usuario_id:
         stmt = stmt.where(models.Venta.id_usuario == usuario_id)
+    return stmt
 
-    res = await db.execute(stmt.order_by(models.Venta.id_venta.desc()))
-    return res.scalars().all()
+async def stream_ventas(
+    db: AsyncSession,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    producto_id: int | None = None,
+    usuario_id: int | None = None,
+    chunk: int = 2000,
+):
+    """Ventas como dicts desde un cursor de servidor (filas Core, sin identity map)."""
+    stmt = filtrar_ventas(select(*models.Venta.__table__.c), desde, hasta, producto_id, usuario_id)
+    res = await db.stream(stmt.order_by(models.Venta.id_venta).execution_options(yield_per=chunk))
+    async for fila in res.mappings():
+        yield dict(fila)
 
 async def get_venta(db: AsyncSession, venta_id: int):
     return await db.get(models.Venta, venta_id)
 
 
 # =============== MOVIMIENTOS ===============
-async def create_movimiento(db: AsyncSession, data: schemas.MovimientoCreate):
+async def create_movimiento(db: AsyncSession, data: schemas.MovimientoCreate, al_confirmar=None):
     producto = await db.get(models.Producto, data.id_producto)
     if not producto:
         raise ValueError("Producto no existe")
@@ -196,110 +708,397 @@ async def create_movimiento(db: AsyncSession, data: schemas.MovimientoCreate):
         descripcion=data.descripcion,
     )
     db.add(mov)
+    await eventos.notificar(db, [{"tipo": "stock", "id_producto": producto.id_producto, "cantidad": producto.cantidad}])
+    if al_confirmar is not None:
+        await db.flush()
+        await db.refresh(mov)
+        await al_confirmar(mov)
     await db.commit()
+    await cache_reportes.cache.invalidar()
     await db.refresh(mov)
     return mov
 
-async def list_movimientos(db: AsyncSession, producto_id: int | None = None):
+class MovimientoLoteError(ValueError):
+    """Errores por línea de un lote de movimientos: lista de {linea, id_producto, error}."""
+    def __init__(self, errores: list[dict]):
+        super().__init__("Lote rechazado")
+        self.errores = errores
+
+async def create_movimientos_lote(db: AsyncSession, data: schemas.MovimientoLoteCreate):
+    """
+    Registra muchas entradas/salidas (p.ej. un pedido del distribuidor) todo o nada:
+      - suma el delta neto por producto y bloquea los productos con SELECT ... FOR
+        UPDATE ordenado por id (orden fijo => dos lotes concurrentes no se bloquean
+        mutuamente; el orden de un UPDATE ... FROM (VALUES ...) no está garantizado),
+      - valida que existan y que ningún stock quede negativo, y reporta el motivo por línea,
+      - aplica los deltas con un único UPDATE ... FROM (VALUES ...),
+      - inserta los movimientos con un insert multi-fila.
+    """
+    p, m = models.Producto, models.InventarioMovimiento
+    lineas = data.movimientos
+
+    errores = [
+        {"linea": i, "id_producto": l.id_producto, "error": "La cantidad debe ser mayor que 0"}
+        for i, l in enumerate(lineas) if l.cantidad <= 0
+    ]
+    if errores:
+        raise MovimientoLoteError(errores)
+
+    neto: dict[int, int] = {}
+    for l in lineas:
+        signo = 1 if l.tipo_movimiento == "entrada" else -1
+        neto[l.id_producto] = neto.get(l.id_producto, 0) + signo * l.cantidad
+
+    res = await db.execute(
+        select(p.id_producto, p.cantidad)
+        .where(p.id_producto.in_(sorted(neto)))
+        .order_by(p.id_producto)
+        .with_for_update()
+    )
+    stock = dict(res.all())
+
+    for i, l in enumerate(lineas):
+        if l.id_producto not in stock:
+            error = "Producto no existe"
+        elif stock[l.id_producto] + neto[l.id_producto] < 0:
+            error = f"Stock insuficiente (stock {stock[l.id_producto]}, neto del lote {neto[l.id_producto]})"
+        else:
+            continue
+        errores.append({"linea": i, "id_producto": l.id_producto, "error": error})
+    if errores:
+        await db.rollback()
+        raise MovimientoLoteError(errores)
+
+    delta = values(column("id_producto", Integer), column("delta", Integer), name="delta").data(
+        list(neto.items())
+    )
+    res = await db.execute(
+        update(p)
+        .where(p.id_producto == delta.c.id_producto)
+        .values(cantidad=p.cantidad + delta.c.delta)
+        .returning(p.id_producto, p.cantidad)
+        .execution_options(synchronize_session=False)
+    )
+    stock_nuevo = dict(res.all())
+
+    res = await db.scalars(
+        insert(m).returning(m, sort_by_parameter_order=True),
+        [l.model_dump() for l in lineas],
+    )
+    movimientos = res.all()
+    await eventos.notificar(db, [
+        {"tipo": "stock", "id_producto": pid, "cantidad": n} for pid, n in sorted(stock_nuevo.items())
+    ])
+    await db.commit()
+    await cache_reportes.cache.invalidar()
+    return movimientos, len(neto)
+
+async def list_movimientos(
+    db: AsyncSession,
+    producto_id: int | None = None,
+    after_id: int | None = None,
+    limit: int | None = None,
+):
     stmt = select(models.InventarioMovimiento)
     if producto_id:
         stmt = stmt.where(models.InventarioMovimiento.id_producto == producto_id)
-    res = await db.execute(stmt.order_by(models.InventarioMovimiento.id_movimiento.desc()))
+    if after_id:
+        stmt = stmt.where(models.InventarioMovimiento.id_movimiento < after_id)
+    stmt = stmt.order_by(models.InventarioMovimiento.id_movimiento.desc())
+    if limit:
+        stmt = stmt.limit(limit)
+    res = await db.execute(stmt)
     return res.scalars().all()
 
 
+async def stream_movimientos(db: AsyncSession, producto_id: int | None = None, chunk: int = 2000):
+    m = models.InventarioMovimiento
+    stmt = select(*m.__table__.c)
+    if producto_id:
+        stmt = stmt.where(m.id_producto == producto_id)
+    res = await db.stream(stmt.order_by(m.id_movimiento).execution_options(yield_per=chunk))
+    async for fila in res.mappings():
+        yield dict(fila)
+
+
 # =============== RESÚMENES PERSISTIDOS ===============
-async def rebuild_resumenes_ventas(db: AsyncSession):
-    # Limpia tablas
-    await db.execute(delete(PMV))
-    await db.execute(delete(PMeV))
-    await db.commit()
+def _upserts_resumen(filas):
+    """
+    INSERT ... ON CONFLICT DO UPDATE que suma deltas en ambas tablas de resumen.
+    `filas` es un select con (id_producto, nombre, total_vendido, monto_total).
+    """
+    stmts = []
+    for tabla in (PMV, PMeV):
+        ins = pg_insert(tabla).from_select(["id_producto", "nombre", "total_vendido", "monto_total"], filas)
+        stmts.append(
+            ins.on_conflict_do_update(
+                index_elements=[tabla.id_producto],
+                set_={
+                    "nombre": ins.excluded.nombre,
+                    "total_vendido": tabla.total_vendido + ins.excluded.total_vendido,
+                    "monto_total": tabla.monto_total + ins.excluded.monto_total,
+                    "actualizado_en": func.now(),
+                },
+            )
+        )
+    return stmts
 
+async def rebuild_resumenes_ventas(db: AsyncSession):
+    """
+    Reconstrucción completa (solo para reparar): DELETE + INSERT ... SELECT en una
+    única transacción, incluidos los rollups y la velocidad de venta por producto. Los lectores siguen viendo las tablas
+    anteriores hasta el commit.
+    """
     agg = (
         select(
             models.Venta.id_producto,
             models.Producto.nombre,
             func.sum(models.Venta.cantidad_vendida).label("total_vendido"),
+            func.sum(models.Venta.total_venta).label("monto_total"),
         )
         .join(models.Producto, models.Producto.id_producto == models.Venta.id_producto)
         .group_by(models.Venta.id_producto, models.Producto.nombre)
     )
-    rows = (await db.execute(agg)).all()
-
-    for r in rows:
-        db.add(PMV(id_producto=r.id_producto, nombre=r.nombre, total_vendido=int(r.total_vendido)))
-        db.add(PMeV(id_producto=r.id_producto, nombre=r.nombre, total_vendido=int(r.total_vendido)))
-
+    for tabla in (PMV, PMeV):
+        await db.execute(delete(tabla))
+        await db.execute(
+            insert(tabla).from_select(["id_producto", "nombre", "total_vendido", "monto_total"], agg)
+        )
+    await rebuild_rollups_ventas(db, commit=False)
+    await reorden.reconstruir_velocidades(db)
     await db.commit()
+    await cache_reportes.cache.invalidar()
 
-async def list_productos_mas_vendidos(db: AsyncSession, limit: int = 10):
-    stmt = (
+def _ranking(fuente, orden, limit: int):
+    # `fuente` tiene una fila por producto (id_producto, total_vendido, monto_total);
+    # el LEFT JOIN conserva los productos sin ventas
+    total = func.coalesce(fuente.c.total_vendido, 0).label("total_vendido")
+    return (
         select(
             models.Producto.id_producto,
             models.Producto.nombre,
-            func.coalesce(func.sum(models.Venta.cantidad_vendida), 0).label("total_vendido"),
-            func.coalesce(func.sum(models.Venta.total_venta), 0.0).label("monto_total"),
+            total,
+            func.coalesce(fuente.c.monto_total, 0.0).label("monto_total"),
         )
-        .join(models.Venta, models.Venta.id_producto == models.Producto.id_producto, isouter=True)
-        .group_by(models.Producto.id_producto)
-        .order_by(desc("total_vendido"))
+        .join(fuente, fuente.c.id_producto == models.Producto.id_producto, isouter=True)
+        .order_by(orden(total), models.Producto.id_producto)
         .limit(limit)
     )
-    res = await db.execute(stmt)
-    rows = res.all()
-    # devuélvelo como objetos livianos para Jinja
-    return [
-        type("PMV", (), dict(id_producto=r.id_producto, nombre=r.nombre,
-                             total_vendido=int(r.total_vendido or 0),
-                             monto_total=float(r.monto_total or 0.0)))
-        for r in rows
-    ]
 
-async def list_productos_menos_vendidos(db: AsyncSession, limit: int = 10):
-    stmt = (
+def _fuente_ranking(tabla_resumen, desde: datetime | None, hasta: datetime | None):
+    # Sin rango: tabla de resumen acumulada. Con rango: rollups + bordes de ventas crudas.
+    if desde is None and hasta is None:
+        return tabla_resumen.__table__
+    r = _ventas_en_rango(desde, hasta)
+    return (
         select(
-            models.Producto.id_producto,
-            models.Producto.nombre,
-            func.coalesce(func.sum(models.Venta.cantidad_vendida), 0).label("total_vendido"),
-            func.coalesce(func.sum(models.Venta.total_venta), 0.0).label("monto_total"),
+            r.c.id_producto,
+            func.sum(r.c.unidades).label("total_vendido"),
+            func.sum(r.c.monto).label("monto_total"),
         )
-        .join(models.Venta, models.Venta.id_producto == models.Producto.id_producto, isouter=True)
-        .group_by(models.Producto.id_producto)
-        .order_by("total_vendido")
-        .limit(limit)
+        .group_by(r.c.id_producto)
+        .subquery("ventas_producto")
     )
-    res = await db.execute(stmt)
-    rows = res.all()
+
+def _filas_ranking(rows) -> list[SimpleNamespace]:
+    # objetos livianos: atributos para Jinja y serializables a JSON (schemas.ProductoVendido)
     return [
-        type("PMV", (), dict(id_producto=r.id_producto, nombre=r.nombre,
-                             total_vendido=int(r.total_vendido or 0),
-                             monto_total=float(r.monto_total or 0.0)))
+        SimpleNamespace(id_producto=r.id_producto, nombre=r.nombre,
+                        total_vendido=int(r.total_vendido or 0),
+                        monto_total=float(r.monto_total or 0.0))
         for r in rows
     ]
 
+async def list_productos_mas_vendidos(
+    db: AsyncSession, limit: int = 10, desde: datetime | None = None, hasta: datetime | None = None
+):
+    res = await db.execute(_ranking(_fuente_ranking(PMV, desde, hasta), desc, limit))
+    return _filas_ranking(res.all())
+
+async def list_productos_menos_vendidos(
+    db: AsyncSession, limit: int = 10, desde: datetime | None = None, hasta: datetime | None = None
+):
+    res = await db.execute(_ranking(_fuente_ranking(PMeV, desde, hasta), asc, limit))
+    return _filas_ranking(res.all())
+
+
+# =============== ROLLUPS POR HORA / DÍA ===============
+ROLLUPS = ((models.VentaPorHora, "hour"), (models.VentaPorDia, "day"))
+_PASO = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+def _bucket(unidad: str, col):
+    # Constantes en línea (no parámetros) para que el GROUP BY reconozca la misma expresión
+    return func.date_trunc(literal_column(f"'{unidad}'"), col, literal_column("'UTC'"))
+
+def _upserts_rollup(filas):
+    """
+    Upserts que suman deltas en ventas_por_hora y ventas_por_dia.
+    `filas` es un select con (fecha, id_producto, unidades, monto, tickets); se agrupa por
+    bucket porque el upsert no puede tocar dos veces la misma fila.
+    """
+    f = filas.subquery("f")
+    stmts = []
+    for tabla, unidad in ROLLUPS:
+        bucket = _bucket(unidad, f.c.fecha)
+        ins = pg_insert(tabla).from_select(
+            ["bucket", "id_producto", "unidades", "monto", "tickets"],
+            select(bucket, f.c.id_producto, func.sum(f.c.unidades), func.sum(f.c.monto), func.sum(f.c.tickets))
+            .group_by(bucket, f.c.id_producto),
+        )
+        stmts.append(
+            ins.on_conflict_do_update(
+                index_elements=[tabla.bucket, tabla.id_producto],
+                set_={
+                    "unidades": tabla.unidades + ins.excluded.unidades,
+                    "monto": tabla.monto + ins.excluded.monto,
+                    "tickets": tabla.tickets + ins.excluded.tickets,
+                },
+            )
+        )
+    return stmts
+
+def rebuild_rollups_stmts(desde: datetime | None = None) -> list:
+    """DELETE + INSERT ... SELECT por rollup (también los usa la migración 0009)."""
+    v = models.Venta
+    inicio = _piso(_utc(desde), "day") if desde else None
+    stmts = []
+    for tabla, unidad in ROLLUPS:
+        bucket = _bucket(unidad, v.fecha_venta)
+        agg = select(
+            bucket, v.id_producto, func.sum(v.cantidad_vendida), func.sum(v.total_venta), func.count()
+        ).group_by(bucket, v.id_producto)
+        borrar = delete(tabla)
+        if inicio:
+            agg = agg.where(v.fecha_venta >= inicio)
+            borrar = borrar.where(tabla.bucket >= inicio)
+        stmts += [borrar, insert(tabla).from_select(["bucket", "id_producto", "unidades", "monto", "tickets"], agg)]
+    return stmts
+
+async def rebuild_rollups_ventas(db: AsyncSession, desde: datetime | None = None, commit: bool = True):
+    """
+    Back-fill de los rollups desde `ventas`. Con `desde`, solo rehace los buckets
+    a partir del día que contiene esa fecha.
+    """
+    for stmt in rebuild_rollups_stmts(desde):
+        await db.execute(stmt)
+    if commit:
+        await db.commit()
+
+def _utc(dt: datetime) -> datetime:
+    # Las fechas sin zona se interpretan en UTC (igual que asyncpg con timestamptz)
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+def _piso(dt: datetime, unidad: str) -> datetime:
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0) if unidad == "day" else dt
+
+def _techo(dt: datetime, unidad: str) -> datetime:
+    p = _piso(dt, unidad)
+    return p if p == dt else p + _PASO[unidad]
+
+def _tramos_rango(desde: datetime | None, hasta: datetime | None) -> list[tuple]:
+    """
+    Divide [desde, hasta] en tramos semiabiertos (tabla, inicio, fin):
+    días completos -> ventas_por_dia, horas completas -> ventas_por_hora,
+    bordes parciales -> ventas crudas (tabla None). None = sin límite.
+    """
+    lo = _utc(desde) if desde else None
+    hi = _utc(hasta) + timedelta(microseconds=1) if hasta else None  # hasta es inclusivo
+    h_lo = _techo(lo, "hour") if lo else None
+    h_hi = _piso(hi, "hour") if hi else None
+    if h_lo and h_hi and h_lo >= h_hi:
+        return [(None, lo, hi)]
+
+    tramos = []
+    if lo and lo < h_lo:
+        tramos.append((None, lo, h_lo))
+    d_lo = _techo(h_lo, "day") if h_lo else None
+    d_hi = _piso(h_hi, "day") if h_hi else None
+    if d_lo and d_hi and d_lo >= d_hi:
+        tramos.append((models.VentaPorHora, h_lo, h_hi))
+    else:
+        if h_lo and h_lo < d_lo:
+            tramos.append((models.VentaPorHora, h_lo, d_lo))
+        tramos.append((models.VentaPorDia, d_lo, d_hi))
+        if h_hi and d_hi < h_hi:
+            tramos.append((models.VentaPorHora, d_hi, h_hi))
+    if hi and h_hi < hi:
+        tramos.append((None, h_hi, hi))
+    return tramos
+
+def _ventas_en_rango(
+    desde: datetime | None,
+    hasta: datetime | None,
+    producto_id: int | None = None,
+    usuario_id: int | None = None,
+):
+    """
+    Subquery (id_producto, unidades, monto, tickets) que cubre el rango leyendo buckets
+    completos. Los rollups no tienen dimensión usuario: con usuario_id se leen ventas crudas.
+    """
+    v = models.Venta
+    if usuario_id:
+        q = select(
+            v.id_producto,
+            v.cantidad_vendida.label("unidades"),
+            v.total_venta.label("monto"),
+            literal(1).label("tickets"),
+        )
+        return filtrar_ventas(q, desde, hasta, producto_id, usuario_id).subquery("ventas_rango")
+
+    partes = []
+    for tabla, ini, fin in _tramos_rango(desde, hasta):
+        if tabla is None:
+            q = select(
+                v.id_producto,
+                v.cantidad_vendida.label("unidades"),
+                v.total_venta.label("monto"),
+                literal(1).label("tickets"),
+            )
+            col = v.fecha_venta
+        else:
+            q = select(tabla.id_producto, tabla.unidades, tabla.monto, tabla.tickets)
+            col = tabla.bucket
+        if ini:
+            q = q.where(col >= ini)
+        if fin:
+            q = q.where(col < fin)
+        if producto_id:
+            q = q.where(q.selected_columns.id_producto == producto_id)
+        partes.append(q)
+    return union_all(*partes).subquery("ventas_rango")
+
 
 # =============== REPORTES EXTRA ===============
-async def resumen_ventas_periodo(db, desde: datetime | None = None, hasta: datetime | None = None) -> dict:
+async def resumen_ventas_periodo(
+    db,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    producto_id: int | None = None,
+    usuario_id: int | None = None,
+) -> dict:
     """
-    Resume las ventas en el rango [desde, hasta]:
+    Resume las ventas en el rango [desde, hasta] (opcionalmente de un producto/usuario):
       - unidades_vendidas: SUM(cantidad_vendida)
       - total_ventas:      SUM(total_venta)
       - ticket_promedio:   total_ventas / unidades_vendidas
+      - num_ventas:        cantidad de ventas registradas
+    Lee días/horas completos de los rollups y solo toca `ventas` en los bordes parciales.
     Devuelve también alias 'monto_total' y 'unidades' para compatibilidad con templates antiguos.
     """
-    v = models.Venta
-    stmt = select(
-        func.coalesce(func.sum(v.cantidad_vendida), 0).label("unidades_vendidas"),
-        func.coalesce(func.sum(v.total_venta), 0.0).label("total_ventas"),
-    )
-    if desde:
-        stmt = stmt.where(v.fecha_venta >= desde)
-    if hasta:
-        stmt = stmt.where(v.fecha_venta <= hasta)
+    res = await db.execute(resumen_stmt(desde, hasta, producto_id, usuario_id))
+    row = res.one()  # returns a Row with the three labels above
+    return resumen_dict(row)
 
-    res = await db.execute(stmt)
-    row = res.one()  # returns a Row with the two labels above
+def resumen_stmt(desde=None, hasta=None, producto_id=None, usuario_id=None):
+    r = _ventas_en_rango(desde, hasta, producto_id, usuario_id)
+    return select(
+        func.coalesce(func.sum(r.c.unidades), 0).label("unidades_vendidas"),
+        func.coalesce(func.sum(r.c.monto), 0.0).label("total_ventas"),
+        func.coalesce(func.sum(r.c.tickets), 0).label("num_ventas"),
+    )
 
+def resumen_dict(row) -> dict:
     unidades = int(row.unidades_vendidas or 0)
     total = float(row.total_ventas or 0)
 
@@ -309,4 +1108,111 @@ async def resumen_ventas_periodo(db, desde: datetime | None = None, hasta: datet
         "total_ventas": total,
         "monto_total": total,            # alias
         "ticket_promedio": float(total / unidades) if unidades else 0.0,
-    }
\ No newline at end of file
+        "num_ventas": int(row.num_ventas or 0),
+    }
+
+# =============== RECONCILIACIÓN DE STOCK ===============
+# Un movimiento solo se consolida en el checkpoint cuando es más antiguo que este margen:
+# así una transacción lenta que confirme después con un id menor no queda fuera del saldo.
+MARGEN_RECONCILIACION = timedelta(minutes=5)
+
+def _movimientos_pendientes(margen: timedelta):
+    """
+    Por producto: saldo del checkpoint y suma de los movimientos posteriores a él
+    (entradas - salidas). Parte de productos/checkpoints y, con LATERAL, recorre para
+    cada producto solo su rango (id_producto, id_movimiento > checkpoint) del índice
+    ix_inventario_movimientos_producto_id, en vez de agregar toda la tabla.
+    delta_consolidable/ultimo_consolidable cubren solo el prefijo de ids anterior al
+    primer movimiento reciente (dentro del margen), que es lo que se puede persistir.
+    """
+    p, m, ck = models.Producto, models.InventarioMovimiento, models.ReconciliacionCheckpoint
+    del_producto = and_(
+        m.id_producto == p.id_producto,
+        m.id_movimiento > func.coalesce(ck.ultimo_id_movimiento, 0),
+    )
+    reciente = (
+        select(func.min(m.id_movimiento).label("primer"))
+        .where(del_producto, m.fecha >= func.now() - margen)
+        .lateral("reciente")
+    )
+    delta = case((m.tipo_movimiento == "entrada", m.cantidad), else_=-m.cantidad)
+    consolidable = or_(reciente.c.primer.is_(None), m.id_movimiento < reciente.c.primer)
+    mov = (
+        select(
+            func.sum(delta).label("delta"),
+            func.coalesce(func.sum(delta).filter(consolidable), 0).label("delta_consolidable"),
+            func.max(m.id_movimiento).filter(consolidable).label("ultimo_consolidable"),
+        )
+        .where(del_producto)
+        .lateral("mov")
+    )
+    return (
+        select(
+            p.id_producto,
+            p.nombre,
+            p.cantidad,
+            func.coalesce(ck.saldo, 0).label("saldo"),
+            func.coalesce(mov.c.delta, 0).label("delta"),
+            mov.c.delta_consolidable,
+            mov.c.ultimo_consolidable,
+        )
+        .outerjoin(ck, ck.id_producto == p.id_producto)
+        .join(reciente, true())
+        .join(mov, true())
+        .subquery("pendientes")
+    )
+
+def _reconciliacion_stmts(margen: timedelta):
+    ck = models.ReconciliacionCheckpoint
+    pend = _movimientos_pendientes(margen)
+    esperado = pend.c.saldo + pend.c.delta
+
+    descuadres = (
+        select(
+            pend.c.id_producto,
+            pend.c.nombre,
+            pend.c.cantidad.label("stock_actual"),
+            esperado.label("stock_esperado"),
+            (pend.c.cantidad - esperado).label("diferencia"),
+        )
+        .where(pend.c.cantidad != esperado)
+        .order_by(pend.c.id_producto)
+    )
+
+    ins = pg_insert(ck).from_select(
+        ["id_producto", "ultimo_id_movimiento", "saldo"],
+        select(pend.c.id_producto, pend.c.ultimo_consolidable, pend.c.delta_consolidable)
+        .where(pend.c.ultimo_consolidable.is_not(None)),
+    )
+    avanzar = ins.on_conflict_do_update(
+        index_elements=[ck.id_producto],
+        set_={
+            "ultimo_id_movimiento": ins.excluded.ultimo_id_movimiento,
+            "saldo": ck.saldo + ins.excluded.saldo,
+            "actualizado_en": func.now(),
+        },
+    )
+    return descuadres, avanzar
+
+async def reconciliacion_stock(db: AsyncSession, margen: timedelta = MARGEN_RECONCILIACION) -> list[dict]:
+    """
+    Compara productos.cantidad con el stock esperado según inventario_movimientos
+    (saldo del checkpoint + movimientos nuevos) y devuelve solo los descuadres.
+    Después avanza los checkpoints: la siguiente corrida solo escanea movimientos nuevos.
+    """
+    descuadres, avanzar = _reconciliacion_stmts(margen)
+    rows = (await db.execute(descuadres)).mappings().all()
+    await db.execute(avanzar)
+    await db.commit()
+    return [dict(r) for r in rows]
+
+async def stream_reconciliacion_stock(
+    db: AsyncSession, margen: timedelta = MARGEN_RECONCILIACION, chunk: int = 1000
+):
+    """Igual que reconciliacion_stock, pero cursor de servidor: memoria constante para catálogos grandes."""
+    descuadres, avanzar = _reconciliacion_stmts(margen)
+    res = await db.stream(descuadres.execution_options(yield_per=chunk))
+    async for r in res.mappings():
+        yield dict(r)
+    await db.execute(avanzar)
+    await db.commit()
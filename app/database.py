@@ -1,11 +1,23 @@
 # app/database.py
 import os
+import asyncio
+import bisect
 import logging
+import math
+import time
+import uuid
 from urllib.parse import urlparse, urlunparse
 
 from dotenv import load_dotenv
+from fastapi import Request, Response
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .metricas import instrumentar_engine
+from .entorno import env_bool, parse_bool
 
 load_dotenv()
 logger = logging.getLogger("db")
@@ -14,62 +26,237 @@ raw = os.getenv("DATABASE_URL")
 if not raw:
     raise RuntimeError("DATABASE_URL missing")
 
-# --- Normaliza driver: postgres -> postgresql+asyncpg
-if raw.startswith("postgres://"):
-    raw = "postgresql+asyncpg://" + raw[len("postgres://"):]
-if raw.startswith("postgresql://") and "+asyncpg" not in raw:
-    raw = raw.replace("postgresql://", "postgresql+asyncpg://", 1)
-
-# --- Quita cualquier query (?sslmode=...) para evitar el error de asyncpg
-p = urlparse(raw)
-clean_url = urlunparse(p._replace(query=""))
-host = p.hostname or ""
+def _normalizar(raw: str) -> str:
+    # --- Normaliza driver: postgres -> postgresql+asyncpg
+    if raw.startswith("postgres://"):
+        raw = "postgresql+asyncpg://" + raw[len("postgres://"):]
+    if raw.startswith("postgresql://") and "+asyncpg" not in raw:
+        raw = raw.replace("postgresql://", "postgresql+asyncpg://", 1)
+    # --- Quita cualquier query (?sslmode=...) para evitar el error de asyncpg
+    return urlunparse(urlparse(raw)._replace(query=""))
 
 def _mask(u: str) -> str:
     up = urlparse(u)
     return f"postgresql+asyncpg://***:***@{up.hostname}/{(up.path or '/').lstrip('/')}"
 
-def _parse_bool(s: str | None):
-    if s is None:
-        return None
-    v = s.strip().lower()
-    if v in ("1", "true", "yes", "on"):
-        return True
-    if v in ("0", "false", "no", "off"):
-        return False
-    return None  # auto
-
 # DB_SSL controla TLS:
 #   - "true"/"false" -> fuerza
 #   - "auto" (o no definida) -> usa TLS si el host NO es localhost
 DB_SSL = os.getenv("DB_SSL", "auto")
-flag = _parse_bool(DB_SSL)
+flag = parse_bool(DB_SSL)  # None = auto
 
-use_ssl = False
-if flag is None:               # auto
-    use_ssl = host not in ("localhost", "127.0.0.1")
-else:
-    use_ssl = flag
+def _usa_ssl(host: str) -> bool:
+    if flag is None:               # auto
+        return host not in ("localhost", "127.0.0.1")
+    return flag
+
+def _env_int(nombre: str, defecto: int) -> int:
+    v = os.getenv(nombre)
+    return int(v) if v not in (None, "") else defecto
+
+# --- Pool (ajustable por entorno)
+POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 5)
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)       # s; -1 desactiva
+POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+POOL_WARMUP = _env_int("DB_POOL_WARMUP", POOL_SIZE)    # conexiones a abrir al arrancar
+
+# --- Caché de sentencias preparadas
+# DB_PGBOUNCER=true: modo compatible con PgBouncer en pool_mode=transaction
+# (sin caché de sentencias y nombres únicos para las preparadas).
+PGBOUNCER = env_bool("DB_PGBOUNCER", False)
+STATEMENT_CACHE = 0 if PGBOUNCER else _env_int("DB_STATEMENT_CACHE_SIZE", 100)  # caché de asyncpg
+PREPARED_CACHE = 0 if PGBOUNCER else _env_int("DB_PREPARED_CACHE_SIZE", 100)    # caché del dialecto
+
+_connect_args_base = {"statement_cache_size": STATEMENT_CACHE}
+if PGBOUNCER:
+    _connect_args_base["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4().hex}__"
+
+def _connect_args(url: str) -> dict:
+    args = dict(_connect_args_base)
+    if _usa_ssl(urlparse(url).hostname or ""):
+        # NUNCA usar "sslmode" con asyncpg. Solo "ssl=True" o un contexto SSL.
+        args["ssl"] = True
+    return args
+
+def _engine_url(url: str):
+    return make_url(url).update_query_dict({"prepared_statement_cache_size": str(PREPARED_CACHE)})
+
+# --- Métricas del pool
+# Límites (ms) del histograma de espera por una conexión; el último cubo es +inf.
+LIMITES_ESPERA_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class MetricasPool:
+    def __init__(self):
+        self.cubos = [0] * (len(LIMITES_ESPERA_MS) + 1)
+        self.esperas = 0
+        self.espera_total_ms = 0.0
+        self.espera_max_ms = 0.0
+        self.timeouts = 0
+        self.conexiones_abiertas = 0
+        self.invalidaciones = 0
+
+    def registrar_espera(self, ms: float):
+        self.cubos[bisect.bisect_left(LIMITES_ESPERA_MS, ms)] += 1
+        self.esperas += 1
+        self.espera_total_ms += ms
+        self.espera_max_ms = max(self.espera_max_ms, ms)
+
+    def histograma(self) -> dict[str, int]:
+        etiquetas = [f"le_{l}ms" for l in LIMITES_ESPERA_MS] + ["le_inf"]
+        return dict(zip(etiquetas, self.cubos))
+
+metricas_pool = MetricasPool()
 
-connect_args = {}
-if use_ssl:
-    # NUNCA usar "sslmode" con asyncpg. Solo "ssl=True" o un contexto SSL.
-    connect_args["ssl"] = True
+metricas_replica = MetricasPool()
 
-logger.info("DB URL (sanitized): %s | SSL=%s", _mask(clean_url), use_ssl)
+class PoolMedido(AsyncAdaptedQueuePool):
+    """QueuePool que mide cuánto espera cada checkout y cuenta los timeouts."""
+    metricas = metricas_pool
 
-engine = create_async_engine(
-    clean_url,
-    future=True,
-    echo=False,
-    pool_size=5,
-    max_overflow=5,
-    connect_args=connect_args,
-)
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metricas.timeouts += 1
+            raise
+        finally:
+            self.metricas.registrar_espera((time.perf_counter() - t0) * 1000)
+
+class PoolMedidoReplica(PoolMedido):
+    metricas = metricas_replica
+
+def _medir_conexiones(e, m: MetricasPool):
+    @event.listens_for(e.sync_engine, "connect")
+    def _al_conectar(dbapi_conn, record):
+        m.conexiones_abiertas += 1
+
+    @event.listens_for(e.sync_engine, "invalidate")
+    def _al_invalidar(dbapi_conn, record, exception):
+        m.invalidaciones += 1
+
+def crear_engine(raw_url: str, rol: str = "primaria", poolclass=PoolMedido,
+                 pool_size: int = POOL_SIZE, max_overflow: int = MAX_OVERFLOW):
+    """
+    Normaliza la URL (driver asyncpg, sin ?sslmode=...), decide TLS por host y crea
+    el engine con el pool medido. Devuelve (url normalizada, engine).
+    """
+    url = _normalizar(raw_url)
+    args = _connect_args(url)
+    logger.info(
+        "DB %s (sanitized): %s | SSL=%s | pool=%s+%s timeout=%ss recycle=%ss pre_ping=%s pgbouncer=%s",
+        rol, _mask(url), "ssl" in args, pool_size, max_overflow, POOL_TIMEOUT, POOL_RECYCLE, POOL_PRE_PING, PGBOUNCER,
+    )
+    e = create_async_engine(
+        _engine_url(url),
+        future=True,
+        echo=False,
+        poolclass=poolclass,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+        connect_args=args,
+    )
+    _medir_conexiones(e, poolclass.metricas)
+    instrumentar_engine(e, rol)
+    return url, e
+
+# clean_url/connect_args: los usan alembic/env.py, bench/ y app/eventos.py
+clean_url, engine = crear_engine(raw)
+connect_args = _connect_args(clean_url)
+
+# --- Réplica de lectura (opcional)
+# DATABASE_READ_URL apunta a la réplica; sin ella, las lecturas usan el mismo engine
+# que las escrituras (un solo Postgres cumple ambos roles).
+raw_read = os.getenv("DATABASE_READ_URL")
+REPLICA = bool(raw_read)
+if REPLICA:
+    read_url, read_engine = crear_engine(
+        raw_read, "replica", PoolMedidoReplica,
+        _env_int("DB_READ_POOL_SIZE", POOL_SIZE), _env_int("DB_READ_MAX_OVERFLOW", MAX_OVERFLOW),
+    )
+else:
+    read_engine = engine
+
+def estadisticas_pool(e=None) -> dict:
+    e = e or engine
+    pool = e.pool
+    m = pool.metricas
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "timeout_s": POOL_TIMEOUT,
+        "timeouts": m.timeouts,
+        "conexiones_abiertas": m.conexiones_abiertas,
+        "invalidaciones": m.invalidaciones,
+        "checkouts": m.esperas,
+        "espera_media_ms": round(m.espera_total_ms / m.esperas, 3) if m.esperas else 0.0,
+        "espera_max_ms": round(m.espera_max_ms, 3),
+        "espera_histograma": m.histograma(),
+        "pgbouncer": PGBOUNCER,
+    }
+
+async def precalentar(n: int = POOL_WARMUP, e=None):
+    """Abre n conexiones a la vez (connect + TLS) y las deja en el pool para las primeras peticiones."""
+    e = e or engine
+    n = min(n, e.pool.size())
+    if n <= 0:
+        return
+    t0 = time.perf_counter()
+    conns = await asyncio.gather(*[e.connect() for _ in range(n)], return_exceptions=True)
+    ok = 0
+    for c in conns:
+        if isinstance(c, BaseException):
+            logger.warning("Precalentamiento del pool: %s", c)
+            continue
+        try:
+            await c.execute(text("select 1"))
+            ok += 1
+        except Exception as ex:  # el arranque no debe caerse por el precalentamiento
+            logger.warning("Precalentamiento del pool: %s", ex)
+        finally:
+            await c.close()
+    logger.info("Pool precalentado: %s/%s conexiones en %.0f ms", ok, n, (time.perf_counter() - t0) * 1000)
 
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+# --- Read-your-writes
+# Tras una escritura (ver middleware en app.main) el cliente recibe una cookie con el
+# instante hasta el que sus lecturas van a la primaria (y saltan la caché de reportes),
+# para no ver datos que la réplica aún no tiene. DB_READ_YOUR_WRITES es esa ventana
+# en segundos (~ lag máximo).
+READ_YOUR_WRITES_S = float(os.getenv("DB_READ_YOUR_WRITES", "5"))
+COOKIE_PRIMARIA = "leer_primaria_hasta"
+
+def marcar_escritura(response: Response):
+    if READ_YOUR_WRITES_S > 0:
+        hasta = time.time() + READ_YOUR_WRITES_S
+        response.set_cookie(COOKIE_PRIMARIA, f"{hasta:.3f}", max_age=math.ceil(READ_YOUR_WRITES_S), httponly=True, samesite="lax")
+
+def acaba_de_escribir(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(COOKIE_PRIMARIA, "0")) > time.time()
+    except ValueError:
+        return False
+
+def _leer_de_primaria(request: Request) -> bool:
+    return not REPLICA or acaba_de_escribir(request)
+
+async def get_read_db(request: Request):
+    """Sesión para lecturas pesadas: réplica, salvo que el cliente acabe de escribir."""
+    factory = AsyncSessionLocal if _leer_de_primaria(request) else ReadSessionLocal
+    async with factory() as session:
+        yield session
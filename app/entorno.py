@@ -0,0 +1,26 @@
+# app/entorno.py
+"""
+Lectura de flags booleanos desde variables de entorno, con el mismo criterio
+para todos los módulos: 1/true/yes/si/on activan, 0/false/no/off desactivan y
+cualquier otro valor (o la variable ausente) deja el valor por defecto.
+"""
+import os
+from typing import Optional
+
+_SI = ("1", "true", "yes", "si", "sí", "on")
+_NO = ("0", "false", "no", "off")
+
+def parse_bool(s: Optional[str]) -> Optional[bool]:
+    """True/False según el texto; None si no se reconoce (p. ej. "auto" o vacío)."""
+    if s is None:
+        return None
+    v = s.strip().lower()
+    if v in _SI:
+        return True
+    if v in _NO:
+        return False
+    return None
+
+def env_bool(nombre: str, defecto: bool) -> bool:
+    v = parse_bool(os.getenv(nombre))
+    return defecto if v is None else v
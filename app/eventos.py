@@ -0,0 +1,199 @@
+# app/eventos.py
+"""
+Canal de eventos en vivo (stock y ventas) para GET /eventos (Server-Sent Events).
+
+Apagado por defecto: EVENTOS=1 lo activa. Encendido cuesta una conexión extra a
+Postgres por worker (la del LISTEN, fuera del pool: contarla en max_connections)
+y un pg_notify en cada escritura que cambia stock o registra una venta. Apagado,
+GET /eventos responde 404 y las páginas no abren el EventSource.
+
+- Las escrituras llaman a notificar() (o incrustan pg_notify en su sentencia)
+  ANTES del commit: Postgres entrega el NOTIFY solo si la transacción confirma,
+  así nunca se anuncia una venta que terminó en rollback.
+- Cada worker mantiene una conexión asyncpg dedicada (fuera del pool) con
+  LISTEN inventario y reparte lo recibido a sus suscriptores locales; así el
+  fan-out funciona con varios workers y varias máquinas. Con PgBouncer en modo
+  transaction LISTEN no funciona: EVENTOS_DATABASE_URL puede apuntar directo a Postgres.
+- Back-pressure: cada suscriptor tiene una cola acotada (EVENTOS_COLA). Si un
+  cliente lento la llena, se descarta su atraso y recibe un único "resync"
+  (la página se recarga); nunca se bloquea al resto ni crece la memoria.
+- Tope de suscriptores por worker (EVENTOS_MAX_SUSCRIPTORES): el siguiente recibe 503.
+- Tras perder y recuperar la conexión LISTEN se envía "resync" a todos, porque
+  pudieron perderse eventos en el intervalo.
+
+Formato del NOTIFY: lista JSON de eventos {"tipo": "stock" | "venta" | "resync", ...}.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+from urllib.parse import urlparse
+
+import asyncpg
+from sqlalchemy import String, cast, column, func, select, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import clean_url, _normalizar, _usa_ssl
+from .entorno import env_bool
+from .exportacion import _json_default  # Decimal -> número, fechas ISO: igual que json_build_object
+
+logger = logging.getLogger("eventos")
+
+CANAL = "inventario"
+HABILITADO = env_bool("EVENTOS", False)
+MAX_SUSCRIPTORES = int(os.getenv("EVENTOS_MAX_SUSCRIPTORES", "500"))
+COLA = int(os.getenv("EVENTOS_COLA", "100"))
+KEEPALIVE = float(os.getenv("EVENTOS_KEEPALIVE", "15"))   # s entre comentarios ": ping"
+MAX_PAYLOAD = 7000                                         # bytes; el límite de NOTIFY es 8000
+RESYNC = {"tipo": "resync"}
+
+_url_listen = _normalizar(os.getenv("EVENTOS_DATABASE_URL") or clean_url)
+
+def _dsn() -> tuple[str, bool]:
+    return _url_listen.replace("postgresql+asyncpg://", "postgresql://", 1), _usa_ssl(urlparse(_url_listen).hostname or "")
+
+# ---------- Productores ----------
+def _paquetes(eventos: list[dict]) -> list[str]:
+    """Agrupa eventos en payloads JSON bajo MAX_PAYLOAD bytes."""
+    paquetes, actual, tam = [], [], 2
+    for e in eventos:
+        s = json.dumps(e, separators=(",", ":"), default=_json_default)
+        if actual and tam + len(s) + 1 > MAX_PAYLOAD:
+            paquetes.append("[" + ",".join(actual) + "]")
+            actual, tam = [], 2
+        actual.append(s)
+        tam += len(s) + 1
+    if actual:
+        paquetes.append("[" + ",".join(actual) + "]")
+    return paquetes
+
+async def notificar(db: AsyncSession, eventos: list[dict]):
+    """pg_notify dentro de la transacción en curso (un solo round-trip aunque haya varios paquetes)."""
+    if not HABILITADO or not eventos:
+        return
+    p = values(column("payload", String), name="p").data([(x,) for x in _paquetes(eventos)])
+    await db.execute(select(func.pg_notify(CANAL, p.c.payload)))
+
+def pg_notify_json(*eventos_json):
+    """pg_notify(canal, json_build_array(...)) para incrustar en una sentencia con CTEs."""
+    return func.pg_notify(CANAL, cast(func.json_build_array(*eventos_json), String))
+
+# ---------- Suscriptores ----------
+class DemasiadosSuscriptores(Exception):
+    pass
+
+class Suscripcion:
+    def __init__(self):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=COLA)
+
+    def entregar(self, evento: dict) -> bool:
+        """False si hubo que descartar el atraso (cliente lento)."""
+        try:
+            self.cola.put_nowait(evento)
+            return True
+        except asyncio.QueueFull:
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(RESYNC)
+            return False
+
+    def cerrar(self):
+        while not self.cola.empty():
+            self.cola.get_nowait()
+        self.cola.put_nowait(None)  # fin del stream
+
+class Bus:
+    """Reparte los NOTIFY recibidos por la conexión LISTEN del worker a sus suscriptores."""
+
+    def __init__(self, max_suscriptores: int = MAX_SUSCRIPTORES):
+        self.max_suscriptores = max_suscriptores
+        self._subs: set[Suscripcion] = set()
+        self._conn: Optional[asyncpg.Connection] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._caida = asyncio.Event()
+        self.recibidos = 0
+        self.entregados = 0
+        self.descartes = 0
+        self.rechazados = 0
+        self.reconexiones = 0
+
+    def suscribir(self) -> Suscripcion:
+        if len(self._subs) >= self.max_suscriptores:
+            self.rechazados += 1
+            raise DemasiadosSuscriptores()
+        s = Suscripcion()
+        self._subs.add(s)
+        return s
+
+    def desuscribir(self, s: Suscripcion):
+        self._subs.discard(s)
+
+    def publicar(self, eventos: list[dict]):
+        for e in eventos:
+            for s in list(self._subs):
+                if s.entregar(e):
+                    self.entregados += 1
+                else:
+                    self.descartes += 1
+
+    def _al_notificar(self, conn, pid, canal, payload: str):
+        try:
+            eventos = json.loads(payload)
+        except ValueError:
+            logger.warning("NOTIFY %s con payload inválido", canal)
+            return
+        self.recibidos += len(eventos)
+        self.publicar(eventos)
+
+    def iniciar(self):
+        self._tarea = asyncio.create_task(self._escuchar())
+
+    async def detener(self):
+        for s in list(self._subs):
+            s.cerrar()
+        if self._tarea:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+    async def _escuchar(self):
+        dsn, ssl = _dsn()
+        espera = 1.0
+        while True:
+            try:
+                self._caida.clear()
+                self._conn = await asyncpg.connect(dsn, ssl=True if ssl else None)
+                self._conn.add_termination_listener(lambda c: self._caida.set())
+                await self._conn.add_listener(CANAL, self._al_notificar)
+                if self.reconexiones:
+                    self.publicar([RESYNC])  # pudo haber eventos mientras no escuchábamos
+                logger.info("Escuchando NOTIFY %s", CANAL)
+                espera = 1.0
+                await self._caida.wait()
+                logger.warning("Conexión LISTEN cerrada; reconectando")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("LISTEN %s falló (%s); reintento en %.0fs", CANAL, e, espera)
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 30)
+            self.reconexiones += 1
+
+    def stats(self) -> dict:
+        return {
+            "habilitado": HABILITADO,
+            "escuchando": self._conn is not None and not self._conn.is_closed(),
+            "suscriptores": len(self._subs),
+            "max_suscriptores": self.max_suscriptores,
+            "recibidos": self.recibidos,
+            "entregados": self.entregados,
+            "descartes_por_lentitud": self.descartes,
+            "rechazados": self.rechazados,
+            "reconexiones": self.reconexiones,
+        }
+
+bus = Bus()
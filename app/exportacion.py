@@ -0,0 +1,54 @@
+# app/exportacion.py
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import AsyncIterator, Literal
+
+from fastapi.responses import StreamingResponse
+
+Formato = Literal["ndjson", "csv"]
+FILAS_POR_BLOQUE = 500  # filas serializadas por cada write al socket
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+def _json_default(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return float(v)
+    raise TypeError(f"No serializable: {type(v).__name__}")
+
+async def _ndjson(filas: AsyncIterator[dict]) -> AsyncIterator[str]:
+    bloque = []
+    async for fila in filas:
+        bloque.append(json.dumps(fila, default=_json_default))
+        if len(bloque) >= FILAS_POR_BLOQUE:
+            yield "\n".join(bloque) + "\n"
+            bloque.clear()
+    if bloque:
+        yield "\n".join(bloque) + "\n"
+
+async def _csv(filas: AsyncIterator[dict], columnas: list[str]) -> AsyncIterator[str]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columnas)
+    writer.writeheader()
+    n = 0
+    async for fila in filas:
+        writer.writerow(fila)
+        n += 1
+        if n % FILAS_POR_BLOQUE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def respuesta(filas: AsyncIterator[dict], formato: Formato, columnas: list[str], nombre: str) -> StreamingResponse:
+    """StreamingResponse NDJSON/CSV; la memoria depende del bloque, no del total de filas."""
+    cuerpo = _csv(filas, columnas) if formato == "csv" else _ndjson(filas)
+    return StreamingResponse(
+        cuerpo,
+        media_type=MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'},
+    )
@@ -0,0 +1,152 @@
+# app/idempotencia.py
+"""
+Idempotency-Key para POST /ventas/, POST /movimientos/ y el formulario /web/ventas.
+
+- Sin clave todo sigue igual. Con clave, lo primero es una sola búsqueda por la
+  llave primaria (ambito, clave) de `idempotencia`; si ya hay respuesta guardada
+  se devuelve tal cual (cabecera Idempotency-Replayed: true) sin tocar productos.
+- Si no existe, la clave se reserva con INSERT ... ON CONFLICT y la respuesta se
+  guarda justo antes del commit de crud (hook `al_confirmar`), todo en la misma
+  transacción que la venta/movimiento: o queda la operación con su respuesta o
+  ninguna de las dos; nunca una clave "en_curso" huérfana. Un error de negocio
+  (400) hace rollback y la clave queda libre, así que reintentar cuando haya
+  stock sí registra la operación.
+- Dos reintentos simultáneos se serializan en el índice único; el perdedor ve la
+  respuesta del ganador (409 solo si aun así no la encuentra). La misma clave con
+  otro cuerpo es un error del cliente: 422.
+- Las claves tienen como mucho MAX_LARGO caracteres (el largo de la columna); las
+  rutas validan la cabecera/el campo con ese mismo límite.
+- Las claves expiran a las IDEMPOTENCIA_TTL_HORAS (24 por defecto); una clave vencida
+  se puede reutilizar y el job "purgar_idempotencia" borra las viejas (se encola
+  como mucho una vez por hora y proceso).
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+logger = logging.getLogger("idempotencia")
+
+TTL = timedelta(hours=float(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24")))
+PURGA_CADA = 3600.0
+MAX_LARGO = 200
+
+_ultima_purga = 0.0
+
+# Hook que crud espera con el resultado antes del commit (ver ejecutar())
+AlConfirmar = Callable[[Any], Awaitable[None]]
+
+def huella(payload: BaseModel) -> str:
+    cuerpo = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(cuerpo.encode()).hexdigest()
+
+async def buscar(db: AsyncSession, ambito: str, clave: str) -> Optional[Any]:
+    """La única consulta de un reintento: lookup por PK, ignorando claves vencidas."""
+    i = models.Idempotencia
+    res = await db.execute(
+        select(i.huella, i.estado, i.status_code, i.respuesta)
+        .where(i.ambito == ambito, i.clave == clave, i.expira_en > func.now())
+    )
+    return res.first()
+
+async def reservar(db: AsyncSession, ambito: str, clave: str, h: str) -> bool:
+    """Inserta la clave sin commit (lo hace la operación). False si otra petición ya la tiene."""
+    i = models.Idempotencia
+    ins = pg_insert(i).values(
+        ambito=ambito, clave=clave, huella=h, estado="en_curso",
+        expira_en=datetime.now(timezone.utc) + TTL,
+    )
+    stmt = ins.on_conflict_do_update(
+        index_elements=[i.ambito, i.clave],
+        set_={
+            "huella": ins.excluded.huella, "estado": "en_curso", "status_code": None, "respuesta": None,
+            "creada_en": func.now(), "expira_en": ins.excluded.expira_en,
+        },
+        where=i.expira_en <= func.now(),  # solo se pisa una clave vencida
+    ).returning(i.clave)
+    return (await db.execute(stmt)).scalar_one_or_none() is not None
+
+async def guardar(db: AsyncSession, ambito: str, clave: str, status_code: int, respuesta: Any):
+    """Guarda la respuesta sin commit: la confirma el commit de la propia operación."""
+    i = models.Idempotencia
+    await db.execute(
+        update(i)
+        .where(i.ambito == ambito, i.clave == clave)
+        .values(estado="hecha", status_code=status_code, respuesta=respuesta)
+    )
+
+async def purgar(db: AsyncSession) -> int:
+    res = await db.execute(delete(models.Idempotencia).where(models.Idempotencia.expira_en <= func.now()))
+    await db.commit()
+    return res.rowcount or 0
+
+async def _programar_purga(db: AsyncSession):
+    global _ultima_purga
+    if time.monotonic() - _ultima_purga < PURGA_CADA:
+        return
+    _ultima_purga = time.monotonic()
+    from . import jobs  # jobs importa crud; aquí solo hace falta al encolar
+    try:
+        await jobs.encolar(db, "purgar_idempotencia", clave="purgar_idempotencia")
+    except Exception:
+        logger.exception("No se pudo encolar la purga de claves de idempotencia")
+
+def _repetida(previa, h: str) -> JSONResponse:
+    if previa.huella != h:
+        raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con otro cuerpo")
+    if previa.estado != "hecha":
+        raise HTTPException(status_code=409, detail="Hay una petición en curso con esta Idempotency-Key")
+    return JSONResponse(
+        status_code=previa.status_code, content=previa.respuesta, headers={"Idempotency-Replayed": "true"}
+    )
+
+async def ejecutar(
+    db: AsyncSession,
+    ambito: str,
+    clave: Optional[str],
+    payload: BaseModel,
+    operacion: Callable[[Optional[AlConfirmar]], Awaitable[Any]],
+    modelo: type[BaseModel],
+    status_code: int = 201,
+) -> Any:
+    """
+    Corre `operacion` una sola vez por (ambito, clave). `operacion(al_confirmar)`
+    debe hacer commit y, si al_confirmar no es None, esperarlo con su resultado
+    justo antes (p.ej. crud.create_venta(db, data, al_confirmar)).
+    Devuelve su resultado, o un JSONResponse con la respuesta guardada si es un reintento.
+    """
+    if not clave:
+        return await operacion(None)
+    if len(clave) > MAX_LARGO:
+        raise HTTPException(status_code=422, detail=f"Idempotency-Key de más de {MAX_LARGO} caracteres")
+    h = huella(payload)
+    previa = await buscar(db, ambito, clave)
+    if previa is not None:
+        return _repetida(previa, h)
+    if not await reservar(db, ambito, clave, h):
+        # Otra petición con la misma clave llegó primero (el INSERT esperó a su commit)
+        previa = await buscar(db, ambito, clave)
+        await db.rollback()
+        if previa is None:
+            raise HTTPException(status_code=409, detail="Hay una petición en curso con esta Idempotency-Key")
+        return _repetida(previa, h)
+
+    async def al_confirmar(resultado: Any):
+        await guardar(db, ambito, clave, status_code, modelo.model_validate(resultado).model_dump(mode="json"))
+
+    resultado = await operacion(al_confirmar)
+    await _programar_purga(db)
+    return resultado
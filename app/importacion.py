@@ -0,0 +1,100 @@
+# app/importacion.py
+import asyncio
+import csv
+import io
+import json
+from typing import IO, AsyncIterator, Iterator, Literal
+
+from pydantic import ValidationError
+
+from . import schemas
+
+Formato = Literal["csv", "ndjson"]
+FILAS_POR_BLOQUE = 1000   # filas validadas por cada COPY
+MAX_ERRORES = 500         # errores detallados devueltos (el total se cuenta igual)
+
+COLUMNAS = (
+    "id_producto", "nombre", "categoria", "marca", "cantidad", "precio_venta", "imagen_url",
+    "punto_reorden", "nivel_par",
+)
+
+def detectar_formato(filename: str | None, content_type: str | None) -> Formato:
+    nombre = (filename or "").lower()
+    if nombre.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or "") or "json" in (content_type or ""):
+        return "ndjson"
+    return "csv"
+
+def _filas_csv(f: IO[bytes]) -> Iterator[tuple[int, dict | None, str | None]]:
+    texto = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    try:
+        lector = csv.DictReader(texto)
+        for n, fila in enumerate(lector, start=2):  # la fila 1 es la cabecera
+            yield n, fila, None
+    except (csv.Error, UnicodeDecodeError) as e:
+        yield -1, None, f"CSV ilegible: {e}"
+    finally:
+        texto.detach()
+
+def _filas_ndjson(f: IO[bytes]) -> Iterator[tuple[int, dict | None, str | None]]:
+    for n, linea in enumerate(f, start=1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            obj = json.loads(linea)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            yield n, None, f"JSON inválido: {e}"
+            continue
+        if not isinstance(obj, dict):
+            yield n, None, "Se esperaba un objeto JSON por línea"
+            continue
+        yield n, obj, None
+
+def _validar(fila: dict) -> dict:
+    """Con id_producto valida como ProductoUpdate (campos parciales); sin él, como ProductoCreate."""
+    datos = {k: (None if v == "" else v) for k, v in fila.items() if k in COLUMNAS}
+    id_producto = datos.pop("id_producto", None)
+    if id_producto is not None:
+        id_producto = int(id_producto)
+        if not 0 < id_producto <= schemas.INT4_MAX:
+            raise ValueError("id_producto inválido")
+        campos = schemas.ProductoUpdate(**datos).model_dump(exclude_none=True)
+        if not campos:
+            raise ValueError("Sin campos para actualizar")
+        return {"id_producto": id_producto, **campos}
+    return schemas.ProductoCreate(**datos).model_dump(exclude={"imagen_thumb_url"})
+
+def _mensaje(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'fila'}: {err['msg']}" for err in e.errors())
+    return str(e)
+
+def _bloques(f: IO[bytes], formato: Formato, errores: list[dict]) -> Iterator[list[tuple[int, dict]]]:
+    """
+    Lee el archivo de forma incremental y entrega bloques de (número de fila, datos validados).
+    Las filas inválidas se agregan a `errores` y no se entregan.
+    """
+    filas = _filas_csv(f) if formato == "csv" else _filas_ndjson(f)
+    bloque: list[tuple[int, dict]] = []
+    for n, fila, error in filas:
+        if error is None:
+            try:
+                bloque.append((n, _validar(fila)))
+            except (ValidationError, ValueError, TypeError) as e:
+                error = _mensaje(e)
+        if error is not None:
+            errores.append({"fila": n, "error": error})
+        if len(bloque) >= FILAS_POR_BLOQUE:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+async def bloques_validados(f: IO[bytes], formato: Formato, errores: list[dict]) -> AsyncIterator[list[tuple[int, dict]]]:
+    """
+    _bloques() fuera del event loop: cada bloque (lectura del archivo, que puede estar
+    en disco, y validación de sus filas) se produce en un hilo con asyncio.to_thread.
+    """
+    it = _bloques(f, formato, errores)
+    while (bloque := await asyncio.to_thread(next, it, None)) is not None:
+        yield bloque
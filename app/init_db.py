@@ -1,9 +1,13 @@
 # app/init_db.py
 import asyncio
-from app.database import engine, Base
+from sqlalchemy import text
+from app.database import engine
+from app.models import Base
 
 async def main():
     async with engine.begin() as conn:
+        # Requerida por el índice de búsqueda de productos (gin_trgm_ops)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
     print("Tablas creadas/actualizadas en la BD remota (Render).")
 
@@ -0,0 +1,243 @@
+# app/jobs.py
+"""
+Cola de trabajos diferidos sobre la tabla `jobs` (Postgres).
+
+- encolar() inserta un job; con `clave` se deduplica: mientras haya uno
+  pendiente o en curso con la misma clave se devuelve ese (índice único parcial).
+- Los workers reclaman con UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED),
+  así varios procesos comparten la cola sin pisarse.
+- Si el handler falla se reintenta con backoff exponencial hasta max_intentos.
+- Lease: al reclamar, lease_hasta = ahora + JOBS_LEASE segundos, y mientras el
+  handler corre un latido lo renueva cada JOBS_LEASE/3. Un job "en_curso" con el
+  lease vencido es de un worker caído y vuelve a reclamarse; un job largo (p.ej.
+  un rebuild) no, porque su latido lo mantiene vigente.
+- El Worker se arranca desde el lifespan de app.main (JOBS_WORKER=0 lo desactiva,
+  p.ej. para correr los workers en un proceso aparte).
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import select, update, and_, or_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, crud, idempotencia
+from .database import AsyncSessionLocal
+from .entorno import env_bool
+from .services import imagenes
+
+logger = logging.getLogger("jobs")
+
+CONCURRENCIA = int(os.getenv("JOBS_CONCURRENCY", "2"))
+INTERVALO = float(os.getenv("JOBS_POLL_INTERVAL", "2"))
+LEASE = float(os.getenv("JOBS_LEASE", "60"))
+LATIDO = LEASE / 3
+BACKOFF_BASE = float(os.getenv("JOBS_BACKOFF", "5"))
+HABILITADO = env_bool("JOBS_WORKER", True)
+
+Handler = Callable[[AsyncSession, dict], Awaitable[Any]]
+HANDLERS: dict[str, Handler] = {}
+
+_despertar = asyncio.Event()
+
+def tarea(tipo: str):
+    """Registra un handler async (db, payload) -> resultado serializable."""
+    def deco(fn: Handler) -> Handler:
+        HANDLERS[tipo] = fn
+        return fn
+    return deco
+
+def _json(valor: Any) -> Any:
+    # Decimal/datetime -> str, para guardarlo en la columna JSON
+    return json.loads(json.dumps(valor, default=str))
+
+async def encolar(
+    db: AsyncSession,
+    tipo: str,
+    payload: Optional[dict] = None,
+    clave: Optional[str] = None,
+    max_intentos: int = 3,
+    retraso: Optional[timedelta] = None,
+) -> models.Job:
+    """Inserta el job (o devuelve el vivo con la misma clave) y despierta a los workers locales."""
+    if tipo not in HANDLERS:
+        raise ValueError(f"Tipo de job desconocido: {tipo}")
+    j = models.Job
+    valores = {"tipo": tipo, "payload": payload or {}, "clave": clave, "max_intentos": max_intentos}
+    if retraso is not None:
+        valores["ejecutar_despues"] = datetime.now(timezone.utc) + retraso
+
+    stmt = (
+        pg_insert(j).values(**valores)
+        .on_conflict_do_nothing(index_elements=[j.clave], index_where=j.estado.in_(("pendiente", "en_curso")))
+        .returning(j.id)
+    )
+    vivo = select(j.id).where(j.clave == clave, j.estado.in_(("pendiente", "en_curso")))
+    for _ in range(3):
+        id_job = (await db.execute(stmt)).scalar_one_or_none()
+        if id_job is None:
+            # El job vivo puede terminar entre el INSERT y este SELECT: entonces se reintenta el INSERT
+            id_job = (await db.execute(vivo)).scalar_one_or_none()
+        if id_job is not None:
+            break
+    else:
+        raise RuntimeError(f"No se pudo encolar el job {tipo} con clave {clave}")
+    await db.commit()
+    _despertar.set()
+    return await db.get(j, id_job, populate_existing=True)
+
+async def encolar_imagen(db: AsyncSession, tabla: str, id_fila: int, original: str) -> Optional[models.Job]:
+    """Encola el post-procesado (WebP + miniatura) de un original subido con imagenes.subir_imagen()."""
+    if not imagenes.disponible():
+        return None
+    return await encolar(
+        db, "procesar_imagen", {"tabla": tabla, "id": id_fila, "original": original}, clave=f"img:{tabla}:{id_fila}"
+    )
+
+async def get_job(db: AsyncSession, id_job: int) -> Optional[models.Job]:
+    return await db.get(models.Job, id_job)
+
+async def reclamar(db: AsyncSession, n: int = 1) -> list[models.Job]:
+    """Marca como en_curso hasta n jobs listos (o con lease vencido) y los devuelve."""
+    j = models.Job
+    ahora = func.now()
+    vencido = j.lease_hasta < ahora  # todo job en_curso tiene lease (se fija al reclamar)
+
+    # Lease vencido sin intentos restantes: se da por fallido
+    await db.execute(
+        update(j)
+        .where(j.estado == "en_curso", vencido, j.intentos >= j.max_intentos)
+        .values(estado="fallido", terminado_en=ahora, error="Tiempo agotado (lease vencido)")
+    )
+    listos = (
+        select(j.id)
+        .where(or_(
+            and_(j.estado == "pendiente", j.ejecutar_despues <= ahora),
+            and_(j.estado == "en_curso", vencido),
+        ))
+        .order_by(j.ejecutar_despues, j.id)
+        .limit(n)
+        .with_for_update(skip_locked=True)
+    )
+    res = await db.scalars(
+        update(j)
+        .where(j.id.in_(listos.scalar_subquery()))
+        .values(
+            estado="en_curso", intentos=j.intentos + 1, iniciado_en=ahora,
+            lease_hasta=ahora + timedelta(seconds=LEASE), error=None,
+        )
+        .returning(j)
+    )
+    jobs = list(res.all())
+    await db.commit()
+    return jobs
+
+def _este_intento(job: models.Job):
+    # Si el lease venció y otro worker lo reclamó, intentos ya no coincide: no se pisa su estado
+    return and_(models.Job.id == job.id, models.Job.intentos == job.intentos)
+
+async def _terminar(job: models.Job, **valores):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(models.Job).where(_este_intento(job)).values(lease_hasta=None, **valores))
+        await db.commit()
+
+async def _latido(job: models.Job):
+    """Renueva el lease cada LATIDO segundos mientras corre el handler."""
+    while True:
+        await asyncio.sleep(LATIDO)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(models.Job)
+                    .where(_este_intento(job), models.Job.estado == "en_curso")
+                    .values(lease_hasta=func.now() + timedelta(seconds=LEASE))
+                )
+                await db.commit()
+        except Exception:
+            logger.warning("Job %s: no se pudo renovar el lease", job.id, exc_info=True)
+
+async def ejecutar(job: models.Job):
+    """Corre el handler en su propia sesión y registra el resultado o programa el reintento."""
+    latido = asyncio.create_task(_latido(job))
+    try:
+        try:
+            async with AsyncSessionLocal() as db:
+                resultado = await HANDLERS[job.tipo](db, job.payload or {})
+        finally:
+            latido.cancel()
+    except Exception as e:
+        logger.exception("Job %s (%s) falló en el intento %s", job.id, job.tipo, job.intentos)
+        if job.intentos < job.max_intentos:
+            espera = timedelta(seconds=BACKOFF_BASE * 2 ** (job.intentos - 1))
+            await _terminar(
+                job, estado="pendiente", error=str(e)[:2000],
+                ejecutar_despues=datetime.now(timezone.utc) + espera,
+            )
+        else:
+            await _terminar(job, estado="fallido", error=str(e)[:2000], terminado_en=func.now())
+        return
+    await _terminar(job, estado="hecho", resultado=_json(resultado), terminado_en=func.now())
+
+class Worker:
+    """N bucles async que reclaman y ejecutan jobs; se despiertan al encolar o cada INTERVALO s."""
+
+    def __init__(self, concurrencia: int = CONCURRENCIA, intervalo: float = INTERVALO):
+        self.concurrencia = concurrencia
+        self.intervalo = intervalo
+        self._tareas: list[asyncio.Task] = []
+        self._parar = asyncio.Event()
+
+    def iniciar(self):
+        self._parar.clear()
+        self._tareas = [asyncio.create_task(self._bucle(i)) for i in range(self.concurrencia)]
+        logger.info("Worker de jobs iniciado (concurrencia=%s)", self.concurrencia)
+
+    async def detener(self):
+        self._parar.set()
+        _despertar.set()
+        for t in self._tareas:
+            t.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+
+    async def _bucle(self, n: int):
+        while not self._parar.is_set():
+            try:
+                async with AsyncSessionLocal() as db:
+                    jobs = await reclamar(db, 1)
+            except Exception:
+                logger.exception("Worker %s: error reclamando jobs", n)
+                jobs = []
+            if jobs:
+                await ejecutar(jobs[0])
+                continue
+            _despertar.clear()
+            try:
+                await asyncio.wait_for(_despertar.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+
+worker = Worker()
+
+
+# ---------- Handlers ----------
+@tarea("rebuild_resumenes")
+async def _rebuild_resumenes(db: AsyncSession, payload: dict):
+    await crud.rebuild_resumenes_ventas(db)
+
+@tarea("reconciliacion_stock")
+async def _reconciliacion(db: AsyncSession, payload: dict):
+    descuadres = await crud.reconciliacion_stock(db)
+    return {"descuadres": descuadres, "total": len(descuadres)}
+
+@tarea("purgar_idempotencia")
+async def _purgar_idempotencia(db: AsyncSession, payload: dict):
+    return {"borradas": await idempotencia.purgar(db)}
+
+@tarea("procesar_imagen")
+async def _procesar_imagen(db: AsyncSession, payload: dict):
+    return await imagenes.procesar_imagen(db, payload["tabla"], payload["id"], payload["original"])
@@ -1,12 +1,57 @@
 # app/main.py
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 
 from .routes import usuarios, productos, ventas, movimientos, reportes
-from .routes import web, health
+from .routes import web, health, jobs as jobs_routes, eventos as eventos_routes
+from .jobs import worker, HABILITADO as JOBS_HABILITADO
+from .buffer_ventas import buffer as buffer_ventas, HABILITADO as BUFFER_VENTAS_HABILITADO
+from .services.supabase_storage import storage
+from .services import imagenes
+from .database import engine, read_engine, REPLICA, precalentar, marcar_escritura
+from .metricas import MiddlewareMetricas
+from .eventos import bus, HABILITADO as EVENTOS_HABILITADO
+from .plantillas import precompilar
 
-app = FastAPI(title="Inventario de Bar")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    precompilar(web.templates.env)
+    await precalentar()
+    if REPLICA:
+        await precalentar(e=read_engine)
+    if JOBS_HABILITADO:
+        worker.iniciar()
+    if BUFFER_VENTAS_HABILITADO:
+        await buffer_ventas.iniciar()
+    if EVENTOS_HABILITADO:
+        bus.iniciar()
+    yield
+    if EVENTOS_HABILITADO:
+        await bus.detener()
+    if BUFFER_VENTAS_HABILITADO:
+        await buffer_ventas.detener()
+    if JOBS_HABILITADO:
+        await worker.detener()
+    await storage.cerrar()
+    imagenes.cerrar()
+    await engine.dispose()
+    if REPLICA:
+        await read_engine.dispose()
+
+app = FastAPI(title="Inventario de Bar", lifespan=lifespan)
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    # Tras una escritura, las lecturas de este cliente van a la primaria unos segundos
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        marcar_escritura(response)
+    return response
+
+# Última en añadirse = más externa: mide también el middleware de read-your-writes
+app.add_middleware(MiddlewareMetricas)
 
 BASE_DIR = Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
@@ -18,3 +63,5 @@ app.include_router(movimientos.router)
 app.include_router(reportes.router)
 app.include_router(web.router)
 app.include_router(health.router)
+app.include_router(jobs_routes.router)
+app.include_router(eventos_routes.router)
@@ -0,0 +1,304 @@
+# app/metricas.py
+"""
+Instrumentación por petición: latencia por ruta, número de sentencias SQL,
+tiempo total en BD y tiempo de render de Jinja.
+
+- MiddlewareMetricas (ASGI puro, registrado en app.main) abre una Medicion por
+  petición en un ContextVar y la cierra al terminar de enviar el cuerpo.
+- instrumentar_engine() (llamado desde app.database) cuenta y cronometra cada
+  sentencia con los eventos before/after_cursor_execute y registra en el log
+  "db.lento" las que superan DB_SLOW_QUERY_MS.
+- TemplateMedido cronometra cada render de plantilla, también los renders en
+  streaming con generate() (se instala en el Environment de Jinja de app.plantillas).
+  Además del total por ruta se acumula por plantilla (registro.plantillas).
+- texto_prometheus() arma la salida de /metrics. Los contadores son por proceso:
+  con varios workers, Prometheus debe raspar cada uno (o sumar por instancia).
+- METRICS_SERVER_TIMING=1 añade la cabecera Server-Timing (app, db, render).
+- PERFIL_RUTAS="/web/dashboard,/reportes/*" perfila esas rutas con pyinstrument
+  (opcional) y guarda el informe en PERFIL_DIR; también se cambia en caliente
+  con activar_perfilado().
+"""
+import bisect
+import fnmatch
+import logging
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import jinja2
+from sqlalchemy import event
+
+from .entorno import env_bool
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover - dependencia opcional
+    Profiler = None
+
+logger = logging.getLogger("metricas")
+logger_lento = logging.getLogger("db.lento")
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "250"))
+SERVER_TIMING = env_bool("METRICS_SERVER_TIMING", False)
+PERFIL_DIR = Path(os.getenv("PERFIL_DIR", "/tmp/inventariobar-perfiles"))
+
+# Límites (s) del histograma de latencia; el último cubo es +Inf
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+@dataclass(slots=True)
+class Medicion:
+    sql: int = 0
+    sql_s: float = 0.0
+    render_s: float = 0.0
+
+_actual: ContextVar[Optional[Medicion]] = ContextVar("medicion_actual", default=None)
+
+@dataclass(slots=True)
+class _Ruta:
+    peticiones: dict = field(default_factory=dict)  # status -> n
+    cubos: list = field(default_factory=lambda: [0] * (len(LIMITES_LATENCIA) + 1))
+    suma_s: float = 0.0
+    n: int = 0
+    sql: int = 0
+    sql_s: float = 0.0
+    render_s: float = 0.0
+
+@dataclass(slots=True)
+class _Plantilla:
+    n: int = 0
+    suma_s: float = 0.0
+    max_s: float = 0.0
+
+class Registro:
+    def __init__(self):
+        self.rutas: dict[tuple[str, str], _Ruta] = {}
+        self.plantillas: dict[str, _Plantilla] = {}
+        self.consultas_lentas = 0
+        self.sql_fuera_de_peticion = 0
+
+    def registrar(self, metodo: str, ruta: str, status: int, dur_s: float, m: Medicion):
+        r = self.rutas.get((metodo, ruta))
+        if r is None:
+            r = self.rutas[(metodo, ruta)] = _Ruta()
+        r.peticiones[status] = r.peticiones.get(status, 0) + 1
+        r.cubos[bisect.bisect_left(LIMITES_LATENCIA, dur_s)] += 1
+        r.suma_s += dur_s
+        r.n += 1
+        r.sql += m.sql
+        r.sql_s += m.sql_s
+        r.render_s += m.render_s
+
+    def registrar_plantilla(self, nombre: str, dur_s: float):
+        t = self.plantillas.get(nombre)
+        if t is None:
+            t = self.plantillas[nombre] = _Plantilla()
+        t.n += 1
+        t.suma_s += dur_s
+        t.max_s = max(t.max_s, dur_s)
+
+registro = Registro()
+
+# ---------- SQLAlchemy ----------
+def instrumentar_engine(engine, nombre: str = "primaria"):
+    sync = engine.sync_engine
+
+    @event.listens_for(sync, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_t_sql", []).append(time.perf_counter())
+
+    @event.listens_for(sync, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        dur = time.perf_counter() - conn.info["_t_sql"].pop()
+        m = _actual.get()
+        if m is not None:
+            m.sql += 1
+            m.sql_s += dur
+        else:
+            registro.sql_fuera_de_peticion += 1
+        if dur * 1000 >= SLOW_QUERY_MS:
+            registro.consultas_lentas += 1
+            logger_lento.warning("%.0f ms [%s] %s", dur * 1000, nombre, " ".join(statement.split())[:500])
+
+    @event.listens_for(sync, "handle_error")
+    def _error(ctx):
+        # La sentencia falló: descarta su marca de inicio
+        pila = ctx.connection.info.get("_t_sql") if ctx.connection is not None else None
+        if pila:
+            pila.pop()
+
+# ---------- Jinja ----------
+def medir_render(nombre: str, dur_s: float):
+    """Suma un render a la petición en curso y a las estadísticas de la plantilla."""
+    registro.registrar_plantilla(nombre, dur_s)
+    m = _actual.get()
+    if m is not None:
+        m.render_s += dur_s
+
+class TemplateMedido(jinja2.Template):
+    def render(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            medir_render(self.name or "<cadena>", time.perf_counter() - t0)
+
+    def generate(self, *args, **kwargs):
+        # Solo cuenta el tiempo dentro de Jinja, no el que el cliente tarda en recibir
+        gen = super().generate(*args, **kwargs)
+        total = 0.0
+        try:
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    trozo = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    total += time.perf_counter() - t0
+                yield trozo
+        finally:
+            gen.close()
+            medir_render(self.name or "<cadena>", total)
+
+def instrumentar_jinja(env: jinja2.Environment):
+    env.template_class = TemplateMedido
+
+def stats_plantillas() -> dict:
+    return {
+        nombre: {
+            "renders": t.n,
+            "total_ms": round(t.suma_s * 1000, 3),
+            "media_ms": round(t.suma_s / t.n * 1000, 3) if t.n else 0.0,
+            "max_ms": round(t.max_s * 1000, 3),
+        }
+        for nombre, t in sorted(registro.plantillas.items())
+    }
+
+# ---------- Perfilado ----------
+_patrones_perfil: list[str] = [p.strip() for p in os.getenv("PERFIL_RUTAS", "").split(",") if p.strip()]
+
+def activar_perfilado(patrones: list[str]) -> list[str]:
+    """Define (o vacía, para apagar) los patrones de ruta a perfilar."""
+    global _patrones_perfil
+    _patrones_perfil = [p for p in patrones if p]
+    if _patrones_perfil and Profiler is None:
+        logger.warning("Perfilado pedido pero pyinstrument no está instalado")
+    return _patrones_perfil
+
+def _perfilar(path: str) -> bool:
+    return Profiler is not None and any(fnmatch.fnmatch(path, p) for p in _patrones_perfil)
+
+def _guardar_perfil(profiler, metodo: str, path: str):
+    PERFIL_DIR.mkdir(parents=True, exist_ok=True)
+    nombre = f"{time.strftime('%Y%m%d-%H%M%S')}-{metodo}-{path.strip('/').replace('/', '_') or 'raiz'}.html"
+    destino = PERFIL_DIR / nombre
+    destino.write_text(profiler.output_html())
+    logger.info("Perfil de %s %s guardado en %s", metodo, path, destino)
+
+# ---------- Middleware ----------
+class MiddlewareMetricas:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        m = Medicion()
+        token = _actual.set(m)
+        t0 = time.perf_counter()
+        status = 500
+        profiler = None
+        if _patrones_perfil and _perfilar(scope["path"]):
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+
+        async def enviar(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    app_ms = (time.perf_counter() - t0) * 1000
+                    valor = (
+                        f'app;dur={app_ms:.1f}, db;dur={m.sql_s * 1000:.1f};desc="{m.sql} sql", '
+                        f"render;dur={m.render_s * 1000:.1f}"
+                    )
+                    message.setdefault("headers", []).append((b"server-timing", valor.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _actual.reset(token)
+            ruta = scope.get("route")
+            plantilla = getattr(ruta, "path", None) or "<sin_ruta>"
+            registro.registrar(scope["method"], plantilla, status, time.perf_counter() - t0, m)
+            if profiler is not None:
+                profiler.stop()
+                try:
+                    _guardar_perfil(profiler, scope["method"], scope["path"])
+                except OSError as e:
+                    logger.warning("No se pudo guardar el perfil: %s", e)
+
+# ---------- Prometheus ----------
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def texto_prometheus(extra: Optional[dict[str, float]] = None) -> str:
+    """Formato de exposición de texto de Prometheus (0.0.4)."""
+    out = [
+        "# HELP http_requests_total Peticiones HTTP por ruta y status.",
+        "# TYPE http_requests_total counter",
+    ]
+    items = sorted(registro.rutas.items())
+    for (metodo, ruta), r in items:
+        for status, n in sorted(r.peticiones.items()):
+            out.append(f'http_requests_total{{method="{metodo}",route="{_esc(ruta)}",status="{status}"}} {n}')
+
+    out += [
+        "# HELP http_request_duration_seconds Latencia por ruta (hasta enviar el cuerpo completo).",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (metodo, ruta), r in items:
+        etq = f'method="{metodo}",route="{_esc(ruta)}"'
+        acumulado = 0
+        for limite, n in zip(LIMITES_LATENCIA, r.cubos):
+            acumulado += n
+            out.append(f'http_request_duration_seconds_bucket{{{etq},le="{limite}"}} {acumulado}')
+        out.append(f'http_request_duration_seconds_bucket{{{etq},le="+Inf"}} {r.n}')
+        out.append(f"http_request_duration_seconds_sum{{{etq}}} {r.suma_s:.6f}")
+        out.append(f"http_request_duration_seconds_count{{{etq}}} {r.n}")
+
+    for nombre, ayuda, attr, fmt in (
+        ("http_request_db_statements_total", "Sentencias SQL ejecutadas por ruta.", "sql", "{}"),
+        ("http_request_db_seconds_total", "Tiempo total en BD por ruta.", "sql_s", "{:.6f}"),
+        ("http_request_render_seconds_total", "Tiempo total de render Jinja por ruta.", "render_s", "{:.6f}"),
+    ):
+        out += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} counter"]
+        for (metodo, ruta), r in items:
+            out.append(f'{nombre}{{method="{metodo}",route="{_esc(ruta)}"}} ' + fmt.format(getattr(r, attr)))
+
+    plantillas = sorted(registro.plantillas.items())
+    for nombre, ayuda, tipo, attr, fmt in (
+        ("template_renders_total", "Renders por plantilla Jinja (o fragmento).", "counter", "n", "{}"),
+        ("template_render_seconds_total", "Tiempo total de render por plantilla.", "counter", "suma_s", "{:.6f}"),
+        ("template_render_seconds_max", "Render más lento por plantilla.", "gauge", "max_s", "{:.6f}"),
+    ):
+        out += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+        for plantilla, t in plantillas:
+            out.append(f'{nombre}{{template="{_esc(plantilla)}"}} ' + fmt.format(getattr(t, attr)))
+
+    out += [
+        "# HELP db_slow_statements_total Sentencias por encima de DB_SLOW_QUERY_MS.",
+        "# TYPE db_slow_statements_total counter",
+        f"db_slow_statements_total {registro.consultas_lentas}",
+        "# HELP db_statements_outside_request_total Sentencias fuera de una petición (jobs, arranque).",
+        "# TYPE db_statements_outside_request_total counter",
+        f"db_statements_outside_request_total {registro.sql_fuera_de_peticion}",
+    ]
+    for nombre, valor in (extra or {}).items():
+        out += [f"# TYPE {nombre} gauge", f"{nombre} {valor}"]
+    return "\n".join(out) + "\n"
@@ -7,6 +7,8 @@ from .database import Base
 class Base(DeclarativeBase):
     pass
 
+BUSQUEDA_SQL = "lower(coalesce(nombre, '') || ' ' || coalesce(categoria, '') || ' ' || coalesce(marca, ''))"
+
 class Usuario(Base):
     __tablename__ = "usuarios"
     id_usuario: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -14,12 +16,26 @@ class Usuario(Base):
     correo: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     rol: Mapped[str] = mapped_column(String(20), nullable=False, default="consulta")
     foto_url = Column(String, nullable=True)
+    foto_thumb_url = Column(String, nullable=True)
     creado_en: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
     activo = sa.Column(sa.Boolean, nullable=False, server_default=sa.true())
 ventas = relationship("Venta", back_populates="usuario")
 
 class Producto(Base):
     __tablename__ = "productos"
+    __table_args__ = (
+        sa.Index(
+            "ix_productos_busqueda_trgm", "busqueda",
+            postgresql_using="gin", postgresql_ops={"busqueda": "gin_trgm_ops"},
+        ),
+        # Lista de reorden (app/reorden.py): solo los productos con seguimiento; cantidad
+        # queda fuera del índice para que los UPDATE de stock sigan siendo HOT
+        sa.Index(
+            "ix_productos_bajo_reorden", "id_producto",
+            postgresql_where=sa.text("punto_reorden IS NOT NULL"),
+            sqlite_where=sa.text("punto_reorden IS NOT NULL"),
+        ),
+    )
     id_producto: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     nombre: Mapped[str] = mapped_column(String(200), nullable=False)
     categoria: Mapped[str] = mapped_column(String(100), nullable=True)
@@ -27,25 +43,38 @@ class Producto(Base):
     cantidad: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     precio_venta: Mapped[float] = mapped_column(Float, nullable=False, default=0)
     imagen_url = Column(String, nullable=True)
+    imagen_thumb_url = Column(String, nullable=True)
     fecha_agregado: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
     activo = sa.Column(sa.Boolean, nullable=False, server_default=sa.true())
+    # Texto de búsqueda (nombre + categoría + marca) con índice GIN pg_trgm (ver migración 0001)
+    busqueda = sa.Column(sa.Text, sa.Computed(BUSQUEDA_SQL, persisted=True))
+    # Reorden: umbral y nivel objetivo (NULL = sin seguimiento / calculado) y velocidad
+    # de venta (EMA en unidades/día a la fecha velocidad_en), ver app/reorden.py
+    punto_reorden = sa.Column(sa.Integer, nullable=True)
+    nivel_par = sa.Column(sa.Integer, nullable=True)
+    velocidad_ema = sa.Column(sa.Float, nullable=False, server_default="0")
+    velocidad_en = sa.Column(sa.DateTime(timezone=True), nullable=True)
 ventas = relationship("Venta", back_populates="producto")
 
 class Venta(Base):
     __tablename__ = "ventas"
+    __table_args__ = (
+        # Paginación keyset (ORDER BY id_venta DESC) con y sin filtros
+        sa.Index("ix_ventas_producto_id_venta", "id_producto", "id_venta"),
+        sa.Index("ix_ventas_usuario_id_venta", "id_usuario", "id_venta"),
+        sa.Index("ix_ventas_fecha_venta_id_venta", "fecha_venta", "id_venta"),
+    )
 
     id_venta = sa.Column(sa.Integer, primary_key=True, index=True)
     id_usuario = sa.Column(
         sa.Integer,
         sa.ForeignKey("usuarios.id_usuario", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
     id_producto = sa.Column(
         sa.Integer,
         sa.ForeignKey("productos.id_producto", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
     cantidad_vendida = sa.Column(sa.Integer, nullable=False)
     total_venta = sa.Column(sa.Numeric(10, 2), nullable=False)
@@ -56,6 +85,7 @@ class Venta(Base):
 
 class InventarioMovimiento(Base):
     __tablename__ = "inventario_movimientos"
+    __table_args__ = (sa.Index("ix_inventario_movimientos_producto_id", "id_producto", "id_movimiento"),)
 
     id_movimiento = Column(Integer, primary_key=True, index=True)
     id_producto = Column(Integer, ForeignKey("productos.id_producto", ondelete="CASCADE"), nullable=False)
@@ -66,14 +96,99 @@ class InventarioMovimiento(Base):
 
 class ProductoMasVendido(Base):
     __tablename__ = "productos_mas_vendidos"
-    id_producto: Mapped[int] = mapped_column(ForeignKey("productos.id_producto"), primary_key=True)
+    id_producto: Mapped[int] = mapped_column(ForeignKey("productos.id_producto", ondelete="CASCADE"), primary_key=True)
     nombre: Mapped[str] = mapped_column(String(200), nullable=False)
     total_vendido: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    monto_total = sa.Column(sa.Numeric(12, 2), nullable=False, server_default="0")
     actualizado_en: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 class ProductoMenosVendido(Base):
     __tablename__ = "productos_menos_vendidos"
-    id_producto: Mapped[int] = mapped_column(ForeignKey("productos.id_producto"), primary_key=True)
+    id_producto: Mapped[int] = mapped_column(ForeignKey("productos.id_producto", ondelete="CASCADE"), primary_key=True)
     nombre: Mapped[str] = mapped_column(String(200), nullable=False)
     total_vendido: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
-    actualizado_en: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    monto_total = sa.Column(sa.Numeric(12, 2), nullable=False, server_default="0")
+    actualizado_en: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+class ReconciliacionCheckpoint(Base):
+    """Saldo de movimientos ya conciliado por producto (hasta ultimo_id_movimiento)."""
+    __tablename__ = "reconciliacion_checkpoints"
+    id_producto: Mapped[int] = mapped_column(ForeignKey("productos.id_producto", ondelete="CASCADE"), primary_key=True)
+    ultimo_id_movimiento: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    saldo: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    actualizado_en: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+class VentaPorHora(Base):
+    """Rollup horario por producto (bucket = inicio de la hora en UTC)."""
+    __tablename__ = "ventas_por_hora"
+    bucket = sa.Column(sa.DateTime(timezone=True), primary_key=True)
+    id_producto = sa.Column(
+        sa.Integer, sa.ForeignKey("productos.id_producto", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    unidades = sa.Column(sa.BigInteger, nullable=False, server_default="0")
+    monto = sa.Column(sa.Numeric(14, 2), nullable=False, server_default="0")
+    tickets = sa.Column(sa.Integer, nullable=False, server_default="0")
+
+class VentaPorDia(Base):
+    """Rollup diario por producto (bucket = inicio del día en UTC)."""
+    __tablename__ = "ventas_por_dia"
+    bucket = sa.Column(sa.DateTime(timezone=True), primary_key=True)
+    id_producto = sa.Column(
+        sa.Integer, sa.ForeignKey("productos.id_producto", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    unidades = sa.Column(sa.BigInteger, nullable=False, server_default="0")
+    monto = sa.Column(sa.Numeric(14, 2), nullable=False, server_default="0")
+    tickets = sa.Column(sa.Integer, nullable=False, server_default="0")
+
+class CatalogoVersion(Base):
+    """Sello de versión por catálogo ('productos', 'usuarios'); lo consultan las cachés de cada worker."""
+    __tablename__ = "catalogo_version"
+    nombre: Mapped[str] = mapped_column(String(40), primary_key=True)
+    version: Mapped[int] = mapped_column(sa.BigInteger, nullable=False, default=1)
+
+class Job(Base):
+    """Trabajo diferido (ver app/jobs.py). Los workers lo reclaman con FOR UPDATE SKIP LOCKED."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Un solo trabajo vivo por clave de deduplicación
+        sa.Index(
+            "ux_jobs_clave_viva", "clave",
+            unique=True,
+            postgresql_where=sa.text("estado IN ('pendiente', 'en_curso')"),
+            sqlite_where=sa.text("estado IN ('pendiente', 'en_curso')"),
+        ),
+        sa.Index("ix_jobs_estado_ejecutar", "estado", "ejecutar_despues", "id"),
+    )
+    id = sa.Column(sa.BigInteger().with_variant(sa.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    tipo = sa.Column(sa.String(60), nullable=False)
+    payload = sa.Column(sa.JSON, nullable=False, default=dict)
+    clave = sa.Column(sa.String(200), nullable=True)
+    estado = sa.Column(sa.String(20), nullable=False, server_default="pendiente")
+    intentos = sa.Column(sa.Integer, nullable=False, server_default="0")
+    max_intentos = sa.Column(sa.Integer, nullable=False, server_default="3")
+    ejecutar_despues = sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=func.now())
+    iniciado_en = sa.Column(sa.DateTime(timezone=True), nullable=True)
+    lease_hasta = sa.Column(sa.DateTime(timezone=True), nullable=True)  # lo renueva el latido del worker
+    terminado_en = sa.Column(sa.DateTime(timezone=True), nullable=True)
+    error = sa.Column(sa.Text, nullable=True)
+    resultado = sa.Column(sa.JSON, nullable=True)
+    creado_en = sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class VentaBufferClave(Base):
+    """Claves de ventas del buffer local ya aplicadas (ver app/buffer_ventas.py): el reenvío tras una caída no duplica."""
+    __tablename__ = "ventas_buffer_claves"
+    clave = sa.Column(sa.String(100), primary_key=True)
+    id_venta = sa.Column(sa.Integer, sa.ForeignKey("ventas.id_venta", ondelete="SET NULL"), nullable=True)
+    aplicada_en = sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+
+class Idempotencia(Base):
+    """Respuesta guardada por (ámbito, Idempotency-Key): los reintentos se responden desde aquí (ver app/idempotencia.py)."""
+    __tablename__ = "idempotencia"
+    ambito = sa.Column(sa.String(60), primary_key=True)
+    clave = sa.Column(sa.String(200), primary_key=True)
+    huella = sa.Column(sa.String(64), nullable=False)
+    estado = sa.Column(sa.String(20), nullable=False, server_default="en_curso")
+    status_code = sa.Column(sa.Integer, nullable=True)
+    respuesta = sa.Column(sa.JSON, nullable=True)
+    creada_en = sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=func.now())
+    expira_en = sa.Column(sa.DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,50 @@
+# app/paginacion.py
+import base64
+from fastapi import HTTPException, Response
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 500
+HEADER_CURSOR = "X-Next-Cursor"
+
+def encode_cursor(ultimo_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{ultimo_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefijo, valor = raw.split(":", 1)
+        if prefijo != "id":
+            raise ValueError
+        return int(valor)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="cursor inválido")
+
+def encode_cursor_busqueda(clave: tuple[float, int]) -> str:
+    puntaje, ultimo_id = clave
+    return base64.urlsafe_b64encode(f"s:{puntaje!r}:{ultimo_id}".encode()).decode().rstrip("=")
+
+def decode_cursor_busqueda(cursor: str | None) -> tuple[float, int] | None:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefijo, puntaje, valor = raw.split(":", 2)
+        if prefijo != "s":
+            raise ValueError
+        return float(puntaje), int(valor)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="cursor inválido")
+
+def resolver_after_id(cursor: str | None, after_id: int | None) -> int | None:
+    # El cursor opaco tiene prioridad sobre after_id
+    return decode_cursor(cursor) if cursor else after_id
+
+def pagina(rows: list, limit: int, id_attr: str, response: Response) -> list:
+    """
+    `rows` se pidió con limit + 1: si sobra una fila hay página siguiente y
+    se publica su cursor en el header X-Next-Cursor.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[HEADER_CURSOR] = encode_cursor(getattr(rows[-1], id_attr))
+    return rows
@@ -0,0 +1,174 @@
+# app/plantillas.py
+"""
+Entorno Jinja de la interfaz web: bytecode en caché, plantillas precompiladas,
+fragmentos HTML cacheados por versión de catálogo y render en streaming.
+
+- Bytecode: jinja2.FileSystemBytecodeCache en PLANTILLAS_BYTECODE_DIR (por
+  defecto el directorio temporal del usuario). Un worker nuevo carga el código ya
+  compilado en vez de parsear y compilar cada plantilla; la clave incluye el
+  checksum del fuente, así que nunca se usa bytecode de una versión vieja.
+  PLANTILLAS_BYTECODE=0 lo apaga.
+- precompilar() (en el arranque) carga todas las plantillas. Sin
+  PLANTILLAS_RECARGA=1 (desarrollo) Jinja no vuelve a mirar el mtime de los
+  archivos en cada render.
+- Fragmentos: desplegables y tablas que solo cambian con el catálogo se guardan
+  ya renderizados, con clave (fragmento, versión de catalogo_version, ...). La
+  versión es común a todos los workers: una escritura en otro worker cambia la
+  clave a más tardar tras CATALOGO_TTL, igual que los snapshots del catálogo.
+  LRU acotado a PLANTILLAS_FRAGMENTOS_MAX entradas. Lo que cambia sin subir la
+  versión (el stock) no entra en el fragmento: con_stock() lo completa en cada
+  petición.
+- respuesta_streaming(): renderiza con Template.generate y envía bloques de
+  PLANTILLAS_BLOQUE caracteres, así el primer byte de una tabla larga sale antes
+  de terminar de renderizarla.
+- El tiempo de render de cada plantilla y fragmento se acumula en app.metricas
+  (/metrics y /health/plantillas).
+"""
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable, Optional
+
+import jinja2
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from markupsafe import Markup
+
+from .metricas import instrumentar_jinja, medir_render
+from .entorno import env_bool
+
+logger = logging.getLogger("plantillas")
+
+BYTECODE = env_bool("PLANTILLAS_BYTECODE", True)
+BYTECODE_DIR = os.getenv("PLANTILLAS_BYTECODE_DIR") or None
+RECARGA = env_bool("PLANTILLAS_RECARGA", False)
+MAX_FRAGMENTOS = int(os.getenv("PLANTILLAS_FRAGMENTOS_MAX", "256"))
+BLOQUE = int(os.getenv("PLANTILLAS_BLOQUE", "16384"))
+FRAGMENTOS = "web/_fragmentos.html"
+
+def crear_templates(directorio: Path) -> Jinja2Templates:
+    if BYTECODE_DIR:
+        Path(BYTECODE_DIR).mkdir(parents=True, exist_ok=True)
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(str(directorio)),
+        autoescape=True,
+        auto_reload=RECARGA,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(BYTECODE_DIR) if BYTECODE else None,
+    )
+    env.filters["seleccionar"] = seleccionar
+    instrumentar_jinja(env)
+    return Jinja2Templates(env=env)
+
+def precompilar(env: jinja2.Environment) -> int:
+    """Carga (y deja en la caché del entorno) todas las plantillas .html."""
+    t0 = time.perf_counter()
+    n = 0
+    for nombre in env.list_templates(filter_func=lambda x: x.endswith(".html")):
+        try:
+            env.get_template(nombre)
+            n += 1
+        except jinja2.TemplateError:
+            logger.exception("No se pudo compilar la plantilla %s", nombre)
+    logger.info("%d plantillas precompiladas en %.0f ms", n, (time.perf_counter() - t0) * 1000)
+    return n
+
+def seleccionar(opciones: str, valor: Optional[int]) -> Markup:
+    """Marca `selected` en la <option> de `valor` dentro de un fragmento de opciones cacheado."""
+    if not valor:  # None, vacío o indefinido en la plantilla
+        return Markup(opciones)
+    attr = f'value="{int(valor)}"'
+    return Markup(str(opciones).replace(attr, f"{attr} selected", 1))
+
+class CacheFragmentos:
+    """LRU de fragmentos HTML ya renderizados."""
+
+    def __init__(self, max_entradas: int = MAX_FRAGMENTOS):
+        self.max_entradas = max_entradas
+        self._datos: OrderedDict[tuple, Markup] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, clave: tuple[Hashable, ...]) -> Optional[Markup]:
+        html = self._datos.get(clave)
+        if html is None:
+            self.misses += 1
+            return None
+        self._datos.move_to_end(clave)
+        self.hits += 1
+        return html
+
+    def guardar(self, clave: tuple[Hashable, ...], html: Markup) -> Markup:
+        self._datos[clave] = html
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+        return html
+
+    def invalidar(self):
+        self._datos.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._datos),
+            "max_entradas": self.max_entradas,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+fragmentos = CacheFragmentos()
+
+_CELDA_STOCK = re.compile(r'(<td data-stock="(\d+)">)(</td>)')
+
+def con_stock(filas: str, stock: dict[int, int]) -> Markup:
+    """Completa las celdas [data-stock] vacías de un fragmento de filas cacheado (una pasada)."""
+    return Markup(_CELDA_STOCK.sub(lambda m: f"{m[1]}{stock.get(int(m[2]), '')}{m[3]}", str(filas)))
+
+def render_macro(env: jinja2.Environment, macro: str, *args) -> Markup:
+    """Renderiza un macro de web/_fragmentos.html, medido como plantilla propia."""
+    t0 = time.perf_counter()
+    try:
+        return Markup(getattr(env.get_template(FRAGMENTOS).module, macro)(*args))
+    finally:
+        medir_render(f"{FRAGMENTOS}#{macro}", time.perf_counter() - t0)
+
+def fragmento(env: jinja2.Environment, clave: tuple[Hashable, ...], macro: str, *args) -> Markup:
+    """Fragmento cacheado; `clave` debe incluir la versión de los datos que muestra."""
+    html = fragmentos.obtener((macro, *clave))
+    if html is None:
+        html = fragmentos.guardar((macro, *clave), render_macro(env, macro, *args))
+    return html
+
+def respuesta_streaming(templates: Jinja2Templates, request: Request, nombre: str, contexto: dict) -> StreamingResponse:
+    plantilla = templates.get_template(nombre)
+    contexto = {"request": request, **contexto}
+
+    async def cuerpo():
+        gen = plantilla.generate(contexto)
+        partes, largo = [], 0
+        try:
+            for trozo in gen:
+                partes.append(trozo)
+                largo += len(trozo)
+                if largo >= BLOQUE:
+                    yield "".join(partes).encode()
+                    partes, largo = [], 0
+            if partes:
+                yield "".join(partes).encode()
+        finally:
+            gen.close()  # cliente desconectado: cierra el render (y registra su tiempo)
+
+    return StreamingResponse(cuerpo(), media_type="text/html; charset=utf-8")
+
+def stats() -> dict:
+    return {
+        "bytecode": BYTECODE,
+        "bytecode_dir": BYTECODE_DIR,
+        "recarga": RECARGA,
+        "fragmentos": fragmentos.stats(),
+    }
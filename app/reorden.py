@@ -0,0 +1,135 @@
+# app/reorden.py
+"""
+Puntos de reorden y velocidad de venta por producto (GET /reportes/reorden).
+
+- productos.punto_reorden: con cantidad <= punto_reorden el producto entra en la
+  lista de reorden (NULL = sin seguimiento). productos.nivel_par: stock objetivo
+  tras reponer; si es NULL se usa punto_reorden + la venta esperada en
+  REORDEN_COBERTURA_DIAS días.
+- productos.velocidad_ema: unidades/día, media móvil exponencial en tiempo
+  continuo con constante REORDEN_EMA_DIAS (τ), válida a la fecha velocidad_en.
+  Cada venta la actualiza en el mismo UPDATE que descuenta el stock:
+  v ← v·e^(−Δt/τ) + n/τ. Al leerla se decae hasta ahora. Nunca se recorren las
+  ventas, salvo en reconstruir_velocidades() (rebuild de resúmenes).
+- Índice parcial ix_productos_bajo_reorden (WHERE punto_reorden IS NOT NULL): la
+  lista recorre solo los productos con seguimiento y filtra cantidad <= punto_reorden
+  al leerlos. cantidad no está en ningún índice, así que los UPDATE de stock de
+  cada venta siguen siendo HOT.
+"""
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Float, case, cast, extract, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+TAU_DIAS = float(os.getenv("REORDEN_EMA_DIAS", "7"))
+COBERTURA_DIAS = float(os.getenv("REORDEN_COBERTURA_DIAS", "7"))
+_TAU_S = TAU_DIAS * 86400
+_MAX_EXP = 50.0  # e^-50 ≈ 0; acota el exponente (exp() de Postgres falla por underflow)
+
+def valores_venta(unidades, fecha=None) -> dict:
+    """
+    SET de velocidad_ema/velocidad_en para el UPDATE de stock de una venta de
+    `unidades` (número o columna) en `fecha` (por defecto now()).
+    """
+    p = models.Producto
+    fecha = func.now() if fecha is None else fecha
+    previa = func.coalesce(p.velocidad_ema, 0.0)
+    ultima = func.coalesce(p.velocidad_en, fecha)
+    dt = extract("epoch", fecha - ultima) / _TAU_S
+    return {
+        "velocidad_ema": case(
+            (dt >= 0, previa * func.exp(-func.least(dt, _MAX_EXP)) + unidades / TAU_DIAS),
+            # Venta con fecha anterior a la última (buffer): se decae la venta, no la media
+            else_=previa + unidades / TAU_DIAS * func.exp(func.greatest(dt, -_MAX_EXP)),
+        ),
+        "velocidad_en": func.greatest(ultima, fecha),
+    }
+
+def unidades_ponderadas(lineas, fechas: Optional[list[datetime]] = None) -> dict[int, tuple[float, Optional[datetime]]]:
+    """
+    Por producto: unidades de un lote llevadas a la fecha de su venta más reciente
+    (n·e^(−Δt/τ)) y esa fecha, para aplicarlas con un solo valores_venta().
+    Sin `fechas` todas las ventas son de now() y la fecha es None.
+    """
+    if not fechas:
+        out: dict[int, tuple[float, Optional[datetime]]] = {}
+        for l in lineas:
+            out[l.id_producto] = (out.get(l.id_producto, (0.0, None))[0] + l.cantidad_vendida, None)
+        return out
+    ultima: dict[int, datetime] = {}
+    for l, f in zip(lineas, fechas):
+        ultima[l.id_producto] = max(ultima.get(l.id_producto, f), f)
+    pesos: dict[int, float] = {}
+    for l, f in zip(lineas, fechas):
+        pesos[l.id_producto] = pesos.get(l.id_producto, 0.0) + l.cantidad_vendida * math.exp(
+            -(ultima[l.id_producto] - f).total_seconds() / _TAU_S
+        )
+    return {pid: (w, ultima[pid]) for pid, w in pesos.items()}
+
+def velocidad_actual():
+    """velocidad_ema decaída hasta now() (unidades/día)."""
+    p = models.Producto
+    dt = extract("epoch", func.now() - p.velocidad_en) / _TAU_S
+    return func.coalesce(p.velocidad_ema * func.exp(-func.least(dt, _MAX_EXP)), 0.0)
+
+def bajo_umbral(*columnas):
+    """Productos activos bajo su punto de reorden (recorre ix_productos_bajo_reorden)."""
+    p = models.Producto
+    return select(*(columnas or (p,))).where(p.punto_reorden.is_not(None), p.cantidad <= p.punto_reorden, p.activo)
+
+async def lista_reorden(db: AsyncSession, limit: int = 100) -> list[dict]:
+    """
+    Pedido sugerido: productos bajo el punto de reorden. Primero los agotados
+    (cantidad <= 0, aunque no tengan ventas recientes), luego los que se agotan
+    antes (días de cobertura = cantidad / velocidad; sin ventas recientes al final).
+    """
+    p = models.Producto
+    velocidad = velocidad_actual().label("velocidad")
+    cobertura = (cast(p.cantidad, Float) / func.nullif(velocidad, 0.0)).label("dias_cobertura")
+    stmt = (
+        bajo_umbral(
+            p.id_producto, p.nombre, p.categoria, p.marca, p.cantidad,
+            p.punto_reorden, p.nivel_par, velocidad, cobertura,
+        )
+        .order_by((p.cantidad <= 0).desc(), cobertura.asc().nulls_last(), p.id_producto)
+        .limit(limit)
+    )
+    out = []
+    for r in (await db.execute(stmt)).all():
+        par = r.nivel_par if r.nivel_par is not None else r.punto_reorden + math.ceil(r.velocidad * COBERTURA_DIAS)
+        out.append({
+            "id_producto": r.id_producto,
+            "nombre": r.nombre,
+            "categoria": r.categoria,
+            "marca": r.marca,
+            "cantidad": r.cantidad,
+            "punto_reorden": r.punto_reorden,
+            "nivel_par": par,
+            "velocidad_dia": round(r.velocidad, 3),
+            "dias_cobertura": round(float(r.dias_cobertura), 1) if r.dias_cobertura is not None else None,
+            "sugerido": max(par - r.cantidad, 0),
+        })
+    return out
+
+async def reconstruir_velocidades(db: AsyncSession):
+    """
+    Recalcula velocidad_ema desde las ventas de los últimos 10·τ días (sin commit).
+    Solo para reparar o para la carga inicial; el camino normal es incremental.
+    """
+    p, v = models.Producto, models.Venta
+    edad = extract("epoch", func.now() - v.fecha_venta) / _TAU_S
+    suma = (
+        select(func.sum(v.cantidad_vendida * func.exp(-func.least(edad, _MAX_EXP))) / TAU_DIAS)
+        .where(v.id_producto == p.id_producto, v.fecha_venta >= func.now() - timedelta(days=10 * TAU_DIAS))
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(p)
+        .values(velocidad_ema=func.coalesce(suma, 0.0), velocidad_en=func.now())
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from .. import eventos
+
+router = APIRouter(tags=["Eventos"])
+
+def _sse(evento: dict) -> str:
+    return f"event: {evento.get('tipo', 'mensaje')}\ndata: {json.dumps(evento, separators=(',', ':'), default=str)}\n\n"
+
+@router.get("/eventos")
+async def stream_eventos():
+    """Server-Sent Events: `stock`, `venta` y `resync` (recargar: se perdieron eventos)."""
+    if not eventos.HABILITADO:
+        raise HTTPException(status_code=404, detail="Eventos deshabilitados")
+    try:
+        sub = eventos.bus.suscribir()
+    except eventos.DemasiadosSuscriptores:
+        raise HTTPException(status_code=503, detail="Demasiados suscriptores", headers={"Retry-After": "10"})
+
+    async def cuerpo():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(sub.cola.get(), timeout=eventos.KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # mantiene viva la conexión a través de proxies
+                    continue
+                if evento is None:
+                    return
+                yield _sse(evento)
+        finally:
+            eventos.bus.desuscribir(sub)
+
+    return StreamingResponse(
+        cuerpo(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,8 +1,10 @@
 # app/routes/health.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from ..database import get_db
+from ..database import get_db, estadisticas_pool, read_engine, REPLICA
+from .. import catalogo, cache_reportes, metricas, buffer_ventas, eventos, plantillas
 
 router = APIRouter(tags=["health"])
 
@@ -23,3 +25,55 @@ async def db_check(db: AsyncSession = Depends(get_db)):
     res = await db.execute(q)
     row = res.mappings().first()
     return dict(row)
+
+@router.get("/health/pool")
+async def pool_stats():
+    stats = estadisticas_pool()
+    if REPLICA:
+        stats["replica"] = estadisticas_pool(read_engine)
+    return stats
+
+@router.get("/health/catalogo")
+async def catalogo_stats():
+    return catalogo.cache.stats()
+
+@router.get("/health/cache")
+async def cache_stats():
+    return cache_reportes.cache.stats()
+
+@router.get("/health/buffer-ventas")
+async def buffer_ventas_stats():
+    return await buffer_ventas.buffer.stats()
+
+@router.get("/health/eventos")
+async def eventos_stats():
+    return eventos.bus.stats()
+
+@router.get("/health/plantillas")
+async def plantillas_stats():
+    return {**plantillas.stats(), "render": metricas.stats_plantillas()}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    pool = estadisticas_pool()
+    extra = {
+        "db_pool_size": pool["size"],
+        "db_pool_checked_out": pool["checked_out"],
+        "db_pool_overflow": pool["overflow"],
+        "db_pool_checkout_timeouts": pool["timeouts"],
+        "db_pool_wait_mean_ms": pool["espera_media_ms"],
+        "reportes_cache_hit_ratio": cache_reportes.cache.stats()["hit_ratio"],
+        "eventos_suscriptores": eventos.bus.stats()["suscriptores"],
+        "eventos_descartes_por_lentitud_total": eventos.bus.descartes,
+        "plantillas_fragmentos_hit_ratio": plantillas.fragmentos.stats()["hit_ratio"],
+    }
+    if buffer_ventas.buffer.activo:
+        buf = await buffer_ventas.buffer.stats()
+        extra["ventas_buffer_pendientes"] = buf["pendientes"]
+        extra["ventas_buffer_conflictos"] = buf["conflictos"]
+    return PlainTextResponse(metricas.texto_prometheus(extra), media_type="text/plain; version=0.0.4")
+
+@router.post("/health/perfilado")
+async def perfilado(rutas: list[str] = Query(default=[])):
+    """Rutas a perfilar con pyinstrument (patrones fnmatch); sin rutas se apaga."""
+    return {"rutas": metricas.activar_perfilado(rutas), "disponible": metricas.Profiler is not None}
@@ -0,0 +1,14 @@
+# app/routes/jobs.py
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_db
+from .. import schemas, jobs
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+@router.get("/{id_job}", response_model=schemas.JobOut)
+async def estado_job(id_job: int, db: AsyncSession = Depends(get_db)):
+    job = await jobs.get_job(db, id_job)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
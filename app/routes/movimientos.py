@@ -1,17 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..database import get_db
-from .. import crud, schemas
+from ..database import get_db, AsyncSessionLocal
+from .. import crud, models, schemas, paginacion, exportacion, idempotencia
 
 router = APIRouter(prefix="/movimientos", tags=["Movimientos"])
 
-@router.post("/", response_model=schemas.MovimientoOut, status_code=201)
-async def crear_movimiento(payload: schemas.MovimientoCreate, db: AsyncSession = Depends(get_db)):
+@router.post(
+    "/",
+    response_model=schemas.MovimientoOut,
+    status_code=201,
+    responses={
+        409: {"description": "Otra petición con la misma Idempotency-Key sigue en curso"},
+        422: {"description": "Idempotency-Key ya usada con otro cuerpo"},
+    },
+)
+async def crear_movimiento(
+    payload: schemas.MovimientoCreate,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str | None = Header(default=None, max_length=idempotencia.MAX_LARGO),
+):
     try:
-        return await crud.create_movimiento(db, payload)
+        return await idempotencia.ejecutar(
+            db, "movimientos", idempotency_key, payload, lambda al_confirmar: crud.create_movimiento(db, payload, al_confirmar),
+            schemas.MovimientoOut,
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/lote", response_model=schemas.MovimientoLoteOut, status_code=201)
+async def crear_movimientos_lote(payload: schemas.MovimientoLoteCreate, db: AsyncSession = Depends(get_db)):
+    try:
+        movimientos, afectados = await crud.create_movimientos_lote(db, payload)
+    except crud.MovimientoLoteError as e:
+        raise HTTPException(status_code=400, detail=e.errores)
+    return {"movimientos": movimientos, "productos_afectados": afectados}
+
 @router.get("/", response_model=list[schemas.MovimientoOut])
-async def listar_movimientos(producto_id: int | None = Query(default=None), db: AsyncSession = Depends(get_db)):
-    return await crud.list_movimientos(db, producto_id)
\ No newline at end of file
+async def listar_movimientos(
+    response: Response,
+    producto_id: int | None = Query(default=None),
+    after_id: int | None = Query(default=None, ge=1),
+    cursor: str | None = Query(default=None),
+    limit: int = Query(default=paginacion.LIMITE_POR_DEFECTO, ge=1, le=paginacion.LIMITE_MAXIMO),
+    db: AsyncSession = Depends(get_db),
+):
+    movimientos = await crud.list_movimientos(
+        db, producto_id, after_id=paginacion.resolver_after_id(cursor, after_id), limit=limit + 1
+    )
+    return paginacion.pagina(movimientos, limit, "id_movimiento", response)
+
+@router.get("/export")
+async def exportar_movimientos(
+    formato: exportacion.Formato = Query(default="ndjson"),
+    producto_id: int | None = Query(default=None),
+):
+    async def filas():
+        async with AsyncSessionLocal() as db:
+            async for fila in crud.stream_movimientos(db, producto_id):
+                yield fila
+
+    columnas = [c.name for c in models.InventarioMovimiento.__table__.c]
+    return exportacion.respuesta(filas(), formato, columnas, "movimientos")
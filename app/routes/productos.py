@@ -1,10 +1,11 @@
 # app/routes/productos.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from ..database import get_db
-from .. import models, schemas
-from ..supabase_client import upload_image_to_supabase
+from .. import models, schemas, catalogo, jobs, crud, importacion
+from ..services import imagenes
+from ..services.supabase_storage import ArchivoDemasiadoGrande, StorageError
 
 router = APIRouter(prefix="/productos", tags=["Productos"])
 
@@ -15,11 +16,7 @@ async def listar_productos(db: AsyncSession = Depends(get_db)):
 
 @router.post("/", response_model=schemas.ProductoOut, status_code=201)
 async def crear_producto(payload: schemas.ProductoCreate, db: AsyncSession = Depends(get_db)):
-    obj = models.Producto(**payload.dict())
-    db.add(obj)
-    await db.commit()
-    await db.refresh(obj)
-    return obj
+    return await crud.create_producto(db, payload)
 
 @router.post("/con-imagen", response_model=schemas.ProductoOut, status_code=201)
 async def crear_producto_con_imagen(
@@ -31,27 +28,45 @@ async def crear_producto_con_imagen(
     imagen: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
 ):
-    url = await upload_image_to_supabase(imagen, folder="productos")
-    obj = models.Producto(
+    try:
+        url, original = await imagenes.subir_imagen(imagen, folder="productos")
+    except ArchivoDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except StorageError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    obj = await crud.create_producto(db, schemas.ProductoCreate(
         nombre=nombre, categoria=categoria, marca=marca,
         cantidad=cantidad, precio_venta=precio_venta,
         imagen_url=url
-    )
-    db.add(obj)
-    await db.commit()
-    await db.refresh(obj)
+    ))
+    # WebP + miniatura en segundo plano; imagen_url queda vacía hasta que el job las publica
+    if original:
+        await jobs.encolar_imagen(db, "productos", obj.id_producto, original)
     return obj
 
+@router.post("/import", response_model=schemas.ImportResumen)
+async def importar_productos(
+    archivo: UploadFile = File(...),
+    formato: importacion.Formato | None = Query(default=None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    CSV (con cabecera) o NDJSON con columnas de ProductoCreate. Filas con id_producto
+    actualizan ese producto (campos vacíos no se tocan); sin id se crean.
+    """
+    formato = formato or importacion.detectar_formato(archivo.filename, archivo.content_type)
+    errores: list[dict] = []
+    await archivo.seek(0)
+    bloques = importacion.bloques_validados(archivo.file, formato, errores)
+    resumen = await crud.importar_productos(db, bloques, errores)
+    errores.sort(key=lambda e: e["fila"])
+    return {**resumen, "total_errores": len(errores), "errores": errores[:importacion.MAX_ERRORES]}
+
 @router.put("/{id_producto}", response_model=schemas.ProductoOut)
 async def actualizar_producto(id_producto: int, payload: schemas.ProductoUpdate, db: AsyncSession = Depends(get_db)):
-    res = await db.execute(select(models.Producto).where(models.Producto.id_producto == id_producto))
-    obj = res.scalar_one_or_none()
+    obj = await crud.update_producto(db, id_producto, payload)
     if not obj:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    for k, v in payload.dict(exclude_unset=True).items():
-        setattr(obj, k, v)
-    await db.commit()
-    await db.refresh(obj)
     return obj
 
 @router.delete("/{id_producto}", status_code=204)
@@ -61,5 +76,5 @@ async def eliminar_producto(id_producto: int, db: AsyncSession = Depends(get_db)
     if not obj:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     await db.delete(obj)
-    await db.commit()
+    await catalogo.commit_escritura(db, "productos")
     return None
@@ -1,28 +1,71 @@
-from fastapi import APIRouter, Depends, Query
+import json
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from ..database import get_db
-from .. import crud
+from ..database import get_db, get_read_db, AsyncSessionLocal
+from .. import crud, schemas, jobs, cache_reportes, reorden
 
 router = APIRouter(prefix="/reportes", tags=["Reportes"])
 
-@router.post("/rebuild", status_code=204)
-async def rebuild(db: AsyncSession = Depends(get_db)):
-    await crud.rebuild_resumenes_ventas(db)
-    return
+@router.post("/rebuild", status_code=202, response_model=schemas.JobOut)
+async def rebuild(response: Response, db: AsyncSession = Depends(get_db)):
+    job = await jobs.encolar(db, "rebuild_resumenes", clave="rebuild_resumenes")
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
 
-@router.get("/mas-vendidos")
-async def mas_vendidos(limit: int = 10, db: AsyncSession = Depends(get_db)):
-    return await crud.list_productos_mas_vendidos(db, limit)
+@router.get("/mas-vendidos", response_model=list[schemas.ProductoVendido])
+async def mas_vendidos(
+    request: Request,
+    limit: int = 10,
+    desde: datetime | None = Query(default=None),
+    hasta: datetime | None = Query(default=None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await cache_reportes.cache.responder(
+        request, lambda: crud.list_productos_mas_vendidos(db, limit, desde, hasta)
+    )
 
-@router.get("/menos-vendidos")
-async def menos_vendidos(limit: int = 10, db: AsyncSession = Depends(get_db)):
-    return await crud.list_productos_menos_vendidos(db, limit)
+@router.get("/menos-vendidos", response_model=list[schemas.ProductoVendido])
+async def menos_vendidos(
+    request: Request,
+    limit: int = 10,
+    desde: datetime | None = Query(default=None),
+    hasta: datetime | None = Query(default=None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await cache_reportes.cache.responder(
+        request, lambda: crud.list_productos_menos_vendidos(db, limit, desde, hasta)
+    )
 
 @router.get("/resumen")
-async def resumen(desde: datetime | None = Query(default=None), hasta: datetime | None = Query(default=None), db: AsyncSession = Depends(get_db)):
-    return await crud.resumen_ventas_periodo(db, desde, hasta)
+async def resumen(request: Request, desde: datetime | None = Query(default=None), hasta: datetime | None = Query(default=None), db: AsyncSession = Depends(get_read_db)):
+    return await cache_reportes.cache.responder(request, lambda: crud.resumen_ventas_periodo(db, desde, hasta))
+
+@router.get("/reorden", response_model=list[schemas.ReordenItem])
+async def lista_reorden(
+    request: Request,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Productos bajo su punto de reorden con la cantidad sugerida a pedir."""
+    return await cache_reportes.cache.responder(request, lambda: reorden.lista_reorden(db, limit))
 
 @router.get("/reconciliacion")
-async def reconciliacion(db: AsyncSession = Depends(get_db)):
-    return await crud.reconciliacion_stock(db)
\ No newline at end of file
+async def reconciliacion(stream: bool = Query(default=False), db: AsyncSession = Depends(get_db)):
+    if not stream:
+        return await crud.reconciliacion_stock(db)
+
+    # La sesión de get_db se cierra antes de enviar el cuerpo: el stream abre la suya
+    async def ndjson():
+        async with AsyncSessionLocal() as sdb:
+            async for fila in crud.stream_reconciliacion_stock(sdb):
+                yield json.dumps(fila) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.post("/reconciliacion", status_code=202, response_model=schemas.JobOut)
+async def reconciliacion_diferida(response: Response, db: AsyncSession = Depends(get_db)):
+    job = await jobs.encolar(db, "reconciliacion_stock", clave="reconciliacion_stock")
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
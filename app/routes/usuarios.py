@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from ..database import get_db
-from .. import models, schemas
+from .. import models, schemas, catalogo, crud
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 
@@ -14,11 +14,10 @@ async def listar_usuarios(db: AsyncSession = Depends(get_db)):
 
 @router.post("/", response_model=schemas.UsuarioOut, status_code=201)
 async def crear_usuario(payload: schemas.UsuarioCreate, db: AsyncSession = Depends(get_db)):
-    obj = models.Usuario(**payload.dict())
-    db.add(obj)
-    await db.commit()
-    await db.refresh(obj)
-    return obj
+    try:
+        return await crud.create_usuario(db, payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.put("/{id_usuario}", response_model=schemas.UsuarioOut)
 async def actualizar_usuario(id_usuario: int, payload: schemas.UsuarioUpdate, db: AsyncSession = Depends(get_db)):
@@ -30,7 +29,7 @@ async def actualizar_usuario(id_usuario: int, payload: schemas.UsuarioUpdate, db
     for k, v in payload.dict(exclude_unset=True).items():
         setattr(obj, k, v)
 
-    await db.commit()
+    await catalogo.commit_escritura(db, "usuarios")
     await db.refresh(obj)
     return obj
 
@@ -41,5 +40,5 @@ async def eliminar_usuario(id_usuario: int, db: AsyncSession = Depends(get_db)):
     if not obj:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     await db.delete(obj)
-    await db.commit()
+    await catalogo.commit_escritura(db, "usuarios")
     return None
@@ -1,27 +1,95 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from ..database import get_db
-from .. import crud, schemas
+from ..database import get_db, AsyncSessionLocal
+from .. import crud, models, schemas, paginacion, exportacion, buffer_ventas, idempotencia
 
 router = APIRouter(prefix="/ventas", tags=["Ventas"])
 
-@router.post("/", response_model=schemas.VentaOut, status_code=201)
-async def crear_venta(payload: schemas.VentaCreate, db: AsyncSession = Depends(get_db)):
+@router.post(
+    "/",
+    response_model=schemas.VentaOut,
+    status_code=201,
+    responses={
+        202: {"model": schemas.VentaBufferOut, "description": "Aceptada por el buffer local (VENTAS_BUFFER=1)"},
+        409: {"description": "Otra petición con la misma Idempotency-Key sigue en curso"},
+        422: {"description": "Idempotency-Key ya usada con otro cuerpo"},
+    },
+)
+async def crear_venta(
+    payload: schemas.VentaCreate,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str | None = Header(default=None, max_length=idempotencia.MAX_LARGO),
+):
     try:
-        return await crud.create_venta(db, payload)
+        if buffer_ventas.buffer.activo:
+            try:
+                venta = await buffer_ventas.buffer.registrar(payload, idempotency_key)
+            except buffer_ventas.BufferNoListo:
+                pass
+            else:
+                return JSONResponse(status_code=202, content=schemas.VentaBufferOut(**venta).model_dump(mode="json"))
+        return await idempotencia.ejecutar(
+            db, "ventas", idempotency_key, payload, lambda al_confirmar: crud.create_venta(db, payload, al_confirmar), schemas.VentaOut
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/lote", response_model=schemas.VentaLoteOut, status_code=201)
+async def crear_ventas_lote(payload: schemas.VentaLoteCreate, db: AsyncSession = Depends(get_db)):
+    try:
+        ventas = await crud.create_ventas_lote(db, payload)
+    except crud.VentaLoteError as e:
+        raise HTTPException(status_code=400, detail=e.errores)
+    return {"ventas": ventas, "total": round(sum(float(v.total_venta) for v in ventas), 2)}
+
 @router.get("/", response_model=list[schemas.VentaOut])
 async def listar_ventas(
+    response: Response,
     desde: datetime | None = Query(default=None),
     hasta: datetime | None = Query(default=None),
     producto_id: int | None = Query(default=None),
     usuario_id: int | None = Query(default=None),
+    after_id: int | None = Query(default=None, ge=1),
+    cursor: str | None = Query(default=None),
+    limit: int = Query(default=paginacion.LIMITE_POR_DEFECTO, ge=1, le=paginacion.LIMITE_MAXIMO),
     db: AsyncSession = Depends(get_db),
 ):
-    return await crud.list_ventas(db, desde, hasta, producto_id, usuario_id)
+    ventas = await crud.list_ventas(
+        db, desde, hasta, producto_id, usuario_id,
+        after_id=paginacion.resolver_after_id(cursor, after_id),
+        limit=limit + 1,
+    )
+    return paginacion.pagina(ventas, limit, "id_venta", response)
+
+@router.get("/export")
+async def exportar_ventas(
+    formato: exportacion.Formato = Query(default="ndjson"),
+    desde: datetime | None = Query(default=None),
+    hasta: datetime | None = Query(default=None),
+    producto_id: int | None = Query(default=None),
+    usuario_id: int | None = Query(default=None),
+):
+    # La sesión vive dentro del stream (get_db se cerraría antes de enviar el cuerpo)
+    async def filas():
+        async with AsyncSessionLocal() as db:
+            async for fila in crud.stream_ventas(db, desde, hasta, producto_id, usuario_id):
+                yield fila
+
+    columnas = [c.name for c in models.Venta.__table__.c]
+    return exportacion.respuesta(filas(), formato, columnas, "ventas")
+
+@router.get("/buffer/conflictos", response_model=list[schemas.VentaBufferOut])
+async def listar_conflictos_buffer(limit: int = Query(default=100, ge=1, le=1000)):
+    return await buffer_ventas.buffer.conflictos(limit)
+
+@router.get("/buffer/{clave}", response_model=schemas.VentaBufferOut)
+async def obtener_venta_buffer(clave: str):
+    venta = await buffer_ventas.buffer.obtener(clave)
+    if not venta:
+        raise HTTPException(status_code=404, detail="Venta no encontrada en el buffer")
+    return venta
 
 @router.get("/{venta_id}", response_model=schemas.VentaOut)
 async def obtener_venta(venta_id: int, db: AsyncSession = Depends(get_db)):
@@ -1,24 +1,27 @@
 # app/routes/web.py
 import logging
+import uuid
 from typing import Optional
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, File, Form, Request, UploadFile, status
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Request, UploadFile, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi.templating import Jinja2Templates
 
-from ..database import get_db
-from .. import crud, schemas
-from ..services.supabase_storage import upload_image_get_public_url
+from ..database import get_db, get_read_db
+from .. import crud, schemas, paginacion, catalogo, jobs, cache_reportes, buffer_ventas, idempotencia, plantillas, eventos
+from ..services import imagenes
+from ..services.supabase_storage import ArchivoDemasiadoGrande, StorageError
+from ..services.pagina_ventas import datos_pagina_ventas
 
 logger = logging.getLogger("inventariobar")
 
 router = APIRouter(tags=["web"])
 TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+templates = plantillas.crear_templates(TEMPLATES_DIR)
 templates.env.globals["now"] = lambda: datetime.now(timezone.utc)
+templates.env.globals["eventos"] = eventos.HABILITADO
 
 # ---------- helpers ----------
 def _parse_date(s: Optional[str]) -> Optional[datetime]:
@@ -82,6 +85,18 @@ def _normalize_resumen(res: Optional[dict]) -> dict:
     payload["unidades"] = payload["unidades_vendidas"]  # alias
     return payload
 
+async def _subir_imagen(file: UploadFile | None, folder: str) -> tuple[Optional[str], Optional[str]]:
+    """(url, original) de imagenes.subir_imagen; un fallo de Storage no impide el alta (sin imagen)."""
+    if file is None or not file.filename:
+        return None, None
+    try:
+        return await imagenes.subir_imagen(file, folder)
+    except ArchivoDemasiadoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except StorageError as e:
+        logger.warning("Subida de imagen omitida: %s", e)
+        return None, None
+
 # ---------- HOME ----------
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -93,15 +108,25 @@ async def pagina_productos(
     request: Request,
     db: AsyncSession = Depends(get_db),
     q: Optional[str] = None,
-    page: int = 1,
+    cursor: Optional[str] = None,
 ):
-    page = max(page, 1)
     limit = 50
-    offset = (page - 1) * limit
-    productos = await crud.search_productos(db, q=q, limit=limit, offset=offset)
+    productos, siguiente = await crud.search_productos(
+        db, q=q, limit=limit, despues_de=paginacion.decode_cursor_busqueda(cursor)
+    )
+    # El stock cambia sin subir la versión del catálogo: queda fuera del fragmento
+    version = await catalogo.cache.version(db, "productos")
+    filas = plantillas.fragmento(templates.env, (version, q, cursor), "filas_productos", productos)
+    filas = plantillas.con_stock(filas, {p.id_producto: p.cantidad for p in productos})
     return templates.TemplateResponse(
         "web/productos.html",
-        {"request": request, "productos": productos, "q": q or "", "page": page},
+        {
+            "request": request,
+            "productos": productos,
+            "filas_productos": filas,
+            "q": q or "",
+            "siguiente": paginacion.encode_cursor_busqueda(siguiente) if siguiente else None,
+        },
     )
 
 @router.post("/web/productos")
@@ -115,9 +140,7 @@ async def crear_producto_html(
     precio_venta: float = Form(...),
     imagen: UploadFile | None = File(default=None),
 ):
-    imagen_url: str | None = None
-    if imagen and imagen.filename:
-        imagen_url = await upload_image_get_public_url(imagen, folder="productos")
+    imagen_url, original = await _subir_imagen(imagen, "productos")
 
     data = schemas.ProductoCreate(
         nombre=nombre,
@@ -127,7 +150,9 @@ async def crear_producto_html(
         precio_venta=precio_venta,
         imagen_url=imagen_url,
     )
-    await crud.create_producto(db, data)
+    obj = await crud.create_producto(db, data)
+    if original:
+        await jobs.encolar_imagen(db, "productos", obj.id_producto, original)
     logger.info("Producto creado: %s", nombre)
     return RedirectResponse(url="/web/productos", status_code=status.HTTP_302_FOUND)
 
@@ -139,10 +164,15 @@ async def eliminar_producto_html(id_producto: int, db: AsyncSession = Depends(ge
 # ---------- USUARIOS ----------
 @router.get("/web/usuarios", response_class=HTMLResponse)
 async def pagina_usuarios(request: Request, db: AsyncSession = Depends(get_db)):
-    usuarios = await crud.list_usuarios(db)
+    # Con la tabla ya renderizada para la versión vigente no se consulta la lista
+    clave = ("filas_usuarios", await catalogo.cache.version(db, "usuarios"))
+    filas = plantillas.fragmentos.obtener(clave)
+    if filas is None:
+        usuarios = await crud.list_usuarios(db)
+        filas = plantillas.fragmentos.guardar(clave, plantillas.render_macro(templates.env, "filas_usuarios", usuarios))
     return templates.TemplateResponse(
         "web/usuarios.html",
-        {"request": request, "usuarios": usuarios},
+        {"request": request, "filas_usuarios": filas},
     )
 
 @router.post("/web/usuarios")
@@ -154,9 +184,7 @@ async def crear_usuario_html(
     rol: str = Form(...),
     foto: UploadFile | None = File(default=None),
 ):
-    foto_url: str | None = None
-    if foto and foto.filename:
-        foto_url = await upload_image_get_public_url(foto, folder="usuarios")
+    foto_url, original = await _subir_imagen(foto, "usuarios")
 
     data = schemas.UsuarioCreate(
         nombre_usuario=nombre_usuario,
@@ -164,7 +192,9 @@ async def crear_usuario_html(
         rol=rol,
         foto_url=foto_url,
     )
-    await crud.create_usuario(db, data)
+    obj = await crud.create_usuario(db, data)
+    if original:
+        await jobs.encolar_imagen(db, "usuarios", obj.id_usuario, original)
     logger.info("Usuario creado: %s", nombre_usuario)
     return RedirectResponse(url="/web/usuarios", status_code=status.HTTP_302_FOUND)
 
@@ -182,6 +212,7 @@ async def pagina_ventas(
     hasta: Optional[str] = None,
     producto_id: Optional[str] = None,  # tolera vacío
     usuario_id: Optional[str] = None,   # tolera vacío
+    after_id: Optional[str] = None,
     msg: Optional[str] = None,
 ):
     dt_desde = _parse_date(desde)
@@ -192,38 +223,37 @@ async def pagina_ventas(
     prod_id = _parse_int(producto_id)
     user_id = _parse_int(usuario_id)
 
-    productos = await crud.list_productos(db)
-    usuarios = await crud.list_usuarios(db)
-
-    ventas = await crud.list_ventas(
+    datos = await datos_pagina_ventas(
         db,
         desde=dt_desde,
         hasta=dt_hasta,
         producto_id=prod_id,
         usuario_id=user_id,
+        after_id=_parse_int(after_id),
     )
+    resumen = _normalize_resumen(datos["resumen"])
 
-    map_prod = {p.id_producto: p for p in productos}
-    map_user = {u.id_usuario: u for u in usuarios}
-
-    resumen_raw = await crud.resumen_ventas_periodo(db, dt_desde, dt_hasta)
-    resumen = _normalize_resumen(resumen_raw)
-
-    return templates.TemplateResponse(
+    # La tabla puede ser larga: render en streaming para que el primer byte salga antes
+    return plantillas.respuesta_streaming(
+        templates,
+        request,
         "web/ventas.html",
         {
-            "request": request,
-            "productos": productos,
-            "usuarios": usuarios,
-            "ventas": ventas,
-            "map_prod": map_prod,
-            "map_user": map_user,
+            "opciones_productos": plantillas.fragmento(
+                templates.env, (datos["version_productos"],), "opciones_productos", datos["productos"]
+            ),
+            "opciones_usuarios": plantillas.fragmento(
+                templates.env, (datos["version_usuarios"],), "opciones_usuarios", datos["usuarios"]
+            ),
+            "ventas": datos["ventas"],
+            "siguiente": datos["siguiente"],
             "desde": desde or "",
             "hasta": hasta or "",
             "producto_id": prod_id,
             "usuario_id": user_id,
             "msg": msg,
             "resumen": resumen,
+            "idempotency_key": uuid.uuid4().hex,
         },
     )
 
@@ -234,34 +264,47 @@ async def crear_venta_html(
     id_usuario: int = Form(...),
     id_producto: int = Form(...),
     cantidad_vendida: int = Form(...),
+    idempotency_key: Optional[str] = Form(default=None, max_length=idempotencia.MAX_LARGO),
+    idempotency_key_header: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=idempotencia.MAX_LARGO),
 ):
+    # El formulario trae una clave por render: doble clic o reenvío del POST no duplican la venta
+    clave = idempotency_key or idempotency_key_header
     try:
-        await crud.create_venta(
-            db,
-            schemas.VentaCreate(
-                id_usuario=id_usuario,
-                id_producto=id_producto,
-                cantidad_vendida=cantidad_vendida,
-            ),
+        venta = schemas.VentaCreate(
+            id_usuario=id_usuario,
+            id_producto=id_producto,
+            cantidad_vendida=cantidad_vendida,
         )
-        url = "/web/ventas?msg=Venta%20registrada"
+        try:
+            await buffer_ventas.buffer.registrar(venta, clave)
+            url = "/web/ventas?msg=Venta%20registrada%20(pendiente%20de%20sincronizar)"
+        except buffer_ventas.BufferNoListo:
+            await idempotencia.ejecutar(
+                db, "ventas", clave, venta, lambda al_confirmar: crud.create_venta(db, venta, al_confirmar), schemas.VentaOut
+            )
+            url = "/web/ventas?msg=Venta%20registrada"
     except ValueError as e:
         url = f"/web/ventas?msg={str(e).replace(' ', '%20')}"
+    except HTTPException as e:
+        url = f"/web/ventas?msg={str(e.detail).replace(' ', '%20')}"
     return RedirectResponse(url=url, status_code=status.HTTP_302_FOUND)
 
 # ---------- DASHBOARD ----------
 @router.get("/web/dashboard", response_class=HTMLResponse)
-async def pagina_dashboard(request: Request, db: AsyncSession = Depends(get_db)):
-    top = await crud.list_productos_mas_vendidos(db, limit=10)
-    bottom = await crud.list_productos_menos_vendidos(db, limit=10)
-    resumen_raw = await crud.resumen_ventas_periodo(db)
-    resumen = _normalize_resumen(resumen_raw)
-    return templates.TemplateResponse(
-        "web/dashboard.html",
-        {"request": request, "top": top, "bottom": bottom, "resumen": resumen},
-    )
+async def pagina_dashboard(request: Request, db: AsyncSession = Depends(get_read_db)):
+    async def render() -> bytes:
+        top = await crud.list_productos_mas_vendidos(db, limit=10)
+        bottom = await crud.list_productos_menos_vendidos(db, limit=10)
+        resumen_raw = await crud.resumen_ventas_periodo(db)
+        resumen = _normalize_resumen(resumen_raw)
+        return templates.TemplateResponse(
+            "web/dashboard.html",
+            {"request": request, "top": top, "bottom": bottom, "resumen": resumen},
+        ).body
+
+    return await cache_reportes.cache.responder(request, render, media_type="text/html; charset=utf-8")
 
 @router.post("/web/dashboard/rebuild")
 async def rebuild_dashboard(db: AsyncSession = Depends(get_db)):
-    await crud.rebuild_resumenes_ventas(db)
+    await jobs.encolar(db, "rebuild_resumenes", clave="rebuild_resumenes")
     return RedirectResponse(url="/web/dashboard", status_code=status.HTTP_302_FOUND)
@@ -1,7 +1,7 @@
 # app/schemas.py
 from pydantic import BaseModel, Field, EmailStr
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Any, Literal, Optional
 
 
 # ====== USUARIOS ======
@@ -10,54 +10,95 @@ class UsuarioBase(BaseModel):
     correo: EmailStr
     rol: str
     foto_url: Optional[str] = None
+    foto_thumb_url: Optional[str] = None
 
 class UsuarioCreate(UsuarioBase):
-    id_usuario: int
-    id_producto: int
-    cantidad_vendida: int = Field(gt=0)
+    pass
 
 class UsuarioUpdate(BaseModel):
     nombre_usuario: Optional[str] = None
     correo: Optional[EmailStr] = None
     rol: Optional[str] = None
     foto_url: Optional[str] = None
+    foto_thumb_url: Optional[str] = None
 
 class UsuarioOut(UsuarioBase):
     id_usuario: int
+    correo: str  # sin validar al leer: filas cargadas por COPY (bench/seed.py) no pasan por EmailStr
     class Config:
         from_attributes = True
 
 
 # ====== PRODUCTOS ======
+INT4_MAX = 2**31 - 1  # columnas Integer de Postgres
+
 class ProductoBase(BaseModel):
     nombre: str
     categoria: str
     marca: str
-    cantidad: int = Field(ge=0)
+    cantidad: int = Field(ge=0, le=INT4_MAX)
     precio_venta: float = Field(ge=0)
     imagen_url: Optional[str] = None
+    imagen_thumb_url: Optional[str] = None
+    punto_reorden: Optional[int] = Field(default=None, ge=0, le=INT4_MAX)
+    nivel_par: Optional[int] = Field(default=None, ge=0, le=INT4_MAX)
 
 class ProductoCreate(ProductoBase):
     nombre: str = Field(min_length=2, max_length=80)
     categoria: str = Field(min_length=2, max_length=40)
     marca: str = Field(min_length=1, max_length=40)
-    cantidad: int = Field(ge=0)
+    cantidad: int = Field(ge=0, le=INT4_MAX)
     precio_venta: float = Field(gt=0)
     imagen_url: str | None = None
+    imagen_thumb_url: str | None = None
 
 class ProductoUpdate(BaseModel):
-    nombre: Optional[str] = None
-    categoria: Optional[str] = None
-    marca: Optional[str] = None
-    cantidad: Optional[int] = Field(default=None, ge=0)
+    # Mismos límites que ProductoCreate: lo que no cabe en la columna es un 422, no un 500
+    nombre: Optional[str] = Field(default=None, min_length=2, max_length=80)
+    categoria: Optional[str] = Field(default=None, min_length=2, max_length=40)
+    marca: Optional[str] = Field(default=None, min_length=1, max_length=40)
+    cantidad: Optional[int] = Field(default=None, ge=0, le=INT4_MAX)
     precio_venta: Optional[float] = Field(default=None, ge=0)
     imagen_url: Optional[str] = None
+    imagen_thumb_url: Optional[str] = None
+    punto_reorden: Optional[int] = Field(default=None, ge=0, le=INT4_MAX)
+    nivel_par: Optional[int] = Field(default=None, ge=0, le=INT4_MAX)
 
 class ProductoOut(ProductoBase):
     id_producto: int
     class Config:
         from_attributes = True
 
+class ReordenItem(BaseModel):
+    id_producto: int
+    nombre: str
+    categoria: Optional[str] = None
+    marca: Optional[str] = None
+    cantidad: int
+    punto_reorden: int
+    nivel_par: int
+    velocidad_dia: float
+    dias_cobertura: Optional[float] = None
+    sugerido: int
+
+class ProductoVendido(BaseModel):
+    id_producto: int
+    nombre: str
+    total_vendido: int
+    monto_total: float
+
+class ImportErrorFila(BaseModel):
+    fila: int
+    error: str
+
+class ImportResumen(BaseModel):
+    filas: int
+    insertados: int
+    actualizados: int
+    movimientos: int
+    total_errores: int
+    errores: list[ImportErrorFila]
+
 
 # ====== VENTAS ======
 class VentaCreate(BaseModel):
@@ -74,6 +115,24 @@ class VentaOut(BaseModel):
     class Config:
         from_attributes = True
 
+class VentaLoteCreate(BaseModel):
+    lineas: list[VentaCreate] = Field(min_length=1, max_length=200)
+
+class VentaLoteOut(BaseModel):
+    ventas: list[VentaOut]
+    total: float
+
+class VentaBufferOut(BaseModel):
+    """Venta aceptada por el buffer local (app/buffer_ventas.py), pendiente o ya sincronizada."""
+    clave: str
+    estado: Literal["pendiente", "aplicada", "conflicto"]
+    id_usuario: int
+    id_producto: int
+    cantidad_vendida: int
+    fecha: datetime
+    id_venta: Optional[int] = None
+    error: Optional[str] = None
+
 
 # ====== MOVIMIENTOS ======
 class MovimientoBase(BaseModel):
@@ -87,7 +146,32 @@ class MovimientoCreate(MovimientoBase):
 
 class MovimientoOut(MovimientoBase):
     id_movimiento: int
-    fecha_movimiento: datetime
+    fecha_movimiento: datetime = Field(validation_alias="fecha")
+
+    class Config:
+        from_attributes = True
+
+class MovimientoLoteCreate(BaseModel):
+    movimientos: list[MovimientoCreate] = Field(min_length=1, max_length=1000)
+
+class MovimientoLoteOut(BaseModel):
+    movimientos: list[MovimientoOut]
+    productos_afectados: int
+
+
+# ====== JOBS ======
+class JobOut(BaseModel):
+    id: int
+    tipo: str
+    estado: Literal["pendiente", "en_curso", "hecho", "fallido"]
+    intentos: int
+    max_intentos: int
+    creado_en: datetime
+    ejecutar_despues: datetime
+    iniciado_en: Optional[datetime] = None
+    terminado_en: Optional[datetime] = None
+    error: Optional[str] = None
+    resultado: Optional[Any] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,163 @@
+# app/services/imagenes.py
+"""
+Post-procesado de imágenes subidas a Storage.
+
+La petición sube el original al bucket privado de originales (subir_imagen(),
+con tope IMG_MAX_BYTES) y encola un job "procesar_imagen" (ver app/jobs.py). El
+job descarga el original, lo decodifica una sola vez, corrige la orientación
+EXIF, descarta los metadatos y genera variantes WebP (principal y miniatura) en
+un pool de procesos para no bloquear el event loop. Después publica las
+variantes, actualiza las URLs de la fila y borra el original: nunca queda
+público un archivo con sus metadatos (p.ej. GPS). Mientras tanto la fila no
+tiene imagen.
+
+Pillow es opcional: si no está instalado el original se publica tal cual, sin miniatura.
+"""
+import asyncio
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from fastapi import UploadFile
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .supabase_storage import BUCKET, BUCKET_ORIGINALES, StorageError, storage
+from .. import models, catalogo
+
+logger = logging.getLogger("imagenes")
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - dependencia opcional
+    Image = None
+
+# nombre -> lado mayor en px
+VARIANTES = {"main": 1280, "thumb": 160}
+CALIDAD_WEBP = int(os.getenv("IMG_WEBP_QUALITY", "80"))
+MAX_BYTES = int(os.getenv("IMG_MAX_BYTES", str(20 * 1024 * 1024)))
+WORKERS = int(os.getenv("IMG_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+# tabla -> (modelo, columna pk, columna url, columna miniatura)
+DESTINOS = {
+    "productos": (models.Producto, "id_producto", "imagen_url", "imagen_thumb_url"),
+    "usuarios": (models.Usuario, "id_usuario", "foto_url", "foto_thumb_url"),
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+class ImagenInvalida(ValueError):
+    """El contenido no es una imagen decodificable: reintentar no sirve."""
+
+def _procesar(data: bytes) -> dict[str, bytes]:
+    """Corre en el pool de procesos: decodifica una vez y codifica cada variante en WebP sin metadatos."""
+    with Image.open(io.BytesIO(data)) as im:
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("RGBA" if im.mode in ("RGBA", "LA", "P") else "RGB")
+        salida = {}
+        for nombre, lado in VARIANTES.items():
+            v = im.copy()
+            v.thumbnail((lado, lado), Image.LANCZOS)
+            buf = io.BytesIO()
+            # Sin exif=/icc_profile=: la variante sale sin metadatos
+            v.save(buf, format="WEBP", quality=CALIDAD_WEBP, method=4)
+            salida[nombre] = buf.getvalue()
+        return salida
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WORKERS)
+    return _pool
+
+def _reemplazar(roto: ProcessPoolExecutor):
+    """Descarta un pool roto (un worker murió, p.ej. por OOM); el próximo _executor() crea otro."""
+    global _pool
+    if _pool is roto:  # otra tarea concurrente puede haberlo reemplazado ya
+        _pool = None
+    roto.shutdown(wait=False, cancel_futures=True)
+
+def cerrar():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def disponible() -> bool:
+    return Image is not None
+
+async def procesar(data: bytes) -> dict[str, bytes]:
+    """
+    Genera las variantes WebP fuera del event loop. Lanza ImagenInvalida si no se
+    puede decodificar. Si el pool está roto se recrea y se reintenta una vez; si
+    vuelve a romperse, la imagen es la que tumba al worker y se da por inválida.
+    """
+    loop = asyncio.get_running_loop()
+    for intento in range(2):
+        pool = _executor()
+        try:
+            return await loop.run_in_executor(pool, _procesar, data)
+        except BrokenProcessPool as e:
+            _reemplazar(pool)
+            if intento:
+                raise ImagenInvalida(f"el proceso de imágenes terminó abruptamente: {e}") from e
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise ImagenInvalida(str(e)) from e
+
+async def subir_imagen(file: UploadFile, folder: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Sube la imagen de una petición y devuelve (url pública, ruta del original).
+    Con Pillow: (None, ruta en el bucket privado); hay que encolar_imagen() con la ruta.
+    Sin Pillow: (url del original publicado, None).
+    Lanza ArchivoDemasiadoGrande si supera MAX_BYTES y StorageError si falla la subida.
+    """
+    if disponible():
+        return None, await storage.subir_original(file, folder, max_bytes=MAX_BYTES)
+    return await storage.subir(file, folder, max_bytes=MAX_BYTES), None
+
+async def _borrar(ruta: str, bucket: str):
+    try:
+        await storage.borrar(ruta, bucket)
+    except StorageError as e:
+        logger.warning("No se pudo borrar %s/%s: %s", bucket, ruta, e)
+
+async def procesar_imagen(db: AsyncSession, tabla: str, id_fila: int, original: str) -> dict:
+    """
+    Handler del job "procesar_imagen": descarga el original privado, publica las
+    variantes y las asigna a la fila si todavía no tiene imagen. El original se
+    borra al terminar (también si no es una imagen válida).
+    """
+    if not disponible():
+        return {"omitido": "Pillow no instalado"}
+    modelo, pk, col_url, col_thumb = DESTINOS[tabla]
+
+    data = await storage.descargar_original(original, MAX_BYTES)
+    try:
+        variantes = await procesar(data)
+    except ImagenInvalida as e:
+        await _borrar(original, BUCKET_ORIGINALES)
+        return {"omitido": f"imagen no decodificable: {e}"}
+
+    base = f"{tabla}/{uuid.uuid4().hex}"
+    rutas = {nombre: f"{base}-{nombre}.webp" for nombre in variantes}
+    urls = dict(zip(variantes, await asyncio.gather(
+        *[storage.subir_bytes(contenido, rutas[nombre], "image/webp") for nombre, contenido in variantes.items()]
+    )))
+
+    res = await db.execute(
+        update(modelo)
+        .where(getattr(modelo, pk) == id_fila, getattr(modelo, col_url).is_(None))
+        .values({col_url: urls["main"], col_thumb: urls["thumb"]})
+    )
+    if res.rowcount == 0:
+        await db.rollback()
+        await asyncio.gather(*[_borrar(r, BUCKET) for r in rutas.values()])
+        await _borrar(original, BUCKET_ORIGINALES)
+        return {"omitido": "la fila ya tiene imagen o ya no existe"}
+    await catalogo.commit_escritura(db, tabla)
+    await _borrar(original, BUCKET_ORIGINALES)
+    return urls
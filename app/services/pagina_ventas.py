@@ -0,0 +1,69 @@
+# app/services/pagina_ventas.py
+"""
+Datos de /web/ventas en una sola consulta: la página de ventas (keyset por
+id_venta) con los nombres de producto y usuario ya unidos, más los KPIs del
+mismo filtro como CTE de una fila. Los desplegables salen de la caché de catálogo,
+con su versión para la caché de fragmentos de app.plantillas.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import crud, models, catalogo
+
+POR_PAGINA = 50
+
+async def datos_pagina_ventas(
+    db: AsyncSession,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    producto_id: int | None = None,
+    usuario_id: int | None = None,
+    after_id: int | None = None,
+    limit: int = POR_PAGINA,
+) -> dict:
+    v, p, u = models.Venta, models.Producto, models.Usuario
+
+    kpi = crud.resumen_stmt(desde, hasta, producto_id, usuario_id).cte("kpi")
+    pagina = (
+        select(
+            v.id_venta,
+            v.fecha_venta,
+            v.cantidad_vendida,
+            v.total_venta,
+            p.nombre.label("producto"),
+            u.nombre_usuario.label("usuario"),
+        )
+        .join(p, p.id_producto == v.id_producto)
+        .join(u, u.id_usuario == v.id_usuario)
+    )
+    pagina = crud.filtrar_ventas(pagina, desde, hasta, producto_id, usuario_id)
+    if after_id:
+        pagina = pagina.where(v.id_venta < after_id)
+    pagina = pagina.order_by(v.id_venta.desc()).limit(limit + 1).subquery("pagina")
+
+    # kpi LEFT JOIN pagina: siempre hay al menos una fila (la de los KPIs)
+    stmt = (
+        select(kpi, pagina)
+        .select_from(kpi.outerjoin(pagina, true()))
+        .order_by(pagina.c.id_venta.desc())
+    )
+    filas = (await db.execute(stmt)).all()
+
+    resumen = crud.resumen_dict(filas[0])
+    ventas = [f for f in filas if f.id_venta is not None]
+    siguiente = None
+    if len(ventas) > limit:
+        ventas = ventas[:limit]
+        siguiente = ventas[-1].id_venta
+
+    return {
+        "ventas": ventas,
+        "resumen": resumen,
+        "siguiente": siguiente,
+        "productos": await catalogo.cache.productos(db),
+        "usuarios": await catalogo.cache.usuarios(db),
+        "version_productos": await catalogo.cache.version(db, "productos"),
+        "version_usuarios": await catalogo.cache.version(db, "usuarios"),
+    }
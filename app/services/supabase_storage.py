@@ -1,39 +1,177 @@
 # app/services/supabase_storage.py
-import os, uuid
-from typing import Optional
+"""
+Servicio único de subida de imágenes a Supabase Storage.
+
+- Un solo httpx.AsyncClient reutilizado (pool de conexiones keep-alive), sin
+  crear un cliente del SDK por petición.
+- El archivo se envía en bloques leídos del UploadFile: no se carga completo en memoria.
+- Todo es I/O async; no hay llamadas síncronas del SDK que bloqueen el event loop.
+- Un semáforo limita las subidas simultáneas por worker.
+- Los originales a post-procesar van a un bucket privado (SUPABASE_BUCKET_ORIGINALES)
+  y se borran tras generar las variantes públicas (ver services/imagenes.py).
+- subir(..., max_bytes=N) corta la subida con ArchivoDemasiadoGrande (413 en las rutas).
+- La URL base sale de SUPABASE_URL en cada llamada, así que puede apuntarse a un
+  servidor de storage falso local para pruebas; o se pasa un `transport` de httpx
+  (p.ej. httpx.MockTransport, ver bench/storage.py) y no hay red de por medio.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from typing import AsyncIterator, Optional
+
+import httpx
 from fastapi import UploadFile
-from supabase import create_client, Client
 
-def _client() -> Optional[Client]:
+logger = logging.getLogger("storage")
+
+BUCKET = os.getenv("SUPABASE_BUCKET", "inventariobar")
+BUCKET_ORIGINALES = os.getenv("SUPABASE_BUCKET_ORIGINALES", f"{BUCKET}-originales")
+CHUNK = 256 * 1024
+MAX_CONCURRENTES = int(os.getenv("STORAGE_MAX_CONCURRENT", "8"))
+TIMEOUT = float(os.getenv("STORAGE_TIMEOUT", "30"))
+
+class StorageError(RuntimeError):
+    pass
+
+class ArchivoDemasiadoGrande(StorageError):
+    """El archivo supera el máximo permitido; no se sube."""
+
+def _config() -> Optional[tuple[str, str]]:
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_SERVICE_ROLE") or os.getenv("SUPABASE_KEY") or os.getenv("SUPABASE_ANON_KEY")
     if not url or not key:
-        return None  # ← sin credenciales: no romper
-    return create_client(url, key)
+        return None
+    return url.rstrip("/"), key
 
-BUCKET = os.getenv("SUPABASE_BUCKET", "inventariobar")
+async def _bloques(file: UploadFile, max_bytes: Optional[int] = None) -> AsyncIterator[bytes]:
+    await file.seek(0)
+    total = 0
+    while chunk := await file.read(CHUNK):
+        total += len(chunk)
+        if max_bytes is not None and total > max_bytes:
+            raise ArchivoDemasiadoGrande(f"El archivo supera {max_bytes} bytes")
+        yield chunk
+
+class StorageService:
+    def __init__(self, max_concurrentes: int = MAX_CONCURRENTES, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_key: Optional[tuple[str, str]] = None
+        self._sem = asyncio.Semaphore(max_concurrentes)
+        self._max = max_concurrentes
+        self._transport = transport
+
+    def _http(self, base: str, key: str) -> httpx.AsyncClient:
+        # Se recrea solo si cambian URL/clave (p.ej. pruebas contra un servidor falso)
+        if self._client is None or self._client.is_closed or self._client_key != (base, key):
+            self._client = httpx.AsyncClient(
+                base_url=f"{base}/storage/v1",
+                headers={"Authorization": f"Bearer {key}", "apikey": key},
+                timeout=TIMEOUT,
+                limits=httpx.Limits(max_connections=self._max, max_keepalive_connections=self._max),
+                transport=self._transport,
+            )
+            self._client_key = (base, key)
+        return self._client
+
+    async def _post(self, path: str, content, headers: dict, bucket: str) -> str:
+        cfg = _config()
+        if cfg is None:
+            raise StorageError("Supabase no configurado (faltan SUPABASE_URL o la clave de servicio).")
+        base, key = cfg
+        async with self._sem:
+            try:
+                r = await self._http(base, key).post(f"/object/{bucket}/{path}", content=content, headers=headers)
+            except httpx.HTTPError as e:
+                raise StorageError(f"Error de red subiendo a Storage: {e}") from e
+        if r.status_code >= 400:
+            raise StorageError(f"Storage respondió {r.status_code}: {r.text[:200]}")
+        return f"{base}/storage/v1/object/public/{bucket}/{path}"
+
+    async def _subir_archivo(
+        self, file: UploadFile, folder: str, upsert: bool, bucket: str, max_bytes: Optional[int]
+    ) -> tuple[str, str]:
+        if max_bytes is not None and file.size is not None and file.size > max_bytes:
+            raise ArchivoDemasiadoGrande(f"El archivo supera {max_bytes} bytes")
+        filename = file.filename or ""
+        ext = (filename.rsplit(".", 1)[-1] if "." in filename else "jpg").lower()
+        headers = {
+            "content-type": file.content_type or "application/octet-stream",
+            "x-upsert": "true" if upsert else "false",
+        }
+        if file.size is not None:
+            headers["content-length"] = str(file.size)
+        ruta = f"{folder}/{uuid.uuid4().hex}.{ext}"
+        return ruta, await self._post(ruta, _bloques(file, max_bytes), headers, bucket)
+
+    async def subir(
+        self, file: UploadFile, folder: str, upsert: bool = False, bucket: str = BUCKET, max_bytes: Optional[int] = None
+    ) -> str:
+        """Sube el archivo y devuelve su URL pública. Lanza StorageError (o ArchivoDemasiadoGrande)."""
+        return (await self._subir_archivo(file, folder, upsert, bucket, max_bytes))[1]
+
+    async def subir_original(self, file: UploadFile, folder: str, max_bytes: Optional[int] = None) -> str:
+        """Sube el archivo al bucket privado de originales y devuelve su ruta (no tiene URL pública)."""
+        return (await self._subir_archivo(file, folder, False, BUCKET_ORIGINALES, max_bytes))[0]
+
+    async def subir_bytes(self, data: bytes, path: str, content_type: str, bucket: str = BUCKET) -> str:
+        """Sube un contenido ya en memoria (p.ej. variantes procesadas) a `path`."""
+        return await self._post(path, data, {"content-type": content_type, "x-upsert": "true"}, bucket)
+
+    async def descargar(self, url: str, max_bytes: int) -> bytes:
+        """
+        Descarga un objeto: URL pública o ruta de la API relativa a /storage/v1 (con la
+        clave de servicio, sirve para buckets privados). Lanza StorageError.
+        """
+        cfg = _config()
+        if cfg is None:
+            raise StorageError("Supabase no configurado (faltan SUPABASE_URL o la clave de servicio).")
+        partes = []
+        total = 0
+        async with self._sem:
+            try:
+                async with self._http(*cfg).stream("GET", url) as r:
+                    if r.status_code >= 400:
+                        raise StorageError(f"Storage respondió {r.status_code} al descargar {url}")
+                    async for chunk in r.aiter_bytes(CHUNK):
+                        total += len(chunk)
+                        if total > max_bytes:
+                            raise StorageError(f"Objeto demasiado grande: {url}")
+                        partes.append(chunk)
+            except httpx.HTTPError as e:
+                raise StorageError(f"Error de red descargando de Storage: {e}") from e
+        return b"".join(partes)
+
+    async def descargar_original(self, ruta: str, max_bytes: int) -> bytes:
+        return await self.descargar(f"/object/{BUCKET_ORIGINALES}/{ruta}", max_bytes)
+
+    async def borrar(self, ruta: str, bucket: str = BUCKET):
+        """Borra un objeto; que ya no exista no es error. Lanza StorageError."""
+        cfg = _config()
+        if cfg is None:
+            raise StorageError("Supabase no configurado (faltan SUPABASE_URL o la clave de servicio).")
+        async with self._sem:
+            try:
+                r = await self._http(*cfg).delete(f"/object/{bucket}/{ruta}")
+            except httpx.HTTPError as e:
+                raise StorageError(f"Error de red borrando de Storage: {e}") from e
+        if r.status_code >= 400 and r.status_code != 404:
+            raise StorageError(f"Storage respondió {r.status_code} al borrar {ruta}")
+
+    async def cerrar(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+storage = StorageService()
 
 async def upload_image_get_public_url(file: Optional[UploadFile], folder: str = "uploads") -> Optional[str]:
     # Sin archivo → nada que subir
     if file is None or not getattr(file, "filename", ""):
         return None
-
-    sb = _client()
-    # Sin cliente (faltan envs) → no subir, pero no romper
-    if sb is None:
-        return None
-
-    # Leer bytes
-    data = await file.read()
-    ext = (file.filename.rsplit(".", 1)[-1] if "." in file.filename else "jpg").lower()
-    path = f"{folder}/{uuid.uuid4()}.{ext}"
-
-    # Subir
-    r = sb.storage.from_(BUCKET).upload(path, data)
-    if getattr(r, "error", None):
-        # Fallo de Storage → no romper el flujo de negocio
+    try:
+        return await storage.subir(file, folder)
+    except StorageError as e:
+        # Sin credenciales o fallo de Storage → no romper el flujo de negocio
+        logger.warning("Subida de imagen omitida: %s", e)
         return None
-
-    # URL pública
-    public = sb.storage.from_(BUCKET).get_public_url(path)
-    return getattr(public, "get", lambda _k, _d=None: None)("publicUrl", None) if hasattr(public, "get") else public
@@ -0,0 +1,178 @@
+# bench/carga.py
+"""
+Driver de carga async para la ruta caliente: ventas, páginas web y búsqueda.
+
+Cada escenario corre por separado en lazo cerrado: `--concurrencia` clientes
+virtuales lanzan peticiones durante `--duracion` segundos. Se reportan
+percentiles de latencia, throughput, errores y sentencias SQL por petición
+(leídas de /metrics antes y después), más el tiempo de render por plantilla y la
+tasa de aciertos de la caché de fragmentos (/health/plantillas, acumulados del
+worker). Requiere una BD sembrada (bench.seed).
+
+Con --verificar-sql sale con código 1 si algún escenario supera su presupuesto de
+sentencias SQL por petición (PRESUPUESTO_SQL): es el chequeo de regresión de
+round trips, p.ej. que /web/ventas siga resolviéndose en una o dos consultas.
+
+    python -m bench.carga --modo inproceso --escenarios venta,web_ventas,dashboard,buscar
+    python -m bench.carga --modo uvicorn --workers 1 --concurrencia 32 --duracion 30
+    python -m bench.carga --modo uvicorn --url http://127.0.0.1:8000   # servidor ya levantado
+    python -m bench.carga --escenarios web_ventas --duracion 5 --verificar-sql
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from .comun import cliente, contadores_sql, guardar, percentiles, sql_por_peticion
+
+TERMINOS = ["cerv", "ron", "aguard", "whis", "vodka", "club", "aguila", "old parr", "antioq", "corona", "medelin"]
+
+async def _venta(c: httpx.AsyncClient, rnd: random.Random, ctx: dict) -> httpx.Response:
+    return await c.post("/ventas/", json={
+        "id_usuario": rnd.choice(ctx["usuarios"]),
+        "id_producto": rnd.choice(ctx["productos"]),
+        "cantidad_vendida": 1,
+    })
+
+async def _web_ventas(c, rnd, ctx):
+    return await c.get("/web/ventas")
+
+async def _web_productos(c, rnd, ctx):
+    return await c.get("/web/productos")
+
+async def _web_usuarios(c, rnd, ctx):
+    return await c.get("/web/usuarios")
+
+async def _dashboard(c, rnd, ctx):
+    return await c.get("/web/dashboard")
+
+async def _buscar(c, rnd, ctx):
+    return await c.get("/web/productos", params={"q": rnd.choice(TERMINOS)})
+
+async def _resumen(c, rnd, ctx):
+    # Rangos con bordes sin alinear: ejercita rollups + bordes sobre ventas
+    hasta = datetime.now(timezone.utc) - timedelta(minutes=rnd.randrange(0, 60 * 24 * 30))
+    desde = hasta - timedelta(days=rnd.choice((1, 7, 30, 90)), minutes=rnd.randrange(0, 600))
+    return await c.get("/reportes/resumen", params={"desde": desde.isoformat(), "hasta": hasta.isoformat()})
+
+ESCENARIOS = {
+    "venta": _venta,
+    "web_ventas": _web_ventas,
+    "web_productos": _web_productos,
+    "web_usuarios": _web_usuarios,
+    "dashboard": _dashboard,
+    "buscar": _buscar,
+    "resumen": _resumen,
+}
+
+# Escenario -> (ruta en /metrics, máximo de sentencias SQL por petición)
+PRESUPUESTO_SQL = {
+    "web_ventas": ("GET /web/ventas", 2),
+}
+
+def verificar_sql(resultados: dict) -> dict[str, dict]:
+    """Escenarios corridos que superan su presupuesto de SQL por petición."""
+    fallos = {}
+    for nombre, (ruta, maximo) in PRESUPUESTO_SQL.items():
+        if nombre not in resultados:
+            continue
+        medido = resultados[nombre]["sql_por_peticion"].get(ruta)
+        if medido is None or medido > maximo:
+            fallos[nombre] = {"ruta": ruta, "maximo": maximo, "medido": medido}
+    return fallos
+
+async def _contexto(c: httpx.AsyncClient) -> dict:
+    productos = [p["id_producto"] for p in (await c.get("/productos/")).json() if p["cantidad"] > 1000]
+    usuarios = [u["id_usuario"] for u in (await c.get("/usuarios/")).json()]
+    if not productos or not usuarios:
+        raise SystemExit("BD sin datos: correr antes `python -m bench.seed`")
+    return {"productos": productos, "usuarios": usuarios}
+
+async def correr_escenario(c, nombre: str, ctx: dict, concurrencia: int, duracion: float, semilla: int) -> dict:
+    fn = ESCENARIOS[nombre]
+    latencias: list[float] = []
+    status: dict[int, int] = {}
+    errores_red = 0
+    fin = time.monotonic() + duracion
+
+    async def cliente_virtual(i: int):
+        nonlocal errores_red
+        rnd = random.Random(semilla * 1000 + i)
+        while time.monotonic() < fin:
+            t0 = time.perf_counter()
+            try:
+                r = await fn(c, rnd, ctx)
+            except httpx.TransportError:
+                errores_red += 1
+                continue
+            latencias.append(time.perf_counter() - t0)
+            status[r.status_code] = status.get(r.status_code, 0) + 1
+
+    c.cookies.clear()  # sin cookie de read-your-writes heredada de otro escenario
+    antes = await contadores_sql(c)
+    t0 = time.perf_counter()
+    await asyncio.gather(*[cliente_virtual(i) for i in range(concurrencia)])
+    transcurrido = time.perf_counter() - t0
+    despues = await contadores_sql(c)
+
+    ok = sum(n for s, n in status.items() if s < 400)
+    return {
+        "concurrencia": concurrencia,
+        "duracion_s": round(transcurrido, 3),
+        "peticiones": len(latencias),
+        "ok": ok,
+        "throughput_rps": round(ok / transcurrido, 2) if transcurrido else 0.0,
+        "status": {str(k): v for k, v in sorted(status.items())},
+        "errores_red": errores_red,
+        "latencia": percentiles(latencias),
+        "sql_por_peticion": sql_por_peticion(antes, despues),
+    }
+
+async def principal(a) -> dict:
+    resultados = {}
+    async with cliente(a.modo, a.url, a.workers) as c:
+        ctx = await _contexto(c)
+        # Calentamiento: cachés de catálogo, índice de búsqueda, pool
+        for nombre in a.escenarios:
+            await ESCENARIOS[nombre](c, random.Random(0), ctx)
+        for nombre in a.escenarios:
+            print(f"· {nombre} ({a.concurrencia} clientes, {a.duracion}s)")
+            resultados[nombre] = await correr_escenario(c, nombre, ctx, a.concurrencia, a.duracion, a.semilla)
+            print(f"  {resultados[nombre]['throughput_rps']} req/s, p95 {resultados[nombre]['latencia'].get('p95_ms')} ms")
+        plantillas = (await c.get("/health/plantillas")).json()
+    return {
+        "modo": a.modo,
+        "workers": a.workers if a.modo == "uvicorn" and not a.url else None,
+        "escenarios": resultados,
+        "plantillas": plantillas,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modo", choices=("inproceso", "uvicorn"), default="inproceso")
+    ap.add_argument("--url", help="servidor ya levantado (solo --modo uvicorn)")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--escenarios", type=lambda s: s.split(","), default=list(ESCENARIOS))
+    ap.add_argument("--concurrencia", type=int, default=16)
+    ap.add_argument("--duracion", type=float, default=15)
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--verificar-sql", action="store_true", help="falla si se supera PRESUPUESTO_SQL")
+    ap.add_argument("--salida", help="ruta del JSON (por defecto bench/resultados/carga-<fecha>.json)")
+    a = ap.parse_args()
+    desconocidos = set(a.escenarios) - set(ESCENARIOS)
+    if desconocidos:
+        ap.error(f"escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+    res = asyncio.run(principal(a))
+    if a.verificar_sql:
+        res["presupuesto_sql"] = verificar_sql(res["escenarios"])
+    guardar("carga", res, a.salida)
+    if a.verificar_sql:
+        print("OK" if not res["presupuesto_sql"] else f"FALLO: {res['presupuesto_sql']}")
+        sys.exit(1 if res["presupuesto_sql"] else 0)
+
+if __name__ == "__main__":
+    main()
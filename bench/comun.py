@@ -0,0 +1,127 @@
+# bench/comun.py
+"""Utilidades compartidas por los scripts de benchmark."""
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import httpx
+
+RESULTADOS_DIR = Path(os.getenv("BENCH_DIR", "bench/resultados"))
+
+def dsn_asyncpg() -> str:
+    """DSN para asyncpg a partir de DATABASE_URL ya normalizada por app.database."""
+    from app.database import clean_url
+    return clean_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+def percentiles(muestras_s: list[float]) -> dict:
+    if not muestras_s:
+        return {"n": 0}
+    xs = sorted(muestras_s)
+    def p(q: float) -> float:
+        return round(xs[min(len(xs) - 1, int(q * len(xs)))] * 1000, 3)
+    return {
+        "n": len(xs),
+        "media_ms": round(sum(xs) / len(xs) * 1000, 3),
+        "p50_ms": p(0.50),
+        "p90_ms": p(0.90),
+        "p95_ms": p(0.95),
+        "p99_ms": p(0.99),
+        "max_ms": round(xs[-1] * 1000, 3),
+    }
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def guardar(nombre: str, resultado: dict, destino: Optional[str] = None) -> Path:
+    """Escribe el resultado con metadatos (commit, python, fecha) en bench/resultados/."""
+    doc = {
+        "benchmark": nombre,
+        "fecha": datetime.now(timezone.utc).isoformat(),
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "plataforma": platform.platform(),
+        **resultado,
+    }
+    if destino:
+        ruta = Path(destino)
+    else:
+        RESULTADOS_DIR.mkdir(parents=True, exist_ok=True)
+        ruta = RESULTADOS_DIR / f"{nombre}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    ruta.write_text(json.dumps(doc, indent=2, ensure_ascii=False))
+    print(f"Resultado: {ruta}")
+    return ruta
+
+# ---------- Cliente HTTP: en proceso o contra uvicorn ----------
+@asynccontextmanager
+async def cliente(modo: str, url: Optional[str] = None, workers: int = 1) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    modo="inproceso": ASGITransport sobre app.main.app (sin red; incluye el lifespan).
+    modo="uvicorn": levanta uvicorn en un subproceso (o usa `url` si ya hay uno corriendo).
+    """
+    limites = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    if modo == "inproceso":
+        from app.main import app
+        async with app.router.lifespan_context(app):
+            transporte = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://bench", limits=limites, timeout=60) as c:
+                yield c
+        return
+
+    proc = None
+    if url is None:
+        puerto = int(os.getenv("BENCH_PORT", "8765"))
+        url = f"http://127.0.0.1:{puerto}"
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(puerto),
+             "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        )
+    try:
+        async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60) as c:
+            await _esperar_listo(c)
+            yield c
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+async def _esperar_listo(c: httpx.AsyncClient, timeout: float = 30):
+    import asyncio
+    limite = time.monotonic() + timeout
+    while True:
+        try:
+            if (await c.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > limite:
+            raise RuntimeError("El servidor no respondió a /health")
+        await asyncio.sleep(0.2)
+
+# ---------- Conteo de sentencias SQL por ruta (vía /metrics) ----------
+_RE_SQL = re.compile(r'^http_request_db_statements_total\{method="(\w+)",route="([^"]*)"\} (\d+)$', re.M)
+_RE_N = re.compile(r'^http_request_duration_seconds_count\{method="(\w+)",route="([^"]*)"\} (\d+)$', re.M)
+
+async def contadores_sql(c: httpx.AsyncClient) -> dict[tuple[str, str], tuple[int, int]]:
+    """(método, ruta) -> (sentencias, peticiones), leído de /metrics (un solo worker)."""
+    texto = (await c.get("/metrics")).text
+    n = {(m, r): int(v) for m, r, v in _RE_N.findall(texto)}
+    return {(m, r): (int(v), n.get((m, r), 0)) for m, r, v in _RE_SQL.findall(texto)}
+
+def sql_por_peticion(antes: dict, despues: dict) -> dict[str, float]:
+    out = {}
+    for clave, (sql, n) in despues.items():
+        sql0, n0 = antes.get(clave, (0, 0))
+        if n - n0 > 0:
+            out[f"{clave[0]} {clave[1]}"] = round((sql - sql0) / (n - n0), 2)
+    return out
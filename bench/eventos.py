@@ -0,0 +1,131 @@
+# bench/eventos.py
+"""
+Feed en vivo (GET /eventos, SSE) con muchos clientes conectados.
+
+Abre `--clientes` conexiones SSE (200 por defecto, como pantallas y tablets de la
+barra), registra `--ventas` ventas con POST /ventas/ y mide, para cada venta y
+cada cliente, el tiempo desde que se envía el POST hasta que el evento llega
+(commit + NOTIFY + fan-out). Verifica que todos los clientes conectados reciben
+todas las ventas (sin "resync" salvo que haya clientes lentos).
+
+El servidor necesita EVENTOS=1 (apagado por defecto); si lo levanta el propio
+bench, se activa solo. Solo contra uvicorn: ASGITransport de httpx no entrega cuerpos en streaming. Con
+--workers N los clientes se reparten entre workers y el fan-out pasa por LISTEN/NOTIFY.
+
+    python -m bench.eventos --clientes 200 --ventas 100 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+import httpx
+
+from .comun import cliente, guardar, percentiles
+
+async def _suscriptor(c: httpx.AsyncClient, estado: dict, conectado: asyncio.Event):
+    try:
+        async with c.stream("GET", "/eventos", timeout=httpx.Timeout(None, connect=30)) as r:
+            if r.status_code != 200:
+                estado["rechazados"] += 1
+                conectado.set()
+                return
+            estado["conectados"] += 1
+            conectado.set()
+            tipo = None
+            async for linea in r.aiter_lines():
+                if linea.startswith("event: "):
+                    tipo = linea[7:]
+                elif linea.startswith("data: "):
+                    if tipo == "venta":
+                        estado["llegadas"].setdefault(json.loads(linea[6:])["id_venta"], []).append(time.perf_counter())
+                    elif tipo == "resync":
+                        estado["resyncs"] += 1
+    except httpx.TransportError:
+        estado["errores"] += 1
+        conectado.set()
+
+async def principal(a) -> dict:
+    estado = {"conectados": 0, "rechazados": 0, "errores": 0, "resyncs": 0, "llegadas": {}}
+    async with cliente("uvicorn", a.url, a.workers) as c:
+        marca = uuid.uuid4().hex[:8]
+        p = (await c.post("/productos/", json={
+            "nombre": f"Bench eventos {marca}", "categoria": "bench", "marca": "bench",
+            "cantidad": a.ventas * 10, "precio_venta": 1000,
+        })).json()
+        u = (await c.post("/usuarios/", json={
+            "nombre_usuario": f"bench {marca}", "correo": f"eventos-{marca}@example.com", "rol": "operador",
+        })).json()
+
+        t0 = time.perf_counter()
+        eventos_conexion = [asyncio.Event() for _ in range(a.clientes)]
+        tareas = [asyncio.create_task(_suscriptor(c, estado, ev)) for ev in eventos_conexion]
+        await asyncio.gather(*[ev.wait() for ev in eventos_conexion])
+        conexion_s = time.perf_counter() - t0
+        await asyncio.sleep(0.5)  # que todos los LISTEN estén activos
+
+        envios = {}
+        for _ in range(a.ventas):
+            t = time.perf_counter()
+            r = await c.post("/ventas/", json={"id_usuario": u["id_usuario"], "id_producto": p["id_producto"], "cantidad_vendida": 1})
+            if r.status_code == 201:
+                envios[r.json()["id_venta"]] = t
+            await asyncio.sleep(a.intervalo)
+        await asyncio.sleep(a.espera)
+        stats_servidor = (await c.get("/health/eventos")).json()
+
+        for t in tareas:
+            t.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    latencias, completas = [], 0
+    for id_venta, t_envio in envios.items():
+        llegadas = estado["llegadas"].get(id_venta, [])
+        latencias += [t - t_envio for t in llegadas]
+        completas += len(llegadas) == estado["conectados"]
+    invariantes = {
+        "todos_conectados": estado["conectados"] == a.clientes,
+        "ventas_aceptadas": len(envios) == a.ventas,
+        "entrega_completa": completas == len(envios),
+        "sin_resync": estado["resyncs"] == 0,
+    }
+    return {
+        "clientes": a.clientes,
+        "workers": a.workers if not a.url else None,
+        "ventas": a.ventas,
+        "conexion_s": round(conexion_s, 3),
+        "conectados": estado["conectados"],
+        "rechazados_503": estado["rechazados"],
+        "errores": estado["errores"],
+        "entregas": len(latencias),
+        "ventas_entregadas_a_todos": completas,
+        "resyncs": estado["resyncs"],
+        "latencia_entrega": percentiles(latencias),
+        "servidor": stats_servidor,
+        "invariantes": invariantes,
+        "ok": all(invariantes.values()),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="servidor ya levantado")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--clientes", type=int, default=200)
+    ap.add_argument("--ventas", type=int, default=100)
+    ap.add_argument("--intervalo", type=float, default=0.02, help="s entre ventas")
+    ap.add_argument("--espera", type=float, default=2, help="s para que lleguen los últimos eventos")
+    ap.add_argument("--salida")
+    a = ap.parse_args()
+    os.environ["EVENTOS"] = "1"  # lo hereda el uvicorn que levanta comun.cliente()
+    res = asyncio.run(principal(a))
+    guardar("eventos", res, a.salida)
+    print(f"· {res['conectados']} clientes, p50 {res['latencia_entrega'].get('p50_ms')} ms, "
+          f"p99 {res['latencia_entrega'].get('p99_ms')} ms")
+    print("OK" if res["ok"] else f"FALLO: {res['invariantes']}")
+    sys.exit(0 if res["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
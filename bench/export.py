@@ -0,0 +1,111 @@
+# bench/export.py
+"""
+Exportación en streaming de ventas/movimientos: throughput y memoria.
+
+Invoca la app ASGI directamente y descarta los bloques a medida que llegan (sin
+acumular el cuerpo como haría un cliente de pruebas), muestreando el RSS del
+proceso. Lo esperado: el pico de RSS no crece con el número de filas.
+Es el benchmark de 5M filas del export: con --max-rss-mb sale con código 1 si el
+RSS crece más que ese margen durante la exportación.
+
+    python -m bench.seed --ventas 5000000 --truncar
+    python -m bench.export --ruta /ventas/export --formato csv --max-rss-mb 64
+    python -m bench.export --ruta /movimientos/export --formato ndjson --max-rss-mb 64
+"""
+import argparse
+import asyncio
+import sys
+import time
+from urllib.parse import urlencode
+
+from .comun import guardar
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def exportar(app, ruta: str, params: dict) -> dict:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": ruta, "raw_path": ruta.encode(), "root_path": "",
+        "query_string": urlencode(params).encode(), "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    estado = {"status": None, "bytes": 0, "lineas": 0, "bloques": 0, "primer_byte_s": None}
+    t0 = time.perf_counter()
+
+    async def receive():
+        await asyncio.sleep(3600)  # el cliente nunca envía cuerpo ni se desconecta
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            estado["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            cuerpo = message.get("body", b"")
+            if cuerpo and estado["primer_byte_s"] is None:
+                estado["primer_byte_s"] = time.perf_counter() - t0
+            estado["bytes"] += len(cuerpo)
+            estado["lineas"] += cuerpo.count(b"\n")
+            estado["bloques"] += 1
+
+    muestras = []
+    listo = asyncio.Event()
+
+    async def muestrear():
+        while not listo.is_set():
+            muestras.append(_rss_mb())
+            await asyncio.sleep(0.05)
+
+    rss_inicial = _rss_mb()
+    tarea = asyncio.create_task(muestrear())
+    try:
+        await app(scope, receive, send)
+    finally:
+        listo.set()
+        await tarea
+    transcurrido = time.perf_counter() - t0
+    return {
+        "status": estado["status"],
+        "lineas": estado["lineas"],
+        "mb": round(estado["bytes"] / 2**20, 2),
+        "bloques": estado["bloques"],
+        "duracion_s": round(transcurrido, 3),
+        "primer_byte_ms": round((estado["primer_byte_s"] or 0) * 1000, 1),
+        "filas_por_s": round(estado["lineas"] / transcurrido, 1) if transcurrido else 0.0,
+        "mb_por_s": round(estado["bytes"] / 2**20 / transcurrido, 2) if transcurrido else 0.0,
+        "rss_inicial_mb": round(rss_inicial, 1),
+        "rss_pico_mb": round(max(muestras, default=rss_inicial), 1),
+        "rss_crecimiento_mb": round(max(muestras, default=rss_inicial) - rss_inicial, 1),
+    }
+
+async def principal(a) -> dict:
+    from app.main import app
+    params = {"formato": a.formato}
+    async with app.router.lifespan_context(app):
+        res = await exportar(app, a.ruta, params)
+    print(f"· {res['lineas']} líneas, {res['filas_por_s']} filas/s, RSS +{res['rss_crecimiento_mb']} MB")
+    return {"ruta": a.ruta, "formato": a.formato, **res}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--ruta", choices=("/ventas/export", "/movimientos/export"), default="/ventas/export")
+    ap.add_argument("--formato", choices=("ndjson", "csv"), default="ndjson")
+    ap.add_argument("--max-rss-mb", type=float, help="crecimiento de RSS tolerado; si se supera sale con código 1")
+    ap.add_argument("--salida")
+    a = ap.parse_args()
+    res = asyncio.run(principal(a))
+    res["ok"] = res["status"] == 200 and (a.max_rss_mb is None or res["rss_crecimiento_mb"] <= a.max_rss_mb)
+    guardar("export", res, a.salida)
+    print("OK" if res["ok"] else f"FALLO: status {res['status']}, RSS +{res['rss_crecimiento_mb']} MB")
+    sys.exit(0 if res["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bench/idempotencia.py
+"""
+Reintentos con Idempotency-Key: costo y corrección.
+
+Fase 1: `--ventas` POST /ventas/ de una unidad, cada una con su clave.
+Fase 2: se reenvía cada petición `--reintentos` veces con la misma clave
+(como una tablet con Wi-Fi inestable). Verifica que:
+  - todos los reintentos devuelven 201 con el mismo id_venta y Idempotency-Replayed,
+  - el stock baja exactamente `--ventas` unidades,
+y reporta latencias y sentencias SQL por petición de cada fase (se espera 1 en
+los reintentos: la búsqueda por llave primaria), más el plan de esa búsqueda.
+
+    python -m bench.idempotencia --ventas 200 --reintentos 3 --concurrencia 16
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+from sqlalchemy import text
+
+from .comun import cliente, contadores_sql, guardar, percentiles, sql_por_peticion
+
+async def _fase(c, peticiones: list[tuple[str, dict]], concurrencia: int) -> tuple[list, list]:
+    sem = asyncio.Semaphore(concurrencia)
+    latencias, respuestas = [], []
+
+    async def una(clave, cuerpo):
+        async with sem:
+            t0 = time.perf_counter()
+            r = await c.post("/ventas/", json=cuerpo, headers={"Idempotency-Key": clave})
+            latencias.append(time.perf_counter() - t0)
+            respuestas.append((clave, r))
+
+    await asyncio.gather(*[una(k, b) for k, b in peticiones])
+    return latencias, respuestas
+
+async def _plan() -> list[str]:
+    from app.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(text(
+            "EXPLAIN SELECT huella, estado, status_code, respuesta FROM idempotencia "
+            "WHERE ambito = 'ventas' AND clave = 'x' AND expira_en > now()"
+        ))
+        return [r[0] for r in res.all()]
+
+async def principal(a) -> dict:
+    async with cliente(a.modo, a.url, a.workers) as c:
+        marca = uuid.uuid4().hex[:8]
+        p = (await c.post("/productos/", json={
+            "nombre": f"Bench idempotencia {marca}", "categoria": "bench", "marca": "bench",
+            "cantidad": a.ventas * 10, "precio_venta": 1000,
+        })).json()
+        u = (await c.post("/usuarios/", json={
+            "nombre_usuario": f"bench {marca}", "correo": f"idem-{marca}@example.com", "rol": "operador",
+        })).json()
+        cuerpo = {"id_usuario": u["id_usuario"], "id_producto": p["id_producto"], "cantidad_vendida": 1}
+        peticiones = [(f"bench-{marca}-{i}", cuerpo) for i in range(a.ventas)]
+
+        c.cookies.clear()
+        antes = await contadores_sql(c)
+        lat1, resp1 = await _fase(c, peticiones, a.concurrencia)
+        medio = await contadores_sql(c)
+        lat2, resp2 = await _fase(c, peticiones * a.reintentos, a.concurrencia)
+        despues = await contadores_sql(c)
+
+    from app import models
+    from app.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        stock_final = (await db.get(models.Producto, p["id_producto"])).cantidad
+
+    originales = {k: r.json().get("id_venta") for k, r in resp1 if r.status_code == 201}
+    invariantes = {
+        "originales_201": len(originales) == a.ventas,
+        "reintentos_201": all(r.status_code == 201 for _, r in resp2),
+        "reintentos_marcados": all(r.headers.get("idempotency-replayed") == "true" for _, r in resp2),
+        "mismo_id_venta": all(r.json().get("id_venta") == originales.get(k) for k, r in resp2),
+        "stock_cuadra": stock_final == a.ventas * 10 - a.ventas,
+    }
+    return {
+        "modo": a.modo,
+        "ventas": a.ventas,
+        "reintentos_por_venta": a.reintentos,
+        "originales": {"latencia": percentiles(lat1), "sql_por_peticion": sql_por_peticion(antes, medio)},
+        "reintentos": {"latencia": percentiles(lat2), "sql_por_peticion": sql_por_peticion(medio, despues)},
+        "plan_busqueda": await _plan(),
+        "invariantes": invariantes,
+        "ok": all(invariantes.values()),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modo", choices=("inproceso", "uvicorn"), default="inproceso")
+    ap.add_argument("--url")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--ventas", type=int, default=200)
+    ap.add_argument("--reintentos", type=int, default=3)
+    ap.add_argument("--concurrencia", type=int, default=16)
+    ap.add_argument("--salida")
+    a = ap.parse_args()
+    res = asyncio.run(principal(a))
+    guardar("idempotencia", res, a.salida)
+    print(f"SQL por petición: originales {res['originales']['sql_por_peticion']}, "
+          f"reintentos {res['reintentos']['sql_por_peticion']}")
+    print("OK" if res["ok"] else f"FALLO: {res['invariantes']}")
+    sys.exit(0 if res["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# bench/importacion.py
+"""
+Importación masiva de productos (POST /productos/import).
+
+Arma un CSV que actualiza el stock de `--actualizar` productos existentes (una parte
+con la misma cantidad, sin cambio) y da de alta `--nuevos` productos, y lo sube de
+una vez. Verifica que:
+  - cada producto con diferencia de stock tiene exactamente un movimiento de
+    importación, del tipo y la cantidad de esa diferencia,
+  - los que no cambian no tienen ninguno,
+  - cada alta con stock tiene su movimiento de entrada,
+  - el resumen de la respuesta cuadra con lo anterior.
+Reporta la duración y filas/s. Sale con código 1 si alguna verificación falla.
+
+    python -m bench.importacion --actualizar 500 --nuevos 1000
+"""
+import argparse
+import asyncio
+import csv
+import io
+import random
+import sys
+import time
+import uuid
+
+from sqlalchemy import func, select
+
+from .comun import cliente, guardar
+
+async def _movimientos_desde(id_movimiento: int) -> dict[int, list[tuple[str, int, str]]]:
+    """id_producto -> [(tipo, cantidad, descripción)] de los movimientos de importación posteriores."""
+    from app import models
+    from app.database import AsyncSessionLocal
+    m = models.InventarioMovimiento
+    async with AsyncSessionLocal() as db:
+        filas = (await db.execute(
+            select(m.id_producto, m.tipo_movimiento, m.cantidad, m.descripcion)
+            .where(m.id_movimiento > id_movimiento, m.descripcion.like("importación%"))
+        )).all()
+    out: dict[int, list[tuple[str, int, str]]] = {}
+    for pid, tipo, cantidad, descripcion in filas:
+        out.setdefault(pid, []).append((tipo, cantidad, descripcion))
+    return out
+
+async def _ultimo_movimiento() -> int:
+    from app import models
+    from app.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.coalesce(func.max(models.InventarioMovimiento.id_movimiento), 0)))
+
+def _csv(filas: list[dict]) -> bytes:
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=["id_producto", "nombre", "categoria", "marca", "cantidad", "precio_venta"])
+    w.writeheader()
+    w.writerows(filas)
+    return buf.getvalue().encode()
+
+async def principal(a) -> dict:
+    rnd = random.Random(a.semilla)
+    async with cliente(a.modo, a.url, a.workers) as c:
+        productos = {p["id_producto"]: p["cantidad"] for p in (await c.get("/productos/")).json()}
+        if len(productos) < a.actualizar:
+            raise SystemExit(f"Se necesitan al menos {a.actualizar} productos: correr antes `python -m bench.seed`")
+
+        esperado: dict[int, int] = {}  # id_producto -> diferencia de stock
+        filas = []
+        for pid in rnd.sample(sorted(productos), a.actualizar):
+            nueva = productos[pid] if rnd.random() < 0.2 else rnd.randint(0, 500)
+            esperado[pid] = nueva - productos[pid]
+            filas.append({"id_producto": pid, "cantidad": nueva})
+        marca = uuid.uuid4().hex[:8]
+        altas = [rnd.randint(0, 50) for _ in range(a.nuevos)]
+        filas += [
+            {"nombre": f"Import {marca} {i}", "categoria": "bench", "marca": "bench", "cantidad": n, "precio_venta": 1000}
+            for i, n in enumerate(altas)
+        ]
+        rnd.shuffle(filas)
+        cuerpo = _csv(filas)
+
+        desde = await _ultimo_movimiento()
+        t0 = time.perf_counter()
+        r = await c.post("/productos/import", files={"archivo": ("bench.csv", cuerpo, "text/csv")})
+        transcurrido = time.perf_counter() - t0
+        resumen = r.json() if r.status_code == 200 else {}
+
+    movs = await _movimientos_desde(desde)
+    ajustes = {pid: [x for x in ms if x[2] == "importación (ajuste de stock)"] for pid, ms in movs.items()}
+    cambiados = {pid: d for pid, d in esperado.items() if d}
+    un_movimiento = all(
+        len(ajustes.get(pid, [])) == 1
+        and ajustes[pid][0][:2] == ("entrada" if d > 0 else "salida", abs(d))
+        for pid, d in cambiados.items()
+    )
+    sin_cambio = all(not ajustes.get(pid) for pid, d in esperado.items() if not d)
+    n_altas = sum(1 for ms in movs.values() for x in ms if x[2] == "importación (alta)")
+    esperados = len(cambiados) + sum(1 for n in altas if n > 0)
+
+    invariantes = {
+        "status_200": r.status_code == 200,
+        "un_movimiento_por_diferencia": un_movimiento,
+        "sin_movimiento_sin_cambio": sin_cambio,
+        "altas_con_movimiento": n_altas == sum(1 for n in altas if n > 0),
+        "resumen_cuadra": (
+            resumen.get("actualizados") == a.actualizar
+            and resumen.get("insertados") == a.nuevos
+            and resumen.get("movimientos") == esperados
+            and resumen.get("total_errores") == 0
+        ),
+    }
+    return {
+        "modo": a.modo,
+        "filas": len(filas),
+        "actualizar": a.actualizar,
+        "con_diferencia": len(cambiados),
+        "nuevos": a.nuevos,
+        "duracion_s": round(transcurrido, 3),
+        "filas_por_s": round(len(filas) / transcurrido, 1) if transcurrido else 0.0,
+        "resumen": {k: v for k, v in resumen.items() if k != "errores"},
+        "invariantes": invariantes,
+        "ok": all(invariantes.values()),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modo", choices=("inproceso", "uvicorn"), default="inproceso")
+    ap.add_argument("--url")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--actualizar", type=int, default=200)
+    ap.add_argument("--nuevos", type=int, default=100)
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--salida")
+    a = ap.parse_args()
+    res = asyncio.run(principal(a))
+    guardar("importacion", res, a.salida)
+    print(f"· {res['filas']} filas en {res['duracion_s']} s ({res['filas_por_s']} filas/s), "
+          f"{res['con_diferencia']} con diferencia de stock")
+    print("OK" if res["ok"] else f"FALLO: {res['invariantes']}")
+    sys.exit(0 if res["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
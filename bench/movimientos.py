@@ -0,0 +1,96 @@
+# bench/movimientos.py
+"""
+Recepción de un pedido del distribuidor: lote vs una petición por ítem.
+
+Por cada repetición arma un pedido de `--skus` entradas sobre productos distintos
+y lo registra de dos formas:
+  - `lote`: un POST /movimientos/lote (UPDATE ... FROM VALUES + insert multi-fila),
+  - `por_item`: N POST /movimientos/ secuenciales (como lo haría un cliente hoy).
+Reporta latencia por pedido, ítems/s y sentencias SQL por pedido, y verifica que
+el stock sube exactamente lo mismo con ambos caminos.
+
+    python -m bench.movimientos --skus 200 --repeticiones 20
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from .comun import cliente, contadores_sql, guardar, percentiles, sql_por_peticion
+
+async def _stock(c, ids: list[int]) -> dict[int, int]:
+    return {p["id_producto"]: p["cantidad"] for p in (await c.get("/productos/")).json() if p["id_producto"] in ids}
+
+async def _lote(c, pedido: list[dict]) -> int:
+    r = await c.post("/movimientos/lote", json={"movimientos": pedido})
+    return r.status_code
+
+async def _por_item(c, pedido: list[dict]) -> int:
+    for linea in pedido:
+        r = await c.post("/movimientos/", json=linea)
+        if r.status_code != 201:
+            return r.status_code
+    return 201
+
+CAMINOS = {"lote": _lote, "por_item": _por_item}
+
+async def principal(a) -> dict:
+    rnd = random.Random(a.semilla)
+    resultados, ok = {}, True
+    async with cliente(a.modo, a.url, a.workers) as c:
+        productos = [p["id_producto"] for p in (await c.get("/productos/")).json()]
+        if len(productos) < a.skus:
+            raise SystemExit(f"Se necesitan al menos {a.skus} productos: correr antes `python -m bench.seed`")
+        for nombre, fn in CAMINOS.items():
+            latencias, status, unidades = [], {}, 0
+            ids = rnd.sample(productos, a.skus)
+            antes_stock = await _stock(c, ids)
+            antes_sql = await contadores_sql(c)
+            t0 = time.perf_counter()
+            for _ in range(a.repeticiones):
+                pedido = [
+                    {"id_producto": pid, "tipo_movimiento": "entrada", "cantidad": rnd.randint(1, 24),
+                     "descripcion": "pedido distribuidor (bench)"}
+                    for pid in ids
+                ]
+                t = time.perf_counter()
+                s = await fn(c, pedido)
+                latencias.append(time.perf_counter() - t)
+                status[s] = status.get(s, 0) + 1
+                if s == 201:
+                    unidades += sum(l["cantidad"] for l in pedido)
+            transcurrido = time.perf_counter() - t0
+            despues_sql = await contadores_sql(c)
+            despues_stock = await _stock(c, ids)
+            cuadra = sum(despues_stock.values()) - sum(antes_stock.values()) == unidades
+            ok = ok and cuadra and set(status) == {201}
+            resultados[nombre] = {
+                "pedidos": a.repeticiones,
+                "status": {str(k): v for k, v in sorted(status.items())},
+                "latencia_pedido": percentiles(latencias),
+                "items_por_s": round(a.repeticiones * a.skus / transcurrido, 1) if transcurrido else 0.0,
+                "sql_por_peticion": sql_por_peticion(antes_sql, despues_sql),
+                "stock_cuadra": cuadra,
+            }
+            print(f"· {nombre}: p50 {resultados[nombre]['latencia_pedido'].get('p50_ms')} ms/pedido, "
+                  f"{resultados[nombre]['items_por_s']} ítems/s")
+    return {"modo": a.modo, "skus": a.skus, "caminos": resultados, "ok": ok}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modo", choices=("inproceso", "uvicorn"), default="inproceso")
+    ap.add_argument("--url")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--skus", type=int, default=200)
+    ap.add_argument("--repeticiones", type=int, default=20)
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--salida")
+    a = ap.parse_args()
+    res = asyncio.run(principal(a))
+    guardar("movimientos", res, a.salida)
+    print("OK" if res["ok"] else "FALLO: stock descuadrado o peticiones rechazadas")
+    sys.exit(0 if res["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench/resumen.py
+"""
+Resumen por rango: rollups (crud.resumen_ventas_periodo) contra SUM directo sobre ventas.
+
+Mide ambas variantes sobre los mismos rangos aleatorios (1, 7, 30, 365 días con
+bordes sin alinear) y comprueba que devuelven lo mismo. Sembrar antes con
+1M y 10M de ventas para comparar:
+
+    python -m bench.seed --ventas 1000000 --truncar && python -m bench.resumen
+    python -m bench.seed --ventas 10000000 --truncar && python -m bench.resumen
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import func, select
+
+from .comun import guardar, percentiles
+
+def _sum_directo(desde, hasta):
+    from app import models
+    v = models.Venta
+    return select(
+        func.coalesce(func.sum(v.cantidad_vendida), 0),
+        func.coalesce(func.sum(v.total_venta), 0),
+        func.count(v.id_venta),
+    ).where(v.fecha_venta >= desde, v.fecha_venta <= hasta)
+
+async def principal(a) -> dict:
+    from app import crud, models
+    from app.database import AsyncSessionLocal
+
+    rnd = random.Random(a.semilla)
+    async with AsyncSessionLocal() as db:
+        n_ventas = await db.scalar(select(func.count()).select_from(models.Venta))
+        ultima = await db.scalar(select(func.max(models.Venta.fecha_venta))) or datetime.now(timezone.utc)
+
+        resultados = {}
+        for dias in a.dias:
+            t_rollup, t_directo, discrepancias = [], [], 0
+            for _ in range(a.repeticiones):
+                hasta = ultima - timedelta(minutes=rnd.randrange(0, 60 * 24 * 7), seconds=rnd.randrange(60))
+                desde = hasta - timedelta(days=dias, minutes=rnd.randrange(0, 600))
+
+                t0 = time.perf_counter()
+                r = await crud.resumen_ventas_periodo(db, desde, hasta)
+                t_rollup.append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                unidades, total, n = (await db.execute(_sum_directo(desde, hasta))).one()
+                t_directo.append(time.perf_counter() - t0)
+
+                if (int(r["unidades_vendidas"]), r["num_ventas"]) != (int(unidades), n) or \
+                        abs(Decimal(str(r["total_ventas"])) - Decimal(total)) > Decimal("0.01"):
+                    discrepancias += 1
+            p_roll, p_dir = percentiles(t_rollup), percentiles(t_directo)
+            resultados[f"{dias}d"] = {
+                "rollups": p_roll,
+                "sum_directo": p_dir,
+                "aceleracion_p50": round(p_dir["p50_ms"] / p_roll["p50_ms"], 2) if p_roll["p50_ms"] else None,
+                "discrepancias": discrepancias,
+            }
+            print(f"· {dias:>4} d: rollups p50 {p_roll['p50_ms']} ms | SUM p50 {p_dir['p50_ms']} ms")
+    return {"ventas": n_ventas, "repeticiones": a.repeticiones, "rangos": resultados}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dias", type=lambda s: [int(x) for x in s.split(",")], default=[1, 7, 30, 365])
+    ap.add_argument("--repeticiones", type=int, default=30)
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--salida")
+    a = ap.parse_args()
+    guardar("resumen", asyncio.run(principal(a)), a.salida)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# bench/seed.py
+"""
+Generador de datos para benchmarks: productos, usuarios y millones de ventas y
+movimientos cargados con COPY (asyncpg.copy_records_to_table).
+
+El resultado es coherente con el resto del sistema:
+- cada producto recibe un movimiento de "entrada" con su stock inicial y cada
+  venta su movimiento de "salida"; productos.cantidad = inicial - vendido, así
+  que la reconciliación no reporta descuadres;
+- al final se reconstruyen resúmenes y rollups y se hace ANALYZE.
+
+Uso (contra un Postgres local, DATABASE_URL en el entorno):
+    python -m bench.seed --productos 500 --usuarios 40 --ventas 1000000 --truncar
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import asyncpg
+
+from .comun import dsn_asyncpg
+
+CATEGORIAS = ["cerveza", "ron", "aguardiente", "whisky", "vodka", "tequila", "vino", "gaseosa", "snack", "coctel"]
+MARCAS = ["Club Colombia", "Aguila", "Poker", "Medellin", "Antioqueño", "Old Parr", "Absolut", "Jose Cuervo",
+          "Casillero", "Postobon", "Margarita", "Smirnoff", "Bacardi", "Buchanans", "Corona"]
+STOCK_INICIAL = 1_000_000
+BLOQUE = 50_000
+
+TABLAS = [
+    "inventario_movimientos", "ventas", "productos_mas_vendidos", "productos_menos_vendidos",
+    "ventas_por_hora", "ventas_por_dia", "reconciliacion_checkpoints", "productos", "usuarios",
+]
+
+async def _copiar(conn, tabla: str, columnas: list[str], filas) -> int:
+    """COPY en bloques para no materializar millones de tuplas."""
+    total = 0
+    bloque = []
+    for f in filas:
+        bloque.append(f)
+        if len(bloque) >= BLOQUE:
+            await conn.copy_records_to_table(tabla, records=bloque, columns=columnas)
+            total += len(bloque)
+            bloque = []
+    if bloque:
+        await conn.copy_records_to_table(tabla, records=bloque, columns=columnas)
+        total += len(bloque)
+    return total
+
+async def sembrar(productos: int, usuarios: int, ventas: int, dias: int, truncar: bool, semilla: int) -> dict:
+    rnd = random.Random(semilla)
+    conn = await asyncpg.connect(dsn_asyncpg())
+    t0 = time.perf_counter()
+    tiempos = {}
+    try:
+        if truncar:
+            await conn.execute(f"TRUNCATE {', '.join(TABLAS)} RESTART IDENTITY CASCADE")
+
+        t = time.perf_counter()
+        await _copiar(conn, "productos", ["nombre", "categoria", "marca", "cantidad", "precio_venta"], (
+            (f"{rnd.choice(MARCAS)} {rnd.choice(CATEGORIAS)} {i}", rnd.choice(CATEGORIAS), rnd.choice(MARCAS),
+             STOCK_INICIAL, round(rnd.uniform(3_000, 250_000), -2))
+            for i in range(productos)
+        ))
+        # Sufijo para que correos y nombres no choquen con corridas previas sin --truncar
+        sufijo = f"{semilla}-{int(time.time())}"
+        await _copiar(conn, "usuarios", ["nombre_usuario", "correo", "rol"], (
+            (f"Bartender {i}", f"bench{i}-{sufijo}@example.com", "operador" if i else "admin")
+            for i in range(usuarios)
+        ))
+        tiempos["catalogo_s"] = round(time.perf_counter() - t, 3)
+
+        prods = await conn.fetch("SELECT id_producto, precio_venta FROM productos ORDER BY id_producto DESC LIMIT $1", productos)
+        ids_usuarios = [r[0] for r in await conn.fetch(
+            "SELECT id_usuario FROM usuarios ORDER BY id_usuario DESC LIMIT $1", usuarios
+        )]
+        precios = {r[0]: float(r[1]) for r in prods}
+        ids_productos = list(precios)
+        # Popularidad sesgada (unos pocos productos concentran las ventas, como en la barra)
+        acumulado = list(itertools.accumulate(1 / (i + 1) ** 0.8 for i in range(len(ids_productos))))
+        vendido = dict.fromkeys(ids_productos, 0)
+        fin = datetime.now(timezone.utc)
+        inicio = fin - timedelta(days=dias)
+        rango_s = int((fin - inicio).total_seconds())
+
+        def gen_ventas():
+            # Fechas crecientes (id_venta crece con fecha_venta, como en producción) sin ordenar en memoria
+            paso = rango_s / max(ventas, 1)
+            for i in range(ventas):
+                pid = rnd.choices(ids_productos, cum_weights=acumulado)[0]
+                n = rnd.choices((1, 2, 3, 4, 6), (60, 20, 10, 6, 4))[0]
+                vendido[pid] += n
+                fecha = inicio + timedelta(seconds=(i + rnd.random()) * paso)
+                yield (rnd.choice(ids_usuarios), pid, n, Decimal(f"{precios[pid] * n:.2f}"), fecha)
+
+        t = time.perf_counter()
+        await _copiar(conn, "inventario_movimientos", ["id_producto", "tipo_movimiento", "cantidad", "descripcion", "fecha"], (
+            (pid, "entrada", STOCK_INICIAL, "stock inicial (bench)", inicio) for pid in ids_productos
+        ))
+        await _copiar(conn, "ventas", ["id_usuario", "id_producto", "cantidad_vendida", "total_venta", "fecha_venta"], gen_ventas())
+        tiempos["ventas_s"] = round(time.perf_counter() - t, 3)
+
+        # Una salida por venta, generada en el servidor a partir de lo recién copiado
+        t = time.perf_counter()
+        desde_id = await conn.fetchval("SELECT coalesce(max(id_venta), 0) FROM ventas") - ventas
+        await conn.execute(
+            "INSERT INTO inventario_movimientos (id_producto, tipo_movimiento, cantidad, descripcion, fecha) "
+            "SELECT id_producto, 'salida', cantidad_vendida, 'venta', fecha_venta "
+            "FROM ventas WHERE id_venta > $1 ORDER BY id_venta",
+            desde_id,
+        )
+        tiempos["movimientos_s"] = round(time.perf_counter() - t, 3)
+
+        await conn.execute(
+            "UPDATE productos p SET cantidad = p.cantidad - v.n "
+            "FROM unnest($1::int[], $2::int[]) AS v(id, n) WHERE p.id_producto = v.id",
+            list(vendido), list(vendido.values()),
+        )
+        await conn.execute("ANALYZE")
+    finally:
+        await conn.close()
+
+    # Resúmenes y rollups con el mismo código que usa la app
+    t = time.perf_counter()
+    from app import crud, catalogo
+    from app.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        await crud.rebuild_resumenes_ventas(db)
+        await catalogo.bump(db, "productos")
+        await catalogo.bump(db, "usuarios")
+        await db.commit()
+    tiempos["resumenes_s"] = round(time.perf_counter() - t, 3)
+    tiempos["total_s"] = round(time.perf_counter() - t0, 3)
+    return {"productos": productos, "usuarios": usuarios, "ventas": ventas, "dias": dias, "tiempos": tiempos}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--productos", type=int, default=500)
+    ap.add_argument("--usuarios", type=int, default=40)
+    ap.add_argument("--ventas", type=int, default=1_000_000)
+    ap.add_argument("--dias", type=int, default=365)
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--truncar", action="store_true", help="vacía las tablas antes de sembrar")
+    a = ap.parse_args()
+    res = asyncio.run(sembrar(a.productos, a.usuarios, a.ventas, a.dias, a.truncar, a.semilla))
+    print(res)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# bench/stock.py
+"""
+Prueba de carrera sobre el último stock (camino de venta atómico de crud.create_venta).
+
+Crea un producto con `--stock` unidades y lanza `--ventas` POST /ventas/ de una unidad
+con `--concurrencia` clientes a la vez. Verifica que:
+  - exactamente `stock` ventas devuelven 201 y el resto 400 (stock insuficiente),
+  - productos.cantidad termina en 0 (nunca negativo),
+  - ventas y movimientos de salida registrados coinciden con las ventas aceptadas.
+Reporta ventas/s y latencias. Sale con código 1 si alguna invariante falla.
+
+Con --comparar corre además la misma carrera directo contra la BD (sin HTTP) con el
+camino de venta anterior (leer producto, restar en Python, INSERTs por el ORM; copiado
+aquí como _venta_anterior) y con crud.create_venta, y reporta ventas/s e invariantes
+de ambos. El camino anterior no bloquea la fila: se espera que venda de más.
+
+    python -m bench.stock --stock 200 --ventas 1000 --concurrencia 64
+    python -m bench.stock --stock 200 --ventas 1000 --concurrencia 64 --comparar
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+from sqlalchemy import func, select
+
+from .comun import cliente, guardar, percentiles
+
+async def _venta_anterior(db, data):
+    """Cuerpo de crud.create_venta antes del camino atómico (solo para comparar)."""
+    from app import models
+    producto = await db.get(models.Producto, data.id_producto)
+    if not producto:
+        raise ValueError("Producto no existe")
+    if producto.cantidad < data.cantidad_vendida:
+        raise ValueError("Stock insuficiente")
+    usuario = await db.get(models.Usuario, data.id_usuario)
+    if not usuario:
+        raise ValueError("Usuario no existe")
+    producto.cantidad -= data.cantidad_vendida
+    venta = models.Venta(
+        id_usuario=data.id_usuario,
+        id_producto=data.id_producto,
+        cantidad_vendida=data.cantidad_vendida,
+        total_venta=round(producto.precio_venta * data.cantidad_vendida, 2),
+    )
+    db.add(venta)
+    db.add(models.InventarioMovimiento(
+        id_producto=data.id_producto, tipo_movimiento="salida", cantidad=data.cantidad_vendida, descripcion="venta",
+    ))
+    await db.flush()
+    await db.commit()
+    await db.refresh(venta)
+    return venta
+
+async def _conteos(pid: int) -> tuple[int, int, int]:
+    from app import models
+    from app.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        stock_final = await db.scalar(select(models.Producto.cantidad).where(models.Producto.id_producto == pid))
+        n_ventas = await db.scalar(select(func.count()).where(models.Venta.id_producto == pid))
+        n_salidas = await db.scalar(
+            select(func.count()).where(
+                models.InventarioMovimiento.id_producto == pid,
+                models.InventarioMovimiento.tipo_movimiento == "salida",
+            )
+        )
+    return stock_final, n_ventas, n_salidas
+
+async def _carrera_directa(vender, a) -> dict:
+    """La misma carrera llamando a `vender(db, VentaCreate)` con una sesión por venta."""
+    from app import models, schemas
+    from app.database import AsyncSessionLocal
+
+    marca = uuid.uuid4().hex[:8]
+    async with AsyncSessionLocal() as db:
+        p = models.Producto(nombre=f"Bench comparar {marca}", categoria="bench", marca="bench",
+                            cantidad=a.stock, precio_venta=1000)
+        u = models.Usuario(nombre_usuario=f"bench {marca}", correo=f"comparar-{marca}@example.com", rol="operador")
+        db.add_all([p, u])
+        await db.commit()
+        pid, uid = p.id_producto, u.id_usuario
+
+    data = schemas.VentaCreate(id_usuario=uid, id_producto=pid, cantidad_vendida=1)
+    aceptadas, rechazadas, errores = 0, 0, 0
+    sem = asyncio.Semaphore(a.concurrencia)
+
+    async def una():
+        nonlocal aceptadas, rechazadas, errores
+        async with sem, AsyncSessionLocal() as db:
+            try:
+                await vender(db, data)
+                aceptadas += 1
+            except ValueError:
+                rechazadas += 1
+            except Exception:
+                errores += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[una() for _ in range(a.ventas)])
+    transcurrido = time.perf_counter() - t0
+    stock_final, n_ventas, n_salidas = await _conteos(pid)
+    return {
+        "ventas_por_s": round(a.ventas / transcurrido, 2),
+        "aceptadas_por_s": round(aceptadas / transcurrido, 2),
+        "aceptadas": aceptadas,
+        "rechazadas": rechazadas,
+        "errores": errores,
+        "stock_final": stock_final,
+        "invariantes": {
+            "aceptadas_igual_stock": aceptadas == min(a.stock, a.ventas),
+            "stock_cuadra": stock_final == a.stock - n_ventas,
+            "movimientos_registrados": n_salidas == n_ventas,
+        },
+    }
+
+async def principal(a) -> dict:
+    async with cliente(a.modo, a.url, a.workers) as c:
+        marca = uuid.uuid4().hex[:8]
+        p = (await c.post("/productos/", json={
+            "nombre": f"Bench ultima botella {marca}", "categoria": "bench", "marca": "bench",
+            "cantidad": a.stock, "precio_venta": 1000,
+        })).json()
+        u = (await c.post("/usuarios/", json={
+            "nombre_usuario": f"bench {marca}", "correo": f"stock-{marca}@example.com", "rol": "operador",
+        })).json()
+        pid, uid = p["id_producto"], u["id_usuario"]
+
+        latencias, status = [], {}
+        sem = asyncio.Semaphore(a.concurrencia)
+
+        async def vender():
+            async with sem:
+                t0 = time.perf_counter()
+                r = await c.post("/ventas/", json={"id_usuario": uid, "id_producto": pid, "cantidad_vendida": 1})
+                latencias.append(time.perf_counter() - t0)
+                status[r.status_code] = status.get(r.status_code, 0) + 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[vender() for _ in range(a.ventas)])
+        transcurrido = time.perf_counter() - t0
+
+    stock_final, n_ventas, n_salidas = await _conteos(pid)
+
+    aceptadas = status.get(201, 0)
+    invariantes = {
+        "aceptadas_igual_stock": aceptadas == min(a.stock, a.ventas),
+        "stock_no_negativo": stock_final >= 0,
+        "stock_cuadra": stock_final == a.stock - aceptadas,
+        "ventas_registradas": n_ventas == aceptadas,
+        "movimientos_registrados": n_salidas == aceptadas,
+        "solo_201_o_400": set(status) <= {201, 400},
+    }
+    comparacion = None
+    if a.comparar:
+        from app import crud
+        comparacion = {
+            "anterior": await _carrera_directa(_venta_anterior, a),
+            "actual": await _carrera_directa(crud.create_venta, a),
+        }
+    return {
+        "modo": a.modo,
+        "stock_inicial": a.stock,
+        "intentos": a.ventas,
+        "concurrencia": a.concurrencia,
+        "status": {str(k): v for k, v in sorted(status.items())},
+        "stock_final": stock_final,
+        "ventas_por_s": round(a.ventas / transcurrido, 2),
+        "aceptadas_por_s": round(aceptadas / transcurrido, 2),
+        "latencia": percentiles(latencias),
+        "invariantes": invariantes,
+        "comparacion": comparacion,
+        "ok": all(invariantes.values()),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modo", choices=("inproceso", "uvicorn"), default="inproceso")
+    ap.add_argument("--url")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--stock", type=int, default=200)
+    ap.add_argument("--ventas", type=int, default=1000)
+    ap.add_argument("--concurrencia", type=int, default=64)
+    ap.add_argument("--comparar", action="store_true", help="también camino anterior vs actual, sin HTTP")
+    ap.add_argument("--salida")
+    a = ap.parse_args()
+    res = asyncio.run(principal(a))
+    guardar("stock", res, a.salida)
+    if res["comparacion"]:
+        for nombre, r in res["comparacion"].items():
+            print(f"· {nombre}: {r['ventas_por_s']} ventas/s, aceptadas {r['aceptadas']}, stock final {r['stock_final']}")
+    print("OK" if res["ok"] else f"FALLO: {res['invariantes']}")
+    sys.exit(0 if res["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
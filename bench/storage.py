@@ -0,0 +1,135 @@
+# bench/storage.py
+"""
+Servicio de subida (app/services/supabase_storage.py) contra un storage falso.
+
+No necesita Supabase ni red: el StorageService usa un httpx.MockTransport que
+hace de servidor de Storage, guarda los objetos en memoria y tarda `--latencia-ms`
+por subida. Lanza `--subidas` subidas de `--kb` KB a la vez y verifica que:
+  - cada objeto llega completo y byte a byte igual al archivo,
+  - el archivo se lee en bloques de supabase_storage.CHUNK (nunca entero en memoria;
+    se mide en el UploadFile, porque MockTransport junta el cuerpo antes de llamar
+    al handler),
+  - nunca hay más de `--limite` subidas en vuelo (semáforo del servicio),
+  - la URL pública devuelta apunta al objeto guardado,
+  - un error del servidor llega como StorageError.
+Reporta subidas/s y el máximo de subidas simultáneas observado. Sale con código 1
+si alguna verificación falla.
+
+    python -m bench.storage --subidas 64 --kb 1024 --limite 4
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+import httpx
+from starlette.datastructures import Headers, UploadFile
+
+from .comun import guardar
+
+BASE = "http://storage.falso"
+
+class StorageFalso:
+    """Handler de httpx.MockTransport con el mismo contrato que /storage/v1/object."""
+
+    def __init__(self, latencia_s: float):
+        self.latencia_s = latencia_s
+        self.objetos: dict[str, bytes] = {}
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        ruta = request.url.path.removeprefix("/storage/v1/object/")
+        if request.method != "POST":
+            return httpx.Response(405)
+        if ruta.endswith(".falla"):
+            return httpx.Response(500, text="falla simulada")
+        self.en_vuelo += 1
+        self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+        try:
+            await asyncio.sleep(self.latencia_s)
+        finally:
+            self.en_vuelo -= 1
+        self.objetos[ruta] = await request.aread()
+        return httpx.Response(200, json={"Key": ruta})
+
+class ArchivoMedido(UploadFile):
+    """UploadFile que registra el tamaño de cada lectura que hace el servicio."""
+
+    def __init__(self, datos: bytes, nombre: str):
+        super().__init__(
+            io.BytesIO(datos), size=len(datos), filename=nombre,
+            headers=Headers({"content-type": "image/jpeg"}),
+        )
+        self.lecturas: list[int] = []
+
+    async def read(self, size: int = -1) -> bytes:
+        chunk = await super().read(size)
+        if chunk:
+            self.lecturas.append(len(chunk))
+        return chunk
+
+async def principal(a) -> dict:
+    from app.services import supabase_storage as st
+
+    os.environ["SUPABASE_URL"] = BASE
+    os.environ["SUPABASE_SERVICE_ROLE"] = "clave-falsa"
+    falso = StorageFalso(a.latencia_ms / 1000)
+    servicio = st.StorageService(max_concurrentes=a.limite, transport=httpx.MockTransport(falso))
+
+    datos = [os.urandom(a.kb * 1024) for _ in range(a.subidas)]
+    archivos = [ArchivoMedido(d, f"f{i}.jpg") for i, d in enumerate(datos)]
+    t0 = time.perf_counter()
+    urls = await asyncio.gather(*[servicio.subir(f, "bench") for f in archivos])
+    transcurrido = time.perf_counter() - t0
+
+    prefijo = f"{BASE}/storage/v1/object/public/"
+    integros = True
+    en_bloques = True
+    for url, d, f in zip(urls, datos, archivos):
+        integros &= url.startswith(prefijo) and falso.objetos.get(url.removeprefix(prefijo)) == d
+        en_bloques &= max(f.lecturas) <= st.CHUNK
+
+    try:
+        await servicio.subir(ArchivoMedido(b"x", "roto.falla"), "bench")
+        error_propagado = False
+    except st.StorageError:
+        error_propagado = True
+    await servicio.cerrar()
+
+    invariantes = {
+        "objetos_integros": integros,
+        "subida_en_bloques": en_bloques,
+        "limite_concurrencia": falso.max_en_vuelo <= a.limite,
+        "storage_error": error_propagado,
+    }
+    return {
+        "subidas": a.subidas,
+        "kb": a.kb,
+        "limite": a.limite,
+        "latencia_ms": a.latencia_ms,
+        "duracion_s": round(transcurrido, 3),
+        "subidas_por_s": round(a.subidas / transcurrido, 2) if transcurrido else 0.0,
+        "max_en_vuelo": falso.max_en_vuelo,
+        "invariantes": invariantes,
+        "ok": all(invariantes.values()),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--subidas", type=int, default=64)
+    ap.add_argument("--kb", type=int, default=1024)
+    ap.add_argument("--limite", type=int, default=4)
+    ap.add_argument("--latencia-ms", type=float, default=20)
+    ap.add_argument("--salida")
+    a = ap.parse_args()
+    res = asyncio.run(principal(a))
+    guardar("storage", res, a.salida)
+    print(f"· {res['subidas_por_s']} subidas/s, máximo en vuelo {res['max_en_vuelo']} (límite {a.limite})")
+    print("OK" if res["ok"] else f"FALLO: {res['invariantes']}")
+    sys.exit(0 if res["ok"] else 1)
+
+if __name__ == "__main__":
+    main()